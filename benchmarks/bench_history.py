@@ -0,0 +1,50 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.history import HistoryStore
+
+
+def edit(rng, text):
+    at = rng.randrange(len(text) + 1)
+    if rng.random() < 0.6:
+        return text[:at] + rng.choice(['a', 'bc', ' ', '\n']) + text[at:]
+    return text[:at] + text[at + rng.randint(1, 3):]
+
+
+def main(edits=100000, size=20000, seed=1):
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix='notepad-history-')
+    try:
+        history = HistoryStore(os.path.join(workdir, 'notes.history'))
+        text = ''.join(rng.choice('abcdefgh \n') for _ in range(size))
+        began = time.perf_counter()
+        for _ in range(edits):
+            text = edit(rng, text)
+            history.record('note', text)
+        elapsed = time.perf_counter() - began
+        versions = history.versions('note')
+        print('%d edits recorded in %.1f s (%.3f ms each), file %.1f MB, %d versions kept' % (
+            edits, elapsed, elapsed / edits * 1000, history.size / 1e6, len(versions)))
+
+        samples = []
+        for rev, _, _ in rng.sample(versions, min(200, len(versions))):
+            began = time.perf_counter()
+            history.version('note', rev)
+            samples.append(time.perf_counter() - began)
+        samples.sort()
+        print('rebuild a version: median %.2f ms, max %.2f ms' % (
+            samples[len(samples) // 2] * 1000, samples[-1] * 1000))
+        assert history.version('note', versions[-1][0]) == text
+        history.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
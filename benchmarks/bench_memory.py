@@ -0,0 +1,114 @@
+import argparse
+import gc
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss():
+    # Current resident set size in bytes; peak RSS where /proc is missing.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(base, tree):
+    # Runs in its own process, importing the notebook from `tree`, so each
+    # side of the comparison starts from a clean heap with its own code.
+    sys.path.insert(0, tree)
+    from benchmarks.suite import open_notebook
+    notebook = open_notebook(base)
+    gc.collect()
+    baseline = rss()
+    notebook.load()
+    gc.collect()
+    loaded = rss()
+    began = time.perf_counter()
+    for note in notebook.notes:
+        note.content
+    browse = time.perf_counter() - began
+    gc.collect()
+    browsed = rss()
+    began = time.perf_counter()
+    for note in notebook.notes:
+        note.content
+    revisit = time.perf_counter() - began
+    held = sum(1 for note in notebook.notes
+               if note._content is not None or getattr(note, '_packed', None) is not None)
+    return {
+        'notes': len(notebook.notes),
+        'held': held,
+        'load_bytes': loaded - baseline,
+        'browse_bytes': browsed - baseline,
+        'browse_s': browse,
+        'revisit_s': revisit,
+    }
+
+
+def git(*args):
+    return subprocess.run(['git'] + list(args), cwd=ROOT, capture_output=True, check=True).stdout
+
+
+def default_before():
+    # The tree just before Note gained slots; HEAD while that is uncommitted.
+    commit = git('log', '-1', '--format=%H', '-S__slots__', '--', 'models/note.py').decode().strip()
+    return commit + '^' if commit else 'HEAD'
+
+
+def checkout(ref, workdir):
+    tree = os.path.join(workdir, 'before')
+    with tarfile.open(fileobj=io.BytesIO(git('archive', ref))) as archive:
+        archive.extractall(tree)
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS per 10k notes, working tree against an older commit.")
+    parser.add_argument('--counts', default='10000,50000')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--before', help="git ref to compare against (default: the commit before compact notes)")
+    parser.add_argument('--child', nargs=2, metavar=('BASE', 'TREE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='notepad-memory-')
+    try:
+        before = args.before or default_before()
+        trees = [('before', checkout(before, workdir)), ('after', ROOT)]
+        sys.path.insert(0, ROOT)
+        from benchmarks.suite import build_corpus
+        print('before = %s' % before)
+        print('%8s %-7s %16s %16s %12s %10s %10s' % ('notes', 'tree', 'loaded MB/10k', 'browsed MB/10k',
+                                                 'bodies held', 'browse s', 'revisit s'))
+        for count in [int(c) for c in args.counts.split(',')]:
+            base = os.path.join(workdir, 'notes-%d' % count)
+            build_corpus(base, count, args.seed)
+            for name, tree in trees:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', base, tree],
+                                     capture_output=True, text=True, check=True)
+                result = json.loads(out.stdout)
+                per = 10000 / result['notes'] / 1e6
+                print('%8d %-7s %16.1f %16.1f %12d %10.2f %10.2f' % (
+                    count, name, result['load_bytes'] * per, result['browse_bytes'] * per,
+                    result['held'], result['browse_s'], result['revisit_s']))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.spans import SPAN_TAGS, encode_spans, decode_spans, line_starts, index_to_offset, offset_to_index
+
+
+def make_note(lines=20000, runs_per_tag=20000, seed=1):
+    rng = random.Random(seed)
+    content = '\n'.join('line %d ' % i + 'x' * rng.randint(10, 80) for i in range(lines))
+    runs = {}
+    for tag in SPAN_TAGS:
+        starts = sorted(rng.sample(range(0, len(content) - 10, 10), runs_per_tag))
+        runs[tag] = [(s, s + rng.randint(1, 9)) for s in starts]
+    return content, runs
+
+
+def timed(label, fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    print('%-28s %8.1f ms' % (label, (time.perf_counter() - began) * 1000))
+    return result
+
+
+def bench_headless(content, runs):
+    starts = timed('line_starts', line_starts, content)
+    indices = timed('offsets -> indices', lambda: {
+        tag: [(offset_to_index(starts, s), offset_to_index(starts, e)) for s, e in r]
+        for tag, r in runs.items()})
+    timed('indices -> offsets', lambda: {
+        tag: [(index_to_offset(starts, s), index_to_offset(starts, e)) for s, e in r]
+        for tag, r in indices.items()})
+    encoded = timed('encode_spans', encode_spans, runs)
+    decoded = timed('decode_spans', decode_spans, encoded)
+    assert decoded == runs
+    print('%-28s %8d bytes for %d runs' % ('encoded size', len(encoded), sum(len(r) for r in runs.values())))
+    return encoded
+
+
+def bench_editor(content, encoded):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print('no display, skipping editor save/restore')
+        return
+    from components.editor import Editor
+    editor = Editor(root, lambda title, tags: None)
+    timed('Editor.set_content (restore)', editor.set_content, content, encoded)
+    saved = timed('Editor.get_spans (save)', editor.get_spans, editor.get_content())
+    assert decode_spans(saved) == decode_spans(encoded)
+    root.destroy()
+
+
+if __name__ == '__main__':
+    content, runs = make_note()
+    print('note: %d chars, %d lines' % (len(content), content.count('\n') + 1))
+    encoded = bench_headless(content, runs)
+    bench_editor(content, encoded)
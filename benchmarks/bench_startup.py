@@ -0,0 +1,125 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.suite import build_corpus, open_notebook, summarize, timed
+
+BUDGET_MS = 200
+
+
+def prepare(workdir, count, seed):
+    # A corpus that has been opened and closed once, so the startup
+    # snapshot and the search index exist as they would for a user.
+    base = os.path.join(workdir, 'notes')
+    if not os.path.exists(base + '.startup'):
+        began = time.perf_counter()
+        build_corpus(base, count, seed)
+        notebook = open_notebook(base)
+        notebook.startup_path = base + '.startup'
+        notebook.load()
+        notebook.load_search_index()
+        notebook.select(notebook.notes[len(notebook.notes) // 2])
+        notebook.close()
+        print('built %d notes in %.1f s' % (count, time.perf_counter() - began))
+    return base
+
+
+def bench_headless(base, rounds):
+    results = {}
+    script = ("import time; t = time.perf_counter(); import main; "
+              "print((time.perf_counter() - t) * 1000)")
+    samples = []
+    for _ in range(rounds):
+        out = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+        samples.append(float(out.stdout) / 1000)
+    results['import main'] = summarize(samples)
+
+    def read_startup():
+        notebook = open_notebook(base)
+        notebook.startup_path = base + '.startup'
+        return notebook.read_startup()
+    results['read_startup'] = summarize([timed(read_startup)[0] for _ in range(rounds)])
+
+    samples = []
+    indexing = []
+    for _ in range(rounds):
+        notebook = open_notebook(base)
+        samples.append(timed(notebook.load)[0])
+        indexing.append(timed(notebook.load_search_index)[0])
+        notebook.store.close()
+        # The notebook and its cache refer to each other; free the index
+        # before the next round loads another copy.
+        del notebook
+        gc.collect()
+    results['load list'] = summarize(samples)
+    results['load search index'] = summarize(indexing)
+    return results
+
+
+def bench_window(workdir, rounds):
+    # Launches the real app; needs a display.
+    results = {}
+    report_path = os.path.join(workdir, 'startup-report.json')
+    runs = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--startup-report',
+                               report_path, '--quit-after-startup'], cwd=workdir,
+                              capture_output=True, text=True)
+        wall = time.perf_counter() - began
+        if proc.returncode != 0:
+            print('app did not start, skipping window timings: %s' % proc.stderr.strip().splitlines()[-1])
+            return None
+        with open(report_path) as f:
+            report = json.load(f)
+        report['process'] = wall * 1000
+        runs.append(report)
+    for name in ('imports', 'interactive', 'loaded', 'indexed', 'process'):
+        results[name] = summarize([run[name] / 1000 for run in runs])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time against a large corpus.")
+    parser.add_argument('--notes', type=int, default=50000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="keep the generated corpus here and reuse it")
+    parser.add_argument('--out', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='notepad-startup-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        base = prepare(workdir, args.notes, args.seed)
+        results = {'headless': bench_headless(base, args.rounds)}
+        window = bench_window(workdir, args.rounds)
+        if window:
+            results['window'] = window
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for group, ops in results.items():
+        for op, stats in ops.items():
+            print('%-9s %-20s median %9.1f ms  max %9.1f ms' % (group, op, stats['median_ms'], stats['max_ms']))
+    if 'window' in results:
+        interactive = results['window']['interactive']['median_ms']
+        print('time to interactive %.0f ms (budget %d ms): %s' % (
+            interactive, BUDGET_MS, 'ok' if interactive <= BUDGET_MS else 'OVER BUDGET'))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'notes': args.notes, 'budget_ms': BUDGET_MS, 'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.calculator import Worksheet
+from core.notebook import Notebook
+from core.spelling import Speller
+from models.spans import decode_spans
+from storage.autosave import ManualSaver
+from storage.journal import JournalStore, put_record
+
+CORPORA = {'1k': 1000, '10k': 10000, '100k': 100000}
+# Every corpus carries the same few large notes; the rest are drawn
+# log-uniformly between MIN_BODY and SMALL_BODY.
+LARGE_BODIES = [10 * 1024 * 1024, 1024 * 1024, 1024 * 1024, 256 * 1024]
+MIN_BODY = 1024
+SMALL_BODY = 8 * 1024
+VOCABULARY = 5000
+QUERIES = ['w0', 'w17 w3', 'w420', 'w49*', '"w1 w0"', 'w4999', 'nosuchword']
+SWITCH_QUERIES = ['n', 'note 4', 'nt42', 'w9', 'e0w', 'qz']
+LABELS = ['t%d' % i for i in range(8)]
+NOTEBOOKS = ['', 'b0', 'b1', 'b2']
+FILTER_QUERIES = ['#t1', '#t1 -#t2', '(#t0 OR #t3) @b1', '#t1 w0']
+WORD_LIST_SIZE = 200000
+VIEW_LINES = 60
+RESULT_VERSION = 1
+
+
+def make_pool(rng, size=1024 * 1024):
+    # Word frequencies follow a rough Zipf curve so common and rare terms
+    # both exist for the search queries.
+    words = ['w%d' % i for i in range(VOCABULARY)]
+    weights = [1.0 / (rank + 1) for rank in range(VOCABULARY)]
+    lines = []
+    total = 0
+    while total < size:
+        line = ' '.join(rng.choices(words, weights, k=rng.randint(4, 14)))
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+
+def body_of(pool, rng, number, size):
+    header = 'note %d w%d\n' % (number, rng.randrange(VOCABULARY))
+    size = max(size - len(header), 0)
+    start = rng.randrange(len(pool))
+    text = pool[start:start + size]
+    while len(text) < size:
+        text += '\n' + pool[:size - len(text) - 1]
+    return header + text
+
+
+def body_sizes(rng, count):
+    sizes = [int(MIN_BODY * (SMALL_BODY / MIN_BODY) ** rng.random()) for _ in range(count)]
+    for i, size in enumerate(LARGE_BODIES[:count]):
+        sizes[rng.randrange(count)] = size
+    return sizes
+
+
+def build_corpus(base, count, seed):
+    rng = random.Random(seed)
+    pool = make_pool(rng)
+    store = JournalStore(base, compact_threshold=float('inf'))
+    store.open()
+    batch = []
+    for number, size in enumerate(body_sizes(rng, count)):
+        content = body_of(pool, rng, number, size)
+        note = {
+            'id': '%032x' % rng.getrandbits(128),
+            'title': content[:content.find('\n')],
+            'content': content,
+            'spans': "",
+            'title_tags': [],
+            'last_modified': datetime(2024, 1, 1).timestamp(),
+        }
+        batch.append(put_record(note))
+        if len(batch) == 1000:
+            store.append(batch)
+            batch = []
+    if batch:
+        store.append(batch)
+    store.compact()
+    store.close()
+    return pool
+
+
+def open_notebook(base):
+    notebook = Notebook(JournalStore(base), base + '.search')
+    notebook.saver = ManualSaver(notebook.collect, notebook.write)
+    return notebook
+
+
+def load(notebook):
+    notebook.load()
+    notebook.load_search_index()
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        'n': n,
+        'median_ms': samples[n // 2] * 1000,
+        'p95_ms': samples[min(n - 1, int(n * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+        'total_ms': sum(samples) * 1000,
+    }
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - began, result
+
+
+def bench_corpus(base, rng, rounds):
+    results = {}
+
+    notebook = open_notebook(base)
+    elapsed, _ = timed(load, notebook)
+    results['load_cold'] = summarize([elapsed])
+    notebook.close()
+
+    samples = []
+    for _ in range(3):
+        notebook = open_notebook(base)
+        elapsed, _ = timed(load, notebook)
+        samples.append(elapsed)
+        notebook.close()
+    results['load_warm'] = summarize(samples)
+
+    notebook = open_notebook(base)
+    load(notebook)
+    notes = notebook.notes
+    picks = [rng.choice(notes) for _ in range(rounds)]
+    largest = max(notes, key=lambda note: notebook.store.entries[note.id][2])
+
+    switch = []
+    for note in picks:
+        def switch_to(note=note):
+            content, spans = notebook.select(note)
+            decode_spans(spans)
+            Worksheet().load(content)
+        switch.append(timed(switch_to)[0])
+    results['note_switch'] = summarize(switch)
+
+    # Re-indexing runs on the notebook's index thread; it is waited for
+    # outside the timings so it does not slow down the next one.
+    edits = []
+    for i, note in enumerate(picks):
+        content = note.content
+        edits.append(timed(notebook.edit, note, 'edited %d ' % i + content)[0])
+        notebook.updater.join()
+    results['edit_title'] = summarize(edits)
+    largest_edits = []
+    for _ in range(3):
+        largest_edits.append(timed(notebook.edit, largest, 'x' + largest.content)[0])
+        notebook.updater.join()
+    results['edit_title_largest'] = summarize(largest_edits)
+
+    results['save'] = summarize([timed(notebook.saver.flush)[0]])
+    saves = []
+    for note in picks[:50]:
+        notebook.edit(note, 'saved ' + note.content)
+        notebook.updater.join()
+        saves.append(timed(notebook.saver.flush)[0])
+    results['save_one'] = summarize(saves)
+
+    notebook.updater.join()
+    for query in QUERIES:
+        results['search %s' % query] = summarize(
+            [timed(notebook.search, query)[0] for _ in range(rounds)])
+
+    results['title_index_build'] = summarize([timed(notebook.load_title_index)[0]])
+    for query in SWITCH_QUERIES:
+        results['switch %s' % query] = summarize(
+            [timed(notebook.switch, query)[0] for _ in range(rounds)])
+
+    # The corpus has no tags; these are set in memory only.
+    for note in notes:
+        note.labels = rng.sample(LABELS, rng.randrange(3))
+        note.notebook = rng.choice(NOTEBOOKS)
+    results['tag_index_build'] = summarize([timed(notebook.tags.build, notes)[0]])
+    results['label'] = summarize([timed(notebook.label, note, rng.sample(LABELS, 2), rng.choice(NOTEBOOKS))[0]
+                                  for note in picks])
+    for query in FILTER_QUERIES:
+        results['filter %s' % query] = summarize(
+            [timed(notebook.search, query)[0] for _ in range(rounds)])
+
+    notebook.close()
+    return results
+
+
+def bench_spelling(workdir, rng, rounds):
+    # A word list of made-up words, a screenful of lines that use them with
+    # one word in ten misspelled, and suggestions for misspellings.
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = sorted({''.join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+                         for _ in range(WORD_LIST_SIZE)})
+    source = os.path.join(workdir, 'words.txt')
+    with open(source, 'w') as f:
+        f.write('\n'.join(vocabulary))
+    path = os.path.join(workdir, 'words.dictionary')
+    results = {}
+    speller = Speller(source, path)
+    results['dictionary_compile'] = summarize([timed(speller.load)[0]])
+    opens = []
+    for _ in range(rounds):
+        reopened = Speller(source, path)
+        opens.append(timed(reopened.load)[0])
+        reopened.words.close()
+    results['dictionary_open'] = summarize(opens)
+
+    def misspell(word):
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:] + 'q'
+    lines = [' '.join(misspell(word) if rng.random() < 0.1 else word for word in rng.sample(vocabulary, 12))
+             for _ in range(VIEW_LINES)]
+
+    def check_view():
+        speller.cache = {}
+        for line in lines:
+            speller.misspelled(line)
+    results['spell_view_cold'] = summarize([timed(check_view)[0] for _ in range(rounds)])
+    results['spell_view_cached'] = summarize([timed(lambda: [speller.misspelled(line) for line in lines])[0]
+                                              for _ in range(rounds)])
+    results['spell_suggest'] = summarize([timed(speller.suggest, misspell(rng.choice(vocabulary)))[0]
+                                          for _ in range(min(rounds, 20))])
+    speller.words.close()
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def compare(previous, current, threshold):
+    # Prints median changes against an earlier results file; anything more
+    # than `threshold` slower is marked as a regression.
+    regressions = 0
+    for corpus, ops in current['results'].items():
+        before = previous['results'].get(corpus, {})
+        for op, stats in ops.items():
+            if op not in before:
+                continue
+            old, new = before[op]['median_ms'], stats['median_ms']
+            ratio = new / old if old else 1.0
+            flag = ''
+            if ratio > 1 + threshold and new - old > 0.05:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('%-6s %-28s %10.2f -> %10.2f ms  x%.2f%s' % (corpus, op, old, new, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks over synthetic corpora.")
+    parser.add_argument('--corpora', default='1k,10k', help="comma separated, from %s" % ','.join(CORPORA))
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="keep generated corpora here and reuse them")
+    parser.add_argument('--out', help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='notepad-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    report = {'version': RESULT_VERSION, 'env': environment(),
+              'args': {'rounds': args.rounds, 'seed': args.seed}, 'results': {}}
+    try:
+        for name in args.corpora.split(','):
+            base = os.path.join(workdir, 'corpus-%s-%d' % (name, args.seed))
+            pristine = base + '.pristine'
+            if not os.path.exists(pristine + '.snapshot'):
+                began = time.perf_counter()
+                build_corpus(pristine, CORPORA[name], args.seed)
+                print('built %s corpus in %.1f s' % (name, time.perf_counter() - began))
+            # Every run starts from the same files, since edits append to them.
+            for suffix in ('.snapshot', '.index'):
+                shutil.copyfile(pristine + suffix, base + suffix)
+            for suffix in ('.log', '.search'):
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+            results = bench_corpus(base, random.Random(args.seed), args.rounds)
+            report['results'][name] = results
+            for op, stats in results.items():
+                print('%-6s %-28s median %10.2f ms  p95 %10.2f ms' % (name, op, stats['median_ms'], stats['p95_ms']))
+        results = report['results']['spelling'] = bench_spelling(workdir, random.Random(args.seed), args.rounds)
+        for op, stats in results.items():
+            print('%-6s %-28s median %10.2f ms  p95 %10.2f ms' % ('spell', op, stats['median_ms'], stats['p95_ms']))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or os.path.join(ROOT, 'benchmarks', 'results',
+                                   datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('results written to %s' % out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare(previous, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+class ChangeTracker:
+    # Sits between Tcl and a Text widget's command so every insert, delete
+    # and tag change is reported with the positions it touched, no matter
+    # whether it came from a keystroke, a paste or our own code. Positions
+    # are (line, column) tuples taken before the change is applied; for an
+    # insert, `end` is where the inserted text ends afterwards.
+    def __init__(self, widget):
+        self.widget = widget
+        self.listeners = []
+        self.suspended = 0
+        self.orig = widget._w + '_orig'
+        widget.tk.call('rename', widget._w, self.orig)
+        widget.tk.createcommand(widget._w, self.dispatch)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def call(self, *args):
+        return self.widget.tk.call((self.orig,) + args)
+
+    def position(self, index):
+        line, col = self.call('index', index).split('.')
+        return int(line), int(col)
+
+    def clamp(self, index):
+        # Tk never edits past the trailing newline, so neither do we.
+        pos = self.position(index)
+        last = self.position('end - 1c')
+        return min(pos, last)
+
+    def dispatch(self, *args):
+        if self.suspended or not self.listeners or not args:
+            return self.call(*args)
+        op = args[0]
+        if op in ('insert', 'delete', 'replace') and str(self.call('cget', '-state')) == 'disabled':
+            # Tk ignores edits to a disabled widget; so must the listeners.
+            return self.call(*args)
+        if op == 'insert':
+            return self.insert(args)
+        if op == 'delete':
+            return self.delete(args)
+        if op == 'replace':
+            start, end = self.clamp(args[1]), self.clamp(args[2])
+            self.notify('delete', start, end, self.call('get', args[1], args[2]))
+            result = self.call(*args)
+            self.notify('insert', start, end_of(start, args[3]), args[3])
+            return result
+        if op == 'tag' and len(args) > 3 and args[1] in ('add', 'remove'):
+            result = self.call(*args)
+            positions = [self.position(index) for index in args[3:]]
+            if len(positions) == 1:
+                positions.append((positions[0][0], positions[0][1] + 1))
+            self.notify('tag', min(positions), max(positions), args[2])
+            return result
+        return self.call(*args)
+
+    def insert(self, args):
+        start = self.clamp(args[1])
+        text = ''.join(args[2::2])
+        result = self.call(*args)
+        if text:
+            self.notify('insert', start, end_of(start, text), text)
+        return result
+
+    def delete(self, args):
+        if len(args) > 3:
+            result = self.call(*args)
+            self.notify('reset', None, None, None)
+            return result
+        start = self.clamp(args[1])
+        end = self.clamp(args[2]) if len(args) > 2 else self.clamp(args[1] + ' + 1c')
+        if start < end:
+            self.notify('delete', start, end, self.call('get', '%d.%d' % start, '%d.%d' % end))
+        return self.call(*args)
+
+    def notify(self, kind, start, end, text):
+        for listener in self.listeners:
+            listener(kind, start, end, text)
+
+    def suspend(self):
+        self.suspended += 1
+
+    def resume(self):
+        self.suspended -= 1
+        for listener in self.listeners:
+            listener('reset', None, None, None)
+
+
+def end_of(start, text):
+    lines = text.count('\n')
+    if not lines:
+        return start[0], start[1] + len(text)
+    return start[0] + lines, len(text) - text.rfind('\n') - 1
@@ -0,0 +1,139 @@
+import queue
+from core.highlight import HighlightWorker, TOKEN_KINDS
+
+BLOCK_TAG = 'code_block'
+VIEW_MARGIN = 20
+POLL_MS = 15
+
+class CodeHighlighter:
+    # Keeps the line structure of a Text widget mirrored in a background
+    # HighlightWorker and paints the tokens it sends back, but only on the
+    # lines in (or near) the viewport. Lines are tagged once and re-tagged
+    # only when their tokens change.
+    def __init__(self, text_widget, tracker):
+        self.text = text_widget
+        self.tracker = tracker
+        self.worker = HighlightWorker()
+        self.version = 0
+        self.applied = 0
+        self.splices = []
+        self.tokens = []
+        self.tagged = set()
+        self.poll_job = None
+        self.view_job = None
+
+        self.text.tag_configure(BLOCK_TAG, background='#2a2e33', foreground='#e6db74',
+                                font=('Consolas', 11), spacing1=5, spacing3=5)
+        self.text.tag_configure('hl_keyword', foreground='#f92672')
+        self.text.tag_configure('hl_string', foreground='#a6e22e')
+        self.text.tag_configure('hl_comment', foreground='#75715e')
+        self.text.tag_configure('hl_number', foreground='#ae81ff')
+        self.text.tag_configure('hl_name', foreground='#66d9ef')
+        for kind in TOKEN_KINDS:
+            self.text.tag_raise(kind)
+
+        tracker.add_listener(self.on_change)
+
+    def submit(self, op, *args):
+        self.version += 1
+        self.worker.submit(self.version, op, *args)
+        if self.poll_job is None:
+            self.poll_job = self.text.after(POLL_MS, self.poll)
+
+    def line_text(self, first, last):
+        return self.text.get(f"{first}.0", f"{last}.end").split('\n')
+
+    def on_change(self, kind, start, end, text):
+        if kind == 'reset':
+            lines = self.text.get("1.0", "end-1c").split('\n')
+            self.splices.append((0, len(self.tokens), len(lines)))
+            self.tokens = [None] * len(lines)
+            self.tagged = set()
+            self.submit('reset', lines)
+            return
+        if kind == 'insert':
+            added = text.count('\n')
+            line = start[0] - 1
+            self.splice(line, 1, self.line_text(start[0], start[0] + added))
+        elif kind == 'delete':
+            # Called before the delete runs, so stitch the surviving parts
+            # of the first and last line together ourselves.
+            head = self.text.get(f"{start[0]}.0", "%d.%d" % start)
+            tail = self.text.get("%d.%d" % end, f"{end[0]}.end")
+            self.splice(start[0] - 1, end[0] - start[0] + 1, [head + tail])
+
+    def splice(self, start, remove, new_lines):
+        self.splices.append((start, remove, len(new_lines)))
+        self.tokens[start:start + remove] = [None] * len(new_lines)
+        self.tagged = {n for n in self.tagged if n <= start}
+        self.submit('splice', start, remove, new_lines)
+
+    def poll(self):
+        self.poll_job = None
+        while True:
+            try:
+                version, first, lines = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            self.apply(version, first, lines)
+        if self.version > self.applied:
+            self.poll_job = self.text.after(POLL_MS, self.poll)
+        self.schedule_view()
+
+    def apply(self, version, first, lines):
+        # Results may predate edits made since; move their line numbers
+        # through those edits and drop lines that were replaced.
+        pending = self.splices[len(self.splices) - (self.version - version):] if version < self.version else []
+        self.splices = pending
+        self.applied = version
+        for offset, result in enumerate(lines):
+            line = first + offset
+            for start, remove, added in pending:
+                if line < start:
+                    continue
+                if line >= start + remove:
+                    line += added - remove
+                else:
+                    line = None
+                    break
+            if line is not None and line < len(self.tokens):
+                self.tokens[line] = result
+                self.tagged.discard(line + 1)
+
+    def in_code(self, line):
+        # Whether line `line` is inside a code block; None until it has
+        # been lexed since its last edit.
+        tokens = self.tokens[line - 1] if line <= len(self.tokens) else None
+        return None if tokens is None else tokens[0]
+
+    def on_scroll(self, *args):
+        self.schedule_view()
+
+    def schedule_view(self):
+        if self.view_job is None:
+            self.view_job = self.text.after_idle(self.paint_view)
+
+    def paint_view(self):
+        self.view_job = None
+        first = int(self.text.index('@0,0').split('.')[0])
+        last = int(self.text.index(f'@0,{self.text.winfo_height()}').split('.')[0])
+        for line in range(max(1, first - VIEW_MARGIN), min(last + VIEW_MARGIN, len(self.tokens)) + 1):
+            if line not in self.tagged and self.tokens[line - 1] is not None:
+                self.paint_line(line, *self.tokens[line - 1])
+                self.tagged.add(line)
+
+    def paint_line(self, line, in_code, tokens):
+        # Painting is not an edit, so it goes straight to the widget
+        # instead of through the change tracker.
+        call = self.tracker.call
+        for kind in TOKEN_KINDS:
+            call('tag', 'remove', kind, f"{line}.0", f"{line}.end")
+        call('tag', 'add' if in_code else 'remove', BLOCK_TAG, f"{line}.0", f"{line}.end+1c")
+        by_kind = {}
+        for kind, start, end in tokens:
+            by_kind.setdefault(kind, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for kind, indices in by_kind.items():
+            call('tag', 'add', kind, *indices)
+
+    def stop(self):
+        self.worker.stop()
@@ -0,0 +1,70 @@
+import tkinter as tk
+
+REFRESH_MS = 500
+MAX_ROWS = 16
+
+class DebugOverlay(tk.Frame):
+    # Live view of the recorder, drawn over the top right corner of the
+    # window. F12 shows and hides it; it only refreshes while shown.
+    def __init__(self, root, recorder, saver, bodies):
+        super().__init__(root, bg='#0e141b', highlightthickness=1, highlightbackground='#3d6a8a')
+        self.root = root
+        self.recorder = recorder
+        self.saver = saver
+        self.bodies = bodies
+        self.job = None
+
+        self.text = tk.Text(self, bg='#0e141b', fg='#c7d5e0', relief=tk.FLAT,
+                            font=('Consolas', 9), width=78, height=MAX_ROWS + 12)
+        self.text.pack(fill=tk.BOTH, expand=True, padx=4, pady=(4, 0))
+
+        self.save_btn = tk.Button(self, text="Save trace", command=self.save_trace,
+                                  bg='#2a475e', fg='#ffffff', relief=tk.FLAT)
+        self.save_btn.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.status = tk.Label(self, bg='#0e141b', fg='#8f98a0', font=('Arial', 9))
+        self.status.pack(side=tk.LEFT, padx=4)
+
+        root.bind_all('<F12>', lambda e: self.toggle())
+
+    def toggle(self):
+        if self.winfo_ismapped():
+            self.place_forget()
+            if self.job is not None:
+                self.after_cancel(self.job)
+                self.job = None
+        else:
+            self.place(relx=1.0, rely=0.0, anchor='ne', x=-4, y=4)
+            self.lift()
+            self.refresh()
+
+    def refresh(self):
+        histograms, stalls = self.recorder.summaries()
+        lines = ["%-36s %6s %8s %8s %8s" % ("handler", "count", "p50 ms", "p95 ms", "max ms")]
+        ranked = sorted(histograms.items(), key=lambda item: -item[1]['p95_ms'])
+        for name, h in ranked[:MAX_ROWS]:
+            lines.append("%-36s %6d %8.2f %8.2f %8.2f" % (name[:36], h['count'], h['p50_ms'],
+                                                          h['p95_ms'], h['max_ms']))
+        stats = self.saver.stats()
+        lines.append("")
+        lines.append("autosave: lag %.2fs  pending %d  in flight %d  saves %d  last %.1f ms" % (
+            stats['lag'], stats['pending'], stats['in_flight'], stats['saves'],
+            stats['last_save_duration'] * 1000))
+        bodies = self.bodies.stats()
+        lines.append("bodies: hot %d (%.1f M chars)  cold %d (%.1f MB packed)" % (
+            bodies['resident'], bodies['resident_chars'] / 1e6, bodies['packed'], bodies['packed_bytes'] / 1e6))
+        lines.append("stalls: %d" % len(stalls))
+        if stalls:
+            last = stalls[-1]
+            lines.append("last stall %.0f ms in:" % (last['duration'] * 1000))
+            for frame in last['stack'][-4:]:
+                lines.append("  " + frame.strip().splitlines()[0])
+
+        self.text.configure(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(lines))
+        self.text.configure(state='disabled')
+        self.job = self.after(REFRESH_MS, self.refresh)
+
+    def save_trace(self):
+        self.recorder.dump()
+        self.status.configure(text="saved %s" % self.recorder.trace_path)
@@ -1,10 +1,12 @@
 import tkinter as tk
 
 class EditableLabel(tk.Frame):
-    def __init__(self, parent, text, **kwargs):
+    # `on_edit(new_text)` may return False to keep the old text.
+    def __init__(self, parent, text, on_edit=None, **kwargs):
         super().__init__(parent)
         self.configure(bg=kwargs.get('bg', '#1b2838'))
         self.text = text
+        self.on_edit = on_edit
         
         self.label = tk.Label(self, text=self.text, **kwargs)
         self.label.pack(side=tk.LEFT)
@@ -25,7 +27,12 @@ class EditableLabel(tk.Frame):
 
     def end_edit(self, event):
         new_text = self.entry.get().strip()
-        if new_text:
-            self.label.configure(text=new_text)
+        old_text = self.label.cget('text')
+        if new_text and new_text != old_text:
+            if self.on_edit is None or self.on_edit(new_text) is not False:
+                self.label.configure(text=new_text)
         self.entry.pack_forget()
-        self.label.pack(side=tk.LEFT)
\ No newline at end of file
+        self.label.pack(side=tk.LEFT)
+
+    def set_text(self, text):
+        self.label.configure(text=text)
\ No newline at end of file
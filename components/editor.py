@@ -1,8 +1,23 @@
+import os
 import tkinter as tk
-import re
+from contextlib import nullcontext
+from components.change_tracker import ChangeTracker, end_of
+from core.calculator import Worksheet, CalcError, format_value, is_number
+from components.code_highlighter import CodeHighlighter
+from components.status_bar import StatusBar
+from components.find_panel import FindPanel
+from components.inline_images import InlineImages
+from components.spell_checker import SpellChecker
+from core.notebook import TITLE_TAGS, derive_title
+from models.spans import (SPAN_TAGS, IMAGE_CHAR, encode_spans, decode_spans, decode_images, line_starts,
+                          index_to_offset, offset_to_index)
+
+TAG_BATCH = 2000
+FIRST_CHUNK = 16 * 1024
+LOAD_CHUNK = 128 * 1024
 
 class Editor(tk.Frame):
-    def __init__(self, parent, on_text_changed):
+    def __init__(self, parent, on_text_changed, blobs=None, speller=None):
         super().__init__(parent, bg='#1b2838')
         self.on_text_changed = on_text_changed
         
@@ -15,15 +30,19 @@ class Editor(tk.Frame):
             ("I", self.toggle_italic, "Italic (Ctrl+I)"),
             ("U", self.toggle_underline, "Underline (Ctrl+U)"),
             ("```", self.insert_code_block, "Code Block (Ctrl+K)"),
+            ("▣", self.insert_image, "Insert Image (Ctrl+Shift+I)"),
             ("=", self.calculate_formula, "Calculate (=)")
         ]
         
+        self.tooltips = []
         for text, command, tooltip in buttons:
             btn = tk.Button(self.toolbar, text=text, command=command,
                           bg='#2a475e', fg='#ffffff', relief=tk.FLAT,
                           font=button_font, width=3, height=1)
             btn.pack(side=tk.LEFT, padx=2, pady=2)
-            self.create_tooltip(btn, tooltip)
+            self.tooltips.append((btn, tooltip))
+        
+        self.progress = tk.Label(self.toolbar, bg='#2a475e', fg='#8f98a0', font=('Arial', 10))
         
         self.text_editor = tk.Text(self, wrap=tk.WORD, bg='#171d25', fg='#ffffff',
                                  insertbackground='#ffffff', relief=tk.FLAT,
@@ -36,12 +55,48 @@ class Editor(tk.Frame):
         self.text_editor.tag_configure('code', background='#2a2e33', foreground='#e6db74',
                                      font=('Consolas', 11), spacing1=5, spacing3=5)
         
+        self.tracker = ChangeTracker(self.text_editor)
+        self.tracker.add_listener(self.on_buffer_change)
+        self.tracker.add_listener(self.on_calc_change)
+        self.tracker.add_listener(self.on_undo_change)
+        self.undo = None
+        self.replaying = False
+        self.worksheet = Worksheet()
+        self.calc_seeded = False
+        self.calc_dirty = set()
+        self.calc_job = None
+        self.highlighter = CodeHighlighter(self.text_editor, self.tracker)
+        self.find = FindPanel(self)
+        self.images = InlineImages(self.text_editor, self.tracker, blobs)
+        self.spelling = SpellChecker(self, speller)
+        self.text_editor.configure(yscrollcommand=self.on_scroll)
+        self.title_dirty = False
+        self.unsynced = False
+        self.load_job = None
+        self.pending = None
+        
         self.text_editor.bind('<<Modified>>', self.on_text_change)
         self.text_editor.bind('<KeyRelease>', self.on_key_release)
         self.text_editor.bind('<Control-b>', lambda e: self.toggle_bold())
         self.text_editor.bind('<Control-i>', lambda e: self.toggle_italic())
         self.text_editor.bind('<Control-u>', lambda e: self.toggle_underline())
         self.text_editor.bind('<Control-k>', lambda e: self.insert_code_block())
+        self.text_editor.bind('<Control-I>', lambda e: self.insert_image())
+        self.text_editor.bind('<<Paste>>', self.paste)
+        self.text_editor.bind('<Control-z>', self.undo_step)
+        self.text_editor.bind('<Control-y>', self.redo_step)
+        self.text_editor.bind('<Control-Z>', self.redo_step)
+        # Replace Tk's emacs-style Ctrl+F (forward) and Ctrl+H (backspace).
+        self.text_editor.bind('<Control-f>', lambda e: self.show_find())
+        self.text_editor.bind('<Control-h>', lambda e: self.show_find(replace=True))
+        self.text_editor.bind('<Button-3>', self.spelling.on_menu)
+
+        self.status = StatusBar(self, self.text_editor, self.tracker)
+        self.status.pack(side=tk.BOTTOM, fill=tk.X, before=self.text_editor)
+
+    def build_deferred(self):
+        for widget, text in self.tooltips:
+            self.create_tooltip(widget, text)
 
     def create_tooltip(self, widget, text):
         def show_tooltip(event):
@@ -66,6 +121,16 @@ class Editor(tk.Frame):
         widget.bind('<Enter>', show_tooltip)
         widget.bind('<Leave>', hide_tooltip)
 
+    def on_scroll(self, *args):
+        self.highlighter.on_scroll(*args)
+        self.find.on_scroll()
+        self.images.schedule_view()
+        self.spelling.on_scroll()
+
+    def show_find(self, replace=False):
+        self.find.show(replace)
+        return 'break'
+
     def toggle_bold(self, event=None):
         self.toggle_tag('bold')
         return 'break'
@@ -79,6 +144,8 @@ class Editor(tk.Frame):
         return 'break'
 
     def toggle_tag(self, tag_name):
+        if self.loading:
+            return
         try:
             if self.text_editor.tag_ranges(tk.SEL):
                 ranges = self.text_editor.tag_ranges(tk.SEL)
@@ -86,80 +153,447 @@ class Editor(tk.Frame):
                     self.text_editor.tag_remove(tag_name, *ranges)
                 else:
                     self.text_editor.tag_add(tag_name, *ranges)
+                self.text_editor.edit_modified(True)
         except tk.TclError:
             pass
 
     def insert_code_block(self, event=None):
+        with self.undo_group():
+            try:
+                if self.text_editor.tag_ranges(tk.SEL):
+                    selected_text = self.text_editor.get(tk.SEL_FIRST, tk.SEL_LAST)
+                    self.text_editor.delete(tk.SEL_FIRST, tk.SEL_LAST)
+                    self.text_editor.insert(tk.INSERT, f"\n```\n{selected_text}\n```\n")
+                    start = self.text_editor.index("insert-2l linestart")
+                    end = self.text_editor.index("insert-1l lineend+1c")
+                    self.text_editor.tag_add('code', start, end)
+                else:
+                    self.text_editor.insert(tk.INSERT, "\n```\n\n```\n")
+                    start = self.text_editor.index("insert-2l linestart")
+                    end = self.text_editor.index("insert lineend+1c")
+                    self.text_editor.tag_add('code', start, end)
+                    self.text_editor.mark_set(tk.INSERT, "insert-2l")
+            except tk.TclError:
+                pass
+        return 'break'
+
+    def insert_image(self, event=None):
+        if self.loading or self.images.blobs is None:
+            return 'break'
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(parent=self, title="Insert Image",
+                                          filetypes=[("Images", "*.png *.gif"), ("All files", "*")])
+        if path:
+            self.add_image(path)
+        return 'break'
+
+    def paste(self, event=None):
+        # A copied PNG or GIF file comes through the clipboard as its path.
         try:
-            if self.text_editor.tag_ranges(tk.SEL):
-                selected_text = self.text_editor.get(tk.SEL_FIRST, tk.SEL_LAST)
-                self.text_editor.delete(tk.SEL_FIRST, tk.SEL_LAST)
-                self.text_editor.insert(tk.INSERT, f"\n```\n{selected_text}\n```\n")
-                start = self.text_editor.index("insert-2l linestart")
-                end = self.text_editor.index("insert-1l lineend+1c")
-                self.text_editor.tag_add('code', start, end)
-            else:
-                self.text_editor.insert(tk.INSERT, "\n```\n\n```\n")
-                start = self.text_editor.index("insert-2l linestart")
-                end = self.text_editor.index("insert lineend+1c")
-                self.text_editor.tag_add('code', start, end)
-                self.text_editor.mark_set(tk.INSERT, "insert-2l")
+            path = self.clipboard_get().strip()
         except tk.TclError:
-            pass
+            return None
+        if path.startswith('file://'):
+            path = path[len('file://'):]
+        if '\n' in path or not path.lower().endswith(('.png', '.gif')) or not os.path.isfile(path):
+            return None
+        if not self.loading and self.images.blobs is not None:
+            self.add_image(path)
         return 'break'
 
+    def add_image(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            data = None
+            error = str(e)
+        else:
+            error = "Only PNG and GIF images can be inserted."
+        if data is None or self.images.insert(tk.INSERT, data) is None:
+            from tkinter import messagebox
+            messagebox.showerror("Insert Image", error, parent=self)
+            return
+        self.text_editor.see(tk.INSERT)
+        self.text_editor.edit_modified(True)
+
     def calculate_formula(self, event=None):
         try:
             if self.text_editor.tag_ranges(tk.SEL):
                 selected_text = self.text_editor.get(tk.SEL_FIRST, tk.SEL_LAST)
-            else:
-                line = self.text_editor.get("insert linestart", "insert lineend")
-                selected_text = line
-            
-            if '=' not in selected_text:
-                return 'break'
-            
-            expression = selected_text.split('=')[0].strip()
-            expression = re.sub(r'\s+', '', expression)
-            
-            try:
-                if re.match(r'^[\d+\-*/().]+$', expression):
-                    result = eval(expression)
-                    formatted_result = f"{expression} = {result}"
-                    if self.text_editor.tag_ranges(tk.SEL):
+                if '=' not in selected_text:
+                    return 'break'
+                expression = selected_text.split('=')[0].strip()
+                try:
+                    result = self.worksheet.evaluate_text(expression)
+                except (CalcError, ArithmeticError, ValueError, TypeError):
+                    return 'break'
+                if not isinstance(result, list):
+                    with self.undo_group():
                         self.text_editor.delete(tk.SEL_FIRST, tk.SEL_LAST)
-                        self.text_editor.insert(tk.INSERT, formatted_result)
-                    else:
-                        self.text_editor.delete("insert linestart", "insert lineend")
-                        self.text_editor.insert("insert linestart", formatted_result)
-            except:
-                pass
+                        self.text_editor.insert(tk.INSERT, f"{expression} = {format_value(result)}")
+            else:
+                number = int(self.text_editor.index(tk.INSERT).split('.')[0])
+                self.recalculate(explicit=number)
         except tk.TclError:
             pass
         return 'break'
 
+    def on_calc_change(self, kind, start, end, text):
+        # Mirrors the line structure into the worksheet; the dirty lines are
+        # re-read once the event loop is idle.
+        if kind == 'reset':
+            if not self.loading:
+                self.seed_worksheet()
+                self.worksheet.load(self.text_editor.get("1.0", "end-1c"))
+                self.schedule_recalc()
+            return
+        if kind == 'insert':
+            lines = text.count('\n')
+            if lines:
+                self.worksheet.insert_lines(start[0], lines)
+            self.calc_dirty.update(range(start[0], start[0] + lines + 1))
+        elif kind == 'delete':
+            if end[0] > start[0]:
+                self.worksheet.remove_lines(start[0] + 1, end[0] - start[0])
+                self.calc_dirty = {n if n <= start[0] else n - (end[0] - start[0])
+                                   for n in self.calc_dirty if not start[0] < n <= end[0]}
+            self.calc_dirty.add(start[0])
+        else:
+            return
+        self.schedule_recalc()
+
+    def schedule_recalc(self):
+        if self.calc_job is None:
+            self.calc_job = self.after_idle(self.recalculate)
+
+    def recalculate(self, explicit=None):
+        # The line holding the cursor is only rewritten when the user asked
+        # for it with "="; every other result line follows its inputs. The
+        # first run works out the values of the note as it was opened, so
+        # only what the edits since then changed is shown; it waits until
+        # then, as it reads every calculation line.
+        if self.calc_job is not None:
+            self.after_cancel(self.calc_job)
+            self.calc_job = None
+        self.seed_worksheet()
+        dirty, self.calc_dirty = self.calc_dirty, set()
+        for number in sorted(dirty):
+            self.worksheet.set_line(number, self.text_editor.get(f"{number}.0", f"{number}.end"))
+        changed = self.worksheet.recalc()
+        before = self.worksheet.before
+
+        cursor = int(self.text_editor.index(tk.INSERT).split('.')[0])
+        if explicit is not None and explicit in self.worksheet.entries:
+            changed[explicit] = self.worksheet.values.get(explicit)
+        for number, value in sorted(changed.items()):
+            entry = self.worksheet.entries.get(number)
+            if value is None or entry is None or not entry.shows_result:
+                continue
+            if number == explicit:
+                self.show_result(number, value, explicit=True)
+            elif number != cursor and not self.highlighter.in_code(number):
+                self.show_result(number, value, before.get(number))
+        if explicit is not None:
+            self.text_editor.mark_set(tk.INSERT, f"{explicit}.end")
+
+    def seed_worksheet(self):
+        if not self.calc_seeded:
+            self.calc_seeded = True
+            self.worksheet.recalc()
+
+    def show_result(self, number, value, shown=None, explicit=False):
+        # Only an answer is replaced: what follows the last "=" must be
+        # empty or the result `shown` there before; asked for with "=", any
+        # number. Anything else there, such as "4 apples", is the user's.
+        line = self.text_editor.get(f"{number}.0", f"{number}.end")
+        at = line.rfind('=')
+        head, tail = line[:at].rstrip(), line[at + 1:].strip()
+        if explicit:
+            answer = is_number(tail)
+        else:
+            answer = shown is not None and tail == format_value(shown)
+        if tail and not answer:
+            return
+        result = f" = {format_value(value)}"
+        if line[len(head):] != result:
+            with self.undo_group():
+                self.text_editor.delete(f"{number}.{len(head)}", f"{number}.end")
+                self.text_editor.insert(f"{number}.{len(head)}", result)
+
+    def undo_group(self):
+        return self.undo.group() if self.undo else nullcontext()
+
+    def on_undo_change(self, kind, start, end, text):
+        if self.replaying or self.undo is None:
+            return
+        if kind == 'insert':
+            self.undo.record('insert', start, text)
+        elif kind == 'delete':
+            self.undo.record('delete', start, text, self.runs_between(start, end))
+        elif kind == 'reset':
+            self.undo.clear()
+
+    def runs_between(self, start, end):
+        # Formatting inside a range about to be deleted, as offsets from
+        # its start, so undoing the deletion can put it back.
+        first, last = '%d.%d' % start, '%d.%d' % end
+        active = self.text_editor.tag_names(first)
+        runs = {}
+        for tag in SPAN_TAGS:
+            found = []
+            index = first
+            if tag in active:
+                index = self.text_editor.tag_prevrange(tag, first + '+1c')[1]
+                found.append((first, index))
+            while self.text_editor.compare(index, '<', last):
+                run = self.text_editor.tag_nextrange(tag, index, last)
+                if not run:
+                    break
+                found.append(run)
+                index = run[1]
+            for run_start, run_end in found:
+                if self.text_editor.compare(run_end, '>', last):
+                    run_end = last
+                runs.setdefault(tag, []).append((self.offset_from(first, run_start),
+                                                 self.offset_from(first, run_end)))
+        return runs or None
+
+    def offset_from(self, first, index):
+        return self.tracker.call('count', '-chars', first, index) if index != first else 0
+
+    def undo_step(self, event=None):
+        # Not while a replace-all has the buffer; the step would be lost.
+        if self.undo and not self.loading and not self.find.busy:
+            step = self.undo.undo()
+            if step:
+                self.replay(reversed(step), undo=True)
+        return 'break'
+
+    def redo_step(self, event=None):
+        if self.undo and not self.loading and not self.find.busy:
+            step = self.undo.redo()
+            if step:
+                self.replay(step, undo=False)
+        return 'break'
+
+    def replay(self, ops, undo):
+        # Undoing an insert deletes it and undoing a delete inserts it back
+        # with its formatting; redo does the op as recorded.
+        self.replaying = True
+        try:
+            for kind, start, text, runs in ops:
+                index = '%d.%d' % start
+                if (kind == 'insert') != undo:
+                    self.text_editor.insert(index, text)
+                    for tag, tag_runs in (runs or {}).items():
+                        for run_start, run_end in tag_runs:
+                            self.text_editor.tag_add(tag, f"{index}+{run_start}c", f"{index}+{run_end}c")
+                    cursor = '%d.%d' % end_of(start, text)
+                else:
+                    self.text_editor.delete(index, '%d.%d' % end_of(start, text))
+                    cursor = index
+            self.text_editor.mark_set(tk.INSERT, cursor)
+            self.text_editor.see(tk.INSERT)
+        finally:
+            self.replaying = False
+
+    def attach_undo(self, undo):
+        if self.loading:
+            self.pending['undo'] = undo
+        else:
+            self.undo = undo
+
+    def replace_content(self, content):
+        # Swaps the whole text as one undoable step.
+        with self.undo_group():
+            self.text_editor.delete("1.0", "end-1c")
+            self.text_editor.insert("1.0", content)
+
     def on_key_release(self, event):
         if event.char == '=' and not event.state & 0x4:
             self.calculate_formula()
 
     def get_content(self):
-        return self.text_editor.get("1.0", tk.END)
+        # get() leaves embedded images out, so each one is put back as an
+        # IMAGE_CHAR to keep offsets in step with the widget's indices.
+        self.unsynced = False
+        content = self.text_editor.get("1.0", "end-1c")
+        placed = self.images.placed("1.0", "end-1c")
+        if not placed:
+            return content
+        lines = content.split('\n')
+        for index, _ in reversed(placed):
+            line, column = map(int, index.split('.'))
+            text = lines[line - 1]
+            lines[line - 1] = text[:column] + IMAGE_CHAR + text[column:]
+        return '\n'.join(lines)
+
+    def get_title(self):
+        return derive_title(self.text_editor.get("1.0", "1.end"))
 
     def get_first_line_tags(self):
-        tags = []
-        for tag in ['bold', 'italic', 'underline']:
+        return [tag for tag in TITLE_TAGS if self.text_editor.tag_nextrange(tag, "1.0", "2.0")]
+
+    def get_spans(self, content):
+        starts = line_starts(content)
+        runs = {}
+        for tag in SPAN_TAGS:
             ranges = self.text_editor.tag_ranges(tag)
-            if ranges and self.text_editor.compare(ranges[0], "<=", "1.end"):
-                tags.append(tag)
-        return tags
+            if ranges:
+                offsets = [index_to_offset(starts, index) for index in ranges]
+                runs[tag] = list(zip(offsets[::2], offsets[1::2]))
+        images = [(index_to_offset(starts, index), digest)
+                  for index, digest in self.images.placed("1.0", "end-1c")]
+        return encode_spans(runs, images)
 
-    def set_content(self, content):
+    def apply_spans(self, starts, tag, tag_runs):
+        # One tag_add call covers a whole batch of runs, so restoring a
+        # heavily formatted note costs a handful of Tcl round trips.
+        for i in range(0, len(tag_runs), TAG_BATCH):
+            indices = []
+            for start, end in tag_runs[i:i + TAG_BATCH]:
+                indices.append(offset_to_index(starts, start))
+                indices.append(offset_to_index(starts, end))
+            self.text_editor.tag_add(tag, *indices)
+
+    def set_content(self, content, spans="", undo=None):
+        # The first screenful goes in right away; the rest is streamed in
+        # by load_next_chunk so the window paints and stays responsive.
+        # The buffer is read-only until the load completes, and a new
+        # set_content preempts a load that is still running.
+        self.cancel_load()
+        self.find.abort()
+        self.undo = None
+        self.worksheet = Worksheet()
+        self.calc_seeded = False
+        self.calc_dirty = set()
+        self.tracker.suspend()
+        self.text_editor.configure(state='normal')
         self.text_editor.delete("1.0", tk.END)
-        self.text_editor.insert("1.0", content)
+        self.images.reset()
+        self.spelling.reset()
+        self.status.loading()
+        self.pending = {
+            'content': content,
+            'loaded': 0,
+            'starts': [0],
+            'runs': decode_spans(spans),
+            'applied': {},
+            'images': decode_images(spans),
+            'embedded': 0,
+            'calc': (0, 1),
+            'undo': undo,
+        }
+        self.insert_chunk(FIRST_CHUNK)
+        self.text_editor.mark_set(tk.INSERT, "1.0")
+        self.text_editor.see("1.0")
+        if self.pending['loaded'] < len(content):
+            self.text_editor.configure(state='disabled')
+            self.show_progress()
+            self.load_job = self.after(1, self.load_next_chunk)
+        else:
+            self.finish_load()
+
+    def insert_chunk(self, size):
+        pending = self.pending
+        base = pending['loaded']
+        chunk = pending['content'][base:base + size]
+        self.text_editor.insert("end-1c", chunk)
+        pending['loaded'] = loaded = base + len(chunk)
+
+        starts = pending['starts']
+        pos = chunk.find('\n')
+        while pos != -1:
+            starts.append(base + pos + 1)
+            pos = chunk.find('\n', pos + 1)
+
+        # Each image came in as an IMAGE_CHAR, which it takes the place of.
+        images = pending['images']
+        while pending['embedded'] < len(images) and images[pending['embedded']][0] < loaded:
+            offset, digest = images[pending['embedded']]
+            pending['embedded'] += 1
+            if pending['content'][offset] == IMAGE_CHAR:
+                index = offset_to_index(starts, offset)
+                self.text_editor.delete(index)
+                self.images.embed(index, digest)
+
+        # Runs are sorted per tag, so each tag keeps a cursor to the first
+        # run that did not fit in the text loaded so far.
+        for tag, tag_runs in pending['runs'].items():
+            first = pending['applied'].get(tag, 0)
+            last = first
+            while last < len(tag_runs) and tag_runs[last][1] <= loaded:
+                last += 1
+            if last > first:
+                self.apply_spans(starts, tag, tag_runs[first:last])
+                pending['applied'][tag] = last
+
+        # The worksheet is fed the lines completed by this chunk, so a note
+        # is scanned for calculations a chunk at a time rather than before
+        # its first screenful.
+        self.feed_worksheet(starts[-1], len(starts))
+
+    def feed_worksheet(self, end, number):
+        pending = self.pending
+        offset, first = pending['calc']
+        if end > offset:
+            self.worksheet.add_lines(pending['content'][offset:end], first)
+            pending['calc'] = (end, number)
+
+    def load_next_chunk(self):
+        self.load_job = None
+        self.text_editor.configure(state='normal')
+        self.insert_chunk(LOAD_CHUNK)
+        if self.pending['loaded'] < len(self.pending['content']):
+            self.text_editor.configure(state='disabled')
+            self.show_progress()
+            self.load_job = self.after(1, self.load_next_chunk)
+        else:
+            self.finish_load()
+
+    def show_progress(self):
+        percent = self.pending['loaded'] * 100 // max(len(self.pending['content']), 1)
+        self.progress.configure(text=f"Loading {percent}%")
+        if not self.progress.winfo_ismapped():
+            self.progress.pack(side=tk.RIGHT, padx=6)
+
+    def finish_load(self):
+        self.feed_worksheet(self.pending['loaded'], None)
+        self.tracker.resume()
+        self.undo = self.pending['undo']
+        self.pending = None
+        self.progress.pack_forget()
+        self.text_editor.configure(state='normal')
+        self.text_editor.edit_modified(False)
+        self.title_dirty = False
+        self.unsynced = False
+
+    def cancel_load(self):
+        if self.load_job is not None:
+            self.after_cancel(self.load_job)
+            self.load_job = None
+        if self.pending is not None:
+            self.finish_load()
+
+    @property
+    def loading(self):
+        return self.pending is not None
+
+    def on_buffer_change(self, kind, start, end, text):
+        if kind == 'reset' or start[0] == 1 and (kind != 'tag' or text in TITLE_TAGS):
+            self.title_dirty = True
 
     def on_text_change(self, event):
-        content = self.get_content()
-        title = content.split('\n')[0].strip() or "Untitled Note"
-        tags = self.get_first_line_tags()
-        self.on_text_changed(content, title, tags)
+        # Only line 1 feeds the title, so the rest of the buffer is left
+        # alone here; the owner pulls the full text with get_content() when
+        # it actually saves.
+        if not self.text_editor.edit_modified() or self.loading:
+            return
+        self.unsynced = True
+        if self.title_dirty:
+            self.title_dirty = False
+            self.on_text_changed(self.get_title(), self.get_first_line_tags())
+        else:
+            self.on_text_changed(None, None)
         self.text_editor.edit_modified(False)
\ No newline at end of file
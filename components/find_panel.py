@@ -0,0 +1,390 @@
+import queue
+import re
+import tkinter as tk
+from array import array
+from bisect import bisect_left
+from core.find import FindWorker, compile_query, expander
+
+FEED_CHARS = 1024 * 1024
+POLL_MS = 15
+EDIT_PAUSE_MS = 300
+VIEW_MARGIN = 20
+REPLACE_BATCH = 200
+MATCH_TAG = 'find_match'
+CURRENT_TAG = 'find_current'
+
+class FindPanel(tk.Frame):
+    # Ctrl+F / Ctrl+H bar above the editor. The buffer is handed to a
+    # FindWorker one chunk per event loop turn, so neither reading a large
+    # note nor searching it holds up typing; matches stream back and only
+    # those on the lines in (or near) the viewport are tagged. Editing the
+    # note drops the matches and searches again once typing pauses.
+    #
+    # Replace-all runs a scan that returns one edit per line, then applies
+    # the edits bottom up, a batch per turn, as a single undo step. The
+    # editor is read-only from the scan until the last edit is in.
+    def __init__(self, editor):
+        super().__init__(editor, bg='#2a475e')
+        self.editor = editor
+        self.text = editor.text_editor
+        self.call = editor.tracker.call
+        self.worker = FindWorker()
+        self.generation = 0
+        self.feed_index = None
+        self.feed_job = None
+        self.poll_job = None
+        self.view_job = None
+        self.edit_job = None
+        self.starts = array('I')
+        self.positions = array('I')
+        self.searching = False
+        self.capped = False
+        self.current = None
+        self.painted = None
+        self.hunks = None
+        self.replacing = None
+        self.undo_group = None
+
+        self.query = tk.StringVar()
+        self.replacement = tk.StringVar()
+        self.regex = tk.BooleanVar()
+        self.case = tk.BooleanVar()
+
+        entry_options = dict(bg='#171d25', fg='#ffffff', insertbackground='#ffffff',
+                             relief=tk.FLAT, font=('Consolas', 10), width=30)
+        button_options = dict(bg='#2a475e', fg='#ffffff', relief=tk.FLAT, font=('Arial', 9))
+        check_options = dict(bg='#2a475e', fg='#c7d5e0', selectcolor='#171d25',
+                             activebackground='#2a475e', font=('Arial', 9))
+
+        find_row = tk.Frame(self, bg='#2a475e')
+        find_row.pack(fill=tk.X)
+        self.find_entry = tk.Entry(find_row, textvariable=self.query, **entry_options)
+        self.find_entry.pack(side=tk.LEFT, padx=2, pady=2)
+        tk.Checkbutton(find_row, text=".*", variable=self.regex, command=self.restart,
+                       **check_options).pack(side=tk.LEFT)
+        tk.Checkbutton(find_row, text="Aa", variable=self.case, command=self.restart,
+                       **check_options).pack(side=tk.LEFT)
+        tk.Button(find_row, text="↑", command=lambda: self.step(-1), **button_options).pack(side=tk.LEFT)
+        tk.Button(find_row, text="↓", command=lambda: self.step(1), **button_options).pack(side=tk.LEFT)
+        self.count = tk.Label(find_row, bg='#2a475e', fg='#8f98a0', font=('Arial', 9))
+        self.count.pack(side=tk.LEFT, padx=6)
+        tk.Button(find_row, text="✕", command=self.hide, **button_options).pack(side=tk.RIGHT)
+
+        self.replace_row = tk.Frame(self, bg='#2a475e')
+        self.replace_entry = tk.Entry(self.replace_row, textvariable=self.replacement, **entry_options)
+        self.replace_entry.pack(side=tk.LEFT, padx=2, pady=2)
+        tk.Button(self.replace_row, text="Replace", command=self.replace_one,
+                  **button_options).pack(side=tk.LEFT)
+        tk.Button(self.replace_row, text="All", command=self.replace_all,
+                  **button_options).pack(side=tk.LEFT)
+
+        for entry in (self.find_entry, self.replace_entry):
+            entry.bind('<Return>', lambda e: self.step(1))
+            entry.bind('<Shift-Return>', lambda e: self.step(-1))
+            entry.bind('<Escape>', lambda e: self.hide())
+        self.replace_entry.bind('<Control-Return>', lambda e: self.replace_all())
+        self.query.trace_add('write', lambda *args: self.restart())
+
+        self.text.tag_configure(MATCH_TAG, background='#5c4d1a')
+        self.text.tag_configure(CURRENT_TAG, background='#b8860b', foreground='#000000')
+        self.text.tag_raise(MATCH_TAG)
+        self.text.tag_raise(CURRENT_TAG)
+        editor.tracker.add_listener(self.on_change)
+
+    @property
+    def visible(self):
+        return self.winfo_ismapped()
+
+    def show(self, replace=False):
+        if not self.visible:
+            self.pack(fill=tk.X, before=self.text)
+        if replace:
+            self.replace_row.pack(fill=tk.X)
+        else:
+            self.replace_row.pack_forget()
+        if self.text.tag_ranges(tk.SEL):
+            selected = self.text.get(tk.SEL_FIRST, tk.SEL_LAST)
+            if selected and '\n' not in selected:
+                self.query.set(selected)
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, tk.END)
+        self.restart()
+
+    def hide(self):
+        if self.replacing is not None:
+            return
+        self.cancel()
+        self.clear_matches()
+        self.pack_forget()
+        self.text.focus_set()
+
+    def cancel(self):
+        self.generation += 1
+        self.worker.cancel(self.generation)
+        self.searching = False
+        for job in ('feed_job', 'edit_job'):
+            if getattr(self, job) is not None:
+                self.after_cancel(getattr(self, job))
+                setattr(self, job, None)
+
+    def clear_matches(self):
+        self.starts = array('I')
+        self.positions = array('I')
+        self.current = None
+        self.capped = False
+        self.unpaint()
+
+    def pattern(self):
+        query = self.query.get()
+        if not query:
+            return None
+        try:
+            pattern = compile_query(query, self.regex.get(), self.case.get())
+        except re.error as e:
+            self.count.configure(text=str(e), fg='#e06c75')
+            return None
+        self.count.configure(fg='#8f98a0')
+        return pattern
+
+    def restart(self):
+        # A new query, new options or an edit: search from scratch.
+        if not self.visible or self.replacing is not None:
+            return
+        self.cancel()
+        self.clear_matches()
+        pattern = self.pattern()
+        if pattern is None:
+            if not self.query.get():
+                self.count.configure(text="")
+            return
+        self.begin(pattern)
+
+    def begin(self, pattern, replace=None):
+        self.worker.start(self.generation, pattern, replace)
+        self.searching = True
+        self.feed_index = "1.0"
+        self.show_count()
+        self.feed()
+        self.schedule_poll()
+
+    def feed(self):
+        # One chunk per turn; the first goes out right away so the first
+        # hits show at once.
+        self.feed_job = None
+        end = self.call('index', f"{self.feed_index}+{FEED_CHARS}c")
+        final = self.text.compare(end, '>=', 'end-1c')
+        self.worker.feed(self.generation, self.call('get', self.feed_index, end), final)
+        self.feed_index = end
+        if not final:
+            self.feed_job = self.after(1, self.feed)
+
+    def schedule_poll(self):
+        if self.poll_job is None:
+            self.poll_job = self.after(POLL_MS, self.poll)
+
+    def poll(self):
+        self.poll_job = None
+        added = False
+        while True:
+            try:
+                generation, positions, texts, done, capped = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            if self.hunks is not None:
+                self.hunks[0].extend(positions)
+                self.hunks[1].extend(texts)
+            else:
+                self.positions.extend(positions)
+                self.starts.extend(positions[::4])
+                added = True
+            if done:
+                self.searching = False
+                self.capped = capped
+        if self.hunks is not None and not self.searching:
+            self.apply_hunks()
+            return
+        if added and self.current is None:
+            self.pick_near_cursor()
+        self.show_count()
+        if added:
+            self.schedule_view()
+        if self.searching:
+            self.schedule_poll()
+
+    def match_count(self):
+        return len(self.positions) // 4
+
+    def show_count(self):
+        total = self.match_count()
+        if self.hunks is not None:
+            text = "Replacing..."
+        elif total == 0:
+            text = "Searching..." if self.searching else "No results"
+        else:
+            more = "+" if self.capped else "..." if self.searching else ""
+            current = f"{self.current + 1} of " if self.current is not None else ""
+            text = f"{current}{total:,}{more}"
+        self.count.configure(text=text)
+
+    def match(self, number):
+        i = number * 4
+        p = self.positions
+        return f"{p[i]}.{p[i + 1]}", f"{p[i + 2]}.{p[i + 3]}"
+
+    def first_after(self, index):
+        # Number of the first match starting at or after `index`.
+        line, column = map(int, index.split('.'))
+        number = bisect_left(self.starts, line)
+        while number < self.match_count() and self.starts[number] == line and \
+                self.positions[number * 4 + 1] < column:
+            number += 1
+        return number
+
+    def pick_near_cursor(self):
+        number = self.first_after(self.call('index', tk.INSERT))
+        if number < self.match_count():
+            self.select(number, move=False)
+
+    def step(self, direction):
+        total = self.match_count()
+        if not total:
+            return 'break'
+        if self.current is None:
+            number = self.first_after(self.call('index', tk.INSERT))
+            if direction < 0:
+                number -= 1
+        else:
+            number = self.current + direction
+        self.select(number % total)
+        return 'break'
+
+    def select(self, number, move=True):
+        self.current = number
+        start, end = self.match(number)
+        self.call('tag', 'remove', CURRENT_TAG, '1.0', 'end')
+        self.call('tag', 'add', CURRENT_TAG, start, end)
+        if move:
+            self.text.mark_set(tk.INSERT, end)
+            self.text.see(start)
+        self.show_count()
+        self.schedule_view()
+
+    def on_scroll(self):
+        if self.match_count():
+            self.schedule_view()
+
+    def schedule_view(self):
+        if self.view_job is None:
+            self.view_job = self.after_idle(self.paint_view)
+
+    def unpaint(self):
+        self.call('tag', 'remove', MATCH_TAG, '1.0', 'end')
+        self.call('tag', 'remove', CURRENT_TAG, '1.0', 'end')
+        self.painted = None
+
+    def paint_view(self):
+        # Tags only the matches that start on the lines in view, plus a
+        # margin, in one call; scrolling repaints.
+        self.view_job = None
+        if not self.match_count():
+            return
+        first = int(self.call('index', '@0,0').split('.')[0]) - VIEW_MARGIN
+        last = int(self.call('index', f'@0,{self.text.winfo_height()}').split('.')[0]) + VIEW_MARGIN
+        low, high = bisect_left(self.starts, first), bisect_left(self.starts, last + 1)
+        if self.painted == (low, high):
+            return
+        self.call('tag', 'remove', MATCH_TAG, '1.0', 'end')
+        indices = []
+        for number in range(low, high):
+            indices.extend(self.match(number))
+        if indices:
+            self.call('tag', 'add', MATCH_TAG, *indices)
+        self.painted = (low, high)
+
+    def on_change(self, kind, start, end, text):
+        # Our own replacements are already accounted for.
+        if not self.visible or self.replacing is not None or kind == 'tag':
+            return
+        self.cancel()
+        self.clear_matches()
+        self.count.configure(text="")
+        self.edit_job = self.after(EDIT_PAUSE_MS, self.restart)
+
+    def replace_one(self):
+        if self.current is None:
+            self.step(1)
+            return
+        pattern = self.pattern()
+        start, end = self.match(self.current)
+        old = self.call('get', start, end)
+        found = pattern and pattern.fullmatch(old)
+        if not found:
+            return
+        new = expander(self.replacement.get(), self.regex.get())(found)
+        with self.editor.undo_group():
+            self.text.delete(start, end)
+            self.text.insert(start, new)
+        self.text.mark_set(tk.INSERT, f"{start}+{len(new)}c")
+        # Search again at once rather than after the typing pause.
+        self.restart()
+
+    def replace_all(self):
+        pattern = self.pattern()
+        if pattern is None or self.replacing is not None or self.editor.loading:
+            return
+        self.cancel()
+        self.clear_matches()
+        self.text.configure(state='disabled')
+        self.hunks = (array('I'), [])
+        self.begin(pattern, expander(self.replacement.get(), self.regex.get()))
+
+    def apply_hunks(self):
+        positions, texts = self.hunks
+        self.replacing = len(texts)
+        self.undo_group = self.editor.undo_group()
+        self.undo_group.__enter__()
+        self.apply_batch()
+
+    def apply_batch(self):
+        # Bottom up, so the positions of the edits still to come hold.
+        positions, texts = self.hunks
+        self.text.configure(state='normal')
+        stop = max(self.replacing - REPLACE_BATCH, 0)
+        for number in range(self.replacing - 1, stop - 1, -1):
+            i = number * 4
+            self.text.replace(f"{positions[i]}.{positions[i + 1]}",
+                              f"{positions[i + 2]}.{positions[i + 3]}", texts[number])
+        self.replacing = stop
+        if stop:
+            self.text.configure(state='disabled')
+            self.count.configure(text=f"Replacing... {len(texts) - stop:,} of {len(texts):,} lines")
+            self.feed_job = self.after(1, self.apply_batch)
+            return
+        self.end_replace()
+        self.count.configure(text=f"Replaced on {len(texts):,} lines" if texts else "No results")
+
+    def end_replace(self):
+        if self.undo_group is not None:
+            self.undo_group.__exit__(None, None, None)
+            self.undo_group = None
+        self.hunks = None
+        self.replacing = None
+        self.text.configure(state='normal')
+
+    @property
+    def busy(self):
+        # A replace-all is scanning or applying its edits.
+        return self.hunks is not None
+
+    def abort(self):
+        # The editor is about to load another note; a replace-all still
+        # going stops where it is, as one undo step.
+        if self.hunks is not None:
+            self.end_replace()
+        self.cancel()
+        self.clear_matches()
+
+    def stop(self):
+        self.worker.stop()
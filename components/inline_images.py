@@ -0,0 +1,150 @@
+import tkinter as tk
+from collections import OrderedDict
+from storage.blobs import image_size
+
+VIEW_MARGIN = 10
+MAX_WIDTH = 640
+BUDGET_BYTES = 64 * 1024 * 1024
+
+
+class InlineImages:
+    # Images embedded in the editor's text. Each one goes in as a shared
+    # 1x1 placeholder padded out to the image's size, which costs no pixels
+    # and keeps the layout from jumping; only images on the lines in (or
+    # near) the viewport are read from the BlobStore and decoded, one per
+    # event loop turn. Wide images are shrunk to MAX_WIDTH. Decoded images
+    # are shared by every embedding of the same blob and kept in an LRU
+    # across notes, up to `budget` bytes of pixels; evicted ones get their
+    # placeholders back. An embedding is named after its digest, so the
+    # widget itself says which blob each one shows.
+    def __init__(self, text_widget, tracker, blobs=None, budget=BUDGET_BYTES):
+        self.text = text_widget
+        self.call = tracker.call
+        self.blobs = blobs
+        self.budget = budget
+        self.placeholder = tk.PhotoImage(master=text_widget, width=1, height=1)
+        self.sizes = {}
+        self.broken = set()
+        self.decoded = OrderedDict()
+        self.cost = 0
+        self.shown = {}
+        self.count = 0
+        self.view_job = None
+
+    def reset(self):
+        # The editor dropped its text, and with it every embedding.
+        self.shown = {}
+        self.count = 0
+        for _, _, names in self.decoded.values():
+            names.clear()
+
+    def padding(self, digest):
+        # Half the size the image will be shown at, for the placeholder.
+        size = self.sizes.get(digest)
+        if size is None:
+            head = self.blobs.read(digest, 24) if self.blobs else None
+            width, height = image_size(head or b'') or (0, 0)
+            scale = max(-(-width // MAX_WIDTH), 1)
+            size = self.sizes[digest] = (width // scale // 2, height // scale // 2)
+        return size
+
+    def embed(self, index, digest):
+        # Goes around the change tracker: the text on either side is
+        # unchanged, so nothing that mirrors it needs to know.
+        padx, pady = self.padding(digest)
+        name = self.call('image', 'create', index, '-image', self.placeholder, '-name', digest,
+                         '-padx', padx, '-pady', pady)
+        # Tk reuses the names of deleted embeddings.
+        self.shown.pop(name, None)
+        self.count += 1
+        self.schedule_view()
+
+    def insert(self, index, data):
+        # A new image from a file; None unless it is a PNG or GIF.
+        if image_size(data[:24]) is None:
+            return None
+        digest = self.blobs.put(data)
+        self.embed(index, digest)
+        return digest
+
+    def placed(self, first="1.0", last="end"):
+        # [(index, digest)] in text order.
+        if not self.count:
+            return []
+        return [(index, name.split('#', 1)[0])
+                for _, name, index in self.text.dump(first, last, image=True)]
+
+    def schedule_view(self):
+        if self.view_job is None and self.count:
+            self.view_job = self.text.after_idle(self.paint_view)
+
+    def paint_view(self):
+        self.view_job = None
+        first = int(self.call('index', '@0,0').split('.')[0]) - VIEW_MARGIN
+        last = int(self.call('index', f'@0,{self.text.winfo_height()}').split('.')[0]) + VIEW_MARGIN
+        visible = set()
+        decoded = more = False
+        for _, name, _ in self.text.dump(f"{max(first, 1)}.0", f"{last}.0 lineend", image=True):
+            digest = name.split('#', 1)[0]
+            visible.add(digest)
+            if self.shown.get(name) == digest:
+                self.decoded.move_to_end(digest)
+                continue
+            if digest in self.broken:
+                continue
+            if digest not in self.decoded:
+                if decoded:
+                    more = True
+                    continue
+                decoded = True
+                if not self.decode(digest):
+                    continue
+            self.show(name, digest)
+        self.evict(visible)
+        if more:
+            self.view_job = self.text.after(1, self.paint_view)
+
+    def decode(self, digest):
+        # A missing or unreadable blob stays a blank space.
+        data = self.blobs.read(digest) if self.blobs else None
+        try:
+            photo = tk.PhotoImage(master=self.text, data=data) if data else None
+        except tk.TclError:
+            photo = None
+        if photo is None:
+            self.broken.add(digest)
+            return False
+        scale = -(-photo.width() // MAX_WIDTH)
+        if scale > 1:
+            photo = photo.subsample(scale)
+        cost = photo.width() * photo.height() * 4
+        self.decoded[digest] = (photo, cost, set())
+        self.cost += cost
+        return True
+
+    def show(self, name, digest):
+        photo, _, names = self.decoded[digest]
+        self.decoded.move_to_end(digest)
+        self.call('image', 'configure', name, '-image', photo, '-padx', 0, '-pady', 0)
+        self.shown[name] = digest
+        names.add(name)
+
+    def evict(self, visible):
+        # Least recently shown first, never one on screen.
+        for digest in list(self.decoded):
+            if self.cost <= self.budget:
+                break
+            if digest in visible:
+                continue
+            _, cost, names = self.decoded.pop(digest)
+            self.cost -= cost
+            padx, pady = self.padding(digest)
+            for name in names:
+                if self.shown.pop(name, None) is None:
+                    continue
+                try:
+                    self.call('image', 'configure', name, '-image', self.placeholder,
+                              '-padx', padx, '-pady', pady)
+                except tk.TclError:
+                    # Deleted from the text since.
+                    pass
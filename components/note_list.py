@@ -1,28 +1,49 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-from models.note import Note
 from components.editable_label import EditableLabel
+from core.note_order import SORT_MODES, SORT_LABELS
+from core.tag_index import split_labels
+
+ALL_NOTES = "NOTES"
+ROW_HEIGHT = 22
+ROW_GAP = 2
+ROW_BG = '#2a475e'
+SELECTED_BG = '#3d6a8a'
+SEARCH_DELAY_MS = 150
 
 class NoteList(tk.Frame):
-    def __init__(self, parent, on_note_selected, on_note_deleted):
+    def __init__(self, parent, notebook, on_note_selected):
         super().__init__(parent, bg='#1b2838', width=150)
         self.pack_propagate(False)
+        self.notebook = notebook
         self.on_note_selected = on_note_selected
-        self.on_note_deleted = on_note_deleted
         
         header = tk.Frame(self, bg='#1b2838')
         header.pack(fill=tk.X)
         
-        self.title_label = EditableLabel(header, text="NOTES", fg='#ffffff', 
+        # The header names the notebook shown; double-click renames it.
+        self.title_label = EditableLabel(header, text=ALL_NOTES, on_edit=self.rename_book, fg='#ffffff', 
                                        bg='#1b2838', font=('Arial', 12, 'bold'))
-        self.title_label.pack(side=tk.LEFT, padx=5)
+        self.title_label.pack(side=tk.LEFT, padx=(5, 0))
+        self.books_btn = tk.Button(header, text="▾", command=self.show_books,
+                                 bg='#1b2838', fg='#ffffff', font=('Arial', 10), relief=tk.FLAT)
+        self.books_btn.pack(side=tk.LEFT)
         
-        separator = ttk.Separator(self, orient='horizontal')
-        separator.pack(fill=tk.X, pady=2)
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(self, textvariable=self.search_var, bg='#2a475e', fg='#ffffff',
+                                   insertbackground='#ffffff', relief=tk.FLAT, font=('Arial', 10))
+        self.search_entry.pack(fill=tk.X, padx=1, pady=(0, 2))
+        self.search_entry.bind('<Escape>', lambda e: self.search_var.set(""))
+        self.search_job = None
+        self.search_var.trace_add('write', lambda *args: self.schedule_search())
         
         btn_container = tk.Frame(header, bg='#1b2838')
         btn_container.pack(side=tk.RIGHT, padx=2)
         
+        self.sort_btn = tk.Button(btn_container, text=SORT_LABELS[notebook.sort_mode],
+                                command=self.cycle_sort, bg='#2a475e', fg='#c7d5e0',
+                                font=('Arial', 8), relief=tk.FLAT)
+        self.sort_btn.pack(side=tk.LEFT, padx=1)
+        
         self.add_btn = tk.Button(btn_container, text="+", command=self.add_note,
                                bg='#2a475e', fg='#ffffff', font=('Arial', 12),
                                width=2, relief=tk.FLAT)
@@ -36,66 +57,350 @@ class NoteList(tk.Frame):
         self.notes_frame = tk.Frame(self, bg='#1b2838')
         self.notes_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.notes = []
-        self.note_buttons = []
+        # Only the rows in view exist as canvas items. Scrolling moves
+        # `self.top` and re-labels the same pool of rows.
+        self.scrollbar = tk.Scrollbar(self.notes_frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.notes_frame, bg='#1b2838', highlightthickness=0,
+                                cursor="hand2")
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.canvas.bind('<Configure>', self.on_resize)
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.canvas.bind('<Button-3>', self.on_menu)
+        self.canvas.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self.scroll_pixels(-ROW_HEIGHT))
+        self.canvas.bind('<Button-5>', lambda e: self.scroll_pixels(ROW_HEIGHT))
+        
+        # `notes` is the notebook's list; `view` is what the rows show,
+        # either `notes` itself or a list of search or filter results, and
+        # `positions` maps note ids to their index in `view`. `book` is the
+        # notebook shown, None for all notes.
+        self.notes = notebook.notes
+        self.book = None
+        self.ready = False
+        self.view = self.notes
+        self.positions = {}
+        self.visible = {}
         self.selected_note = None
+        self.rows = []
+        self.fonts = {}
+        self.top = 0
+        self.width = 1
+        self.height = 0
+
+    def build_deferred(self):
+        # Not needed for the first paint, and ttk is slow to import.
+        from tkinter import ttk
+        separator = ttk.Separator(self, orient='horizontal')
+        separator.pack(fill=tk.X, pady=2, before=self.search_entry)
 
     def add_note(self):
-        note = Note()
-        self.notes.append(note)
-        self.create_note_button(note)
+        if not self.ready:
+            return
+        if self.search_var.get():
+            self.search_var.set("")
+        note = self.notebook.create()
+        if self.book is None:
+            self.reorder(note)
+            self.refresh()
+        else:
+            self.notebook.label(note, notebook=self.book)
+            self.run_search()
         self.select_note(note)
 
-    def create_note_button(self, note):
-        btn = tk.Text(self.notes_frame, height=1, wrap=tk.NONE,
-                     bg='#2a475e', fg='#ffffff', font=('Arial', 10),
-                     relief=tk.FLAT, cursor="hand2")
-        btn.insert("1.0", note.title)
-        btn.configure(state='disabled')
-        
-        btn.tag_configure('bold', font=('Arial', 10, 'bold'))
-        btn.tag_configure('italic', font=('Arial', 10, 'italic'))
-        btn.tag_configure('underline', underline=True)
-        
-        btn.pack(fill=tk.X, padx=1, pady=1)
-        btn.bind('<Button-1>', lambda e: self.select_note(note))
-        self.note_buttons.append((note, btn))
-        
-        for tag in note.title_tags:
-            btn.tag_add(tag, "1.0", "end")
+    def show_page(self, notes):
+        # Placeholder rows from the startup snapshot; they cannot be used
+        # until reload() brings in the real notes.
+        self.show_view(notes)
+
+    def reload(self):
+        self.notes = self.notebook.notes
+        self.ready = True
+        self.run_search()
+
+    def show_view(self, notes):
+        self.view = self.notes if notes is None else notes
+        self.positions = {note.id: i for i, note in enumerate(self.view)}
+        self.top = 0
+        self.sort_btn.configure(text=SORT_LABELS[self.notebook.sort_mode])
+        self.refresh()
+
+    def cycle_sort(self):
+        if not self.ready:
+            return
+        modes = SORT_MODES
+        self.notebook.sort(modes[(modes.index(self.notebook.sort_mode) + 1) % len(modes)])
+        if self.view is self.notes:
+            self.show_view(None)
+            if self.selected_note and self.see(self.positions[self.selected_note.id]):
+                self.refresh()
+        else:
+            self.sort_btn.configure(text=SORT_LABELS[self.notebook.sort_mode])
+
+    def reorder(self, note):
+        # The notebook has moved `note` (or just added it) in its order;
+        # only the positions between its old and new row shift, and rows
+        # are redrawn only if some of those are on screen. Returns whether
+        # they were. Search results keep their own order.
+        if self.view is not self.notes:
+            return False
+        old = self.positions.get(note.id)
+        new = self.notebook.position(note)
+        if old == new:
+            return False
+        low, high = (new, len(self.view) - 1) if old is None else (min(old, new), max(old, new))
+        for i in range(low, high + 1):
+            self.positions[self.view[i].id] = i
+        first = self.top // ROW_HEIGHT
+        if high < first or low >= first + len(self.rows):
+            self.update_scrollbar()
+            return False
+        self.redraw()
+        return True
+
+    def schedule_search(self):
+        # Typing waits for a pause, so a burst of keys costs one search;
+        # clearing the box shows every note at once.
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+            self.search_job = None
+        if self.search_var.get().strip():
+            self.search_job = self.after(SEARCH_DELAY_MS, self.run_search)
+        else:
+            self.run_search()
+
+    def run_search(self):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+            self.search_job = None
+        if not self.ready:
+            return
+        query = self.search_var.get().strip()
+        if not query and self.book is None:
+            self.show_view(None)
+            return
+        self.show_view(self.notebook.search(query, self.book))
+
+    def show_books(self):
+        if not self.ready:
+            return
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="All notes", command=lambda: self.choose_book(None))
+        for name, count in self.notebook.tags.notebooks():
+            menu.add_command(label=f"{name} ({count})", command=lambda name=name: self.choose_book(name))
+        menu.add_separator()
+        menu.add_command(label="New notebook...", command=self.new_book)
+        menu.tk_popup(self.books_btn.winfo_rootx(), self.books_btn.winfo_rooty() + self.books_btn.winfo_height())
+
+    def choose_book(self, name):
+        self.book = name
+        self.title_label.set_text(name or ALL_NOTES)
+        self.run_search()
+
+    def ask_book_name(self):
+        from tkinter import simpledialog
+        name = simpledialog.askstring("New Notebook", "Notebook name:", parent=self)
+        return ' '.join(name.split()) if name else None
+
+    def new_book(self):
+        # Shown empty; notes added while it is open go into it.
+        name = self.ask_book_name()
+        if name:
+            self.choose_book(name)
+
+    def rename_book(self, name):
+        if self.book is None:
+            return False
+        self.notebook.rename_notebook(self.book, name)
+        self.book = name
+        self.run_search()
+        return True
 
-    def select_note(self, note):
-        self.selected_note = note
-        for n, btn in self.note_buttons:
-            btn.configure(bg='#2a475e' if n != note else '#3d6a8a')
-        self.on_note_selected(note)
+    def on_menu(self, event):
+        if not self.ready:
+            return
+        index = (self.top + event.y) // ROW_HEIGHT
+        if not 0 <= index < len(self.view):
+            return
+        note = self.view[index]
+        books = tk.Menu(self, tearoff=0)
+        books.add_command(label="None", command=lambda: self.move_to_book(note, ""))
+        for name, _ in self.notebook.tags.notebooks():
+            books.add_command(label=name, command=lambda name=name: self.move_to_book(note, name))
+        books.add_separator()
+        books.add_command(label="New notebook...", command=lambda: self.move_to_book(note, self.ask_book_name()))
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Tags...", command=lambda: self.edit_labels(note))
+        menu.add_cascade(label="Notebook", menu=books)
+        menu.tk_popup(event.x_root, event.y_root)
+
+    def edit_labels(self, note):
+        from tkinter import simpledialog
+        text = simpledialog.askstring("Tags", "Tags, separated by commas:",
+                                      initialvalue=", ".join(note.labels), parent=self)
+        if text is not None:
+            self.notebook.label(note, labels=split_labels(text))
+            self.labels_changed(note)
+
+    def move_to_book(self, note, name):
+        if name is not None:
+            self.notebook.label(note, notebook=name)
+            self.labels_changed(note)
+
+    def labels_changed(self, note):
+        # A filtered list may have lost or gained the note.
+        if self.view is self.notes:
+            self.update_note_title(note)
+        else:
+            self.run_search()
+
+    def refresh(self):
+        self.clamp_top()
+        self.redraw()
+
+    def row_font(self, tags):
+        key = tuple(t for t in ('bold', 'italic', 'underline') if t in tags)
+        if key not in self.fonts:
+            self.fonts[key] = ('Arial', 10) + key
+        return self.fonts[key]
+
+    def on_resize(self, event):
+        self.width, self.height = event.width, event.height
+        needed = self.height // ROW_HEIGHT + 2
+        while len(self.rows) < needed:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, fill=ROW_BG, width=0)
+            text = self.canvas.create_text(0, 0, anchor=tk.W, fill='#ffffff')
+            self.rows.append((rect, text))
+        self.refresh()
+
+    def draw_row(self, row, index):
+        rect, text = row
+        if index >= len(self.view):
+            self.canvas.itemconfigure(rect, state='hidden')
+            self.canvas.itemconfigure(text, state='hidden')
+            return
+        note = self.view[index]
+        y = index * ROW_HEIGHT - self.top
+        self.canvas.coords(rect, 1, y + ROW_GAP // 2, self.width - 1, y + ROW_HEIGHT - ROW_GAP // 2)
+        self.canvas.coords(text, 5, y + ROW_HEIGHT // 2)
+        self.canvas.itemconfigure(rect, state='normal',
+                                  fill=SELECTED_BG if note is self.selected_note else ROW_BG)
+        self.canvas.itemconfigure(text, state='normal', text=note.title,
+                                  font=self.row_font(note.title_tags))
+
+    def redraw(self):
+        first = self.top // ROW_HEIGHT
+        self.visible = {}
+        for slot, row in enumerate(self.rows):
+            index = first + slot
+            self.draw_row(row, index)
+            if index < len(self.view):
+                self.visible[self.view[index].id] = (row, index)
+        self.update_scrollbar()
+
+    def paint_selection(self, note):
+        entry = self.visible.get(note.id) if note else None
+        if entry:
+            rect = entry[0][0]
+            self.canvas.itemconfigure(rect, fill=SELECTED_BG if note is self.selected_note else ROW_BG)
+
+    def update_scrollbar(self):
+        total = max(len(self.view) * ROW_HEIGHT, 1)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self.height) / total))
+
+    def clamp_top(self):
+        max_top = max(0, len(self.view) * ROW_HEIGHT - self.height)
+        self.top = max(0, min(int(self.top), max_top))
+
+    def scroll_pixels(self, delta):
+        self.top += delta
+        self.refresh()
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.top = float(args[1]) * len(self.view) * ROW_HEIGHT
+        elif args[0] == 'scroll':
+            step = self.height if args[2] == 'pages' else ROW_HEIGHT
+            self.top += int(args[1]) * step
+        self.refresh()
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas.
+        notches = event.delta / 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_pixels(-int(notches * ROW_HEIGHT))
+
+    def on_click(self, event):
+        if not self.ready:
+            return
+        index = (self.top + event.y) // ROW_HEIGHT
+        if 0 <= index < len(self.view):
+            self.select_note(self.view[index])
+
+    def see(self, index):
+        # Returns True if the view had to scroll.
+        y = index * ROW_HEIGHT
+        if not self.height:
+            return False
+        if y < self.top:
+            self.top = y
+        elif y + ROW_HEIGHT > self.top + self.height:
+            self.top = y + ROW_HEIGHT - self.height
+        else:
+            return False
+        return True
+
+    def select_note(self, note, notify=True):
+        previous, self.selected_note = self.selected_note, note
+        if note.id in self.positions and self.see(self.positions[note.id]):
+            self.refresh()
+        else:
+            self.paint_selection(previous)
+            self.paint_selection(note)
+        if notify:
+            self.on_note_selected(note)
 
     def delete_selected_note(self):
+        from tkinter import messagebox
         if self.selected_note and messagebox.askyesno("Delete Note", "Are you sure you want to delete this note?"):
-            self.notes.remove(self.selected_note)
-            for note, btn in self.note_buttons[:]:
-                if note == self.selected_note:
-                    btn.destroy()
-                    self.note_buttons.remove((note, btn))
-            self.on_note_deleted()
-            if self.notes:
-                self.select_note(self.notes[0])
-            else:
-                self.add_note()
-
-    def update_note_title(self, note, title, tags):
-        for n, btn in self.note_buttons:
-            if n == note:
-                btn.configure(state='normal')
-                btn.delete("1.0", tk.END)
-                btn.insert("1.0", title)
-                
-                for tag in ['bold', 'italic', 'underline']:
-                    btn.tag_remove(tag, "1.0", tk.END)
-                
-                for tag in tags:
-                    btn.tag_add(tag, "1.0", tk.END)
-                
-                btn.configure(state='disabled')
-                note.title_tags = tags
-                break
\ No newline at end of file
+            deleted = self.selected_note
+            self.selected_note = None
+            self.notebook.delete(deleted)
+            position = self.positions.pop(deleted.id, None)
+            if position is not None:
+                if self.view is not self.notes:
+                    del self.view[position]
+                for i in range(position, len(self.view)):
+                    self.positions[self.view[i].id] = i
+            self.refresh()
+            self.select_first()
+
+    def select_first(self):
+        if self.view:
+            self.select_note(self.view[0])
+        elif self.notes:
+            self.select_note(self.notes[0])
+        else:
+            self.add_note()
+
+    def apply_external(self, added, removed, changed):
+        # The notebook has already merged these; only the rows in view are
+        # redrawn. Search results keep their matches minus removed notes;
+        # in the full list, changed notes may have moved.
+        if removed and self.view is not self.notes:
+            gone = set(removed)
+            self.view = [note for note in self.view if note not in gone]
+        if added or removed or changed and self.view is self.notes:
+            self.positions = {note.id: i for i, note in enumerate(self.view)}
+            self.refresh()
+        else:
+            for note in changed:
+                self.update_note_title(note)
+        if self.selected_note in removed:
+            self.selected_note = None
+            self.select_first()
+
+    def update_note_title(self, note):
+        entry = self.visible.get(note.id)
+        if entry:
+            self.draw_row(*entry)
@@ -0,0 +1,60 @@
+import tkinter as tk
+
+class QuickSwitcher(tk.Toplevel):
+    # Ctrl+P popup: type part of a title, pick a note. `find(query)` ranks
+    # the notes (Notebook.switch) and is fast enough to run on every
+    # keystroke; the chosen note goes to `on_pick`.
+    def __init__(self, parent, find, on_pick):
+        super().__init__(parent, bg='#1b2838')
+        self.title("Go to note")
+        self.transient(parent)
+        self.find = find
+        self.on_pick = on_pick
+        self.matches = []
+
+        width = 480
+        x = parent.winfo_rootx() + (parent.winfo_width() - width) // 2
+        y = parent.winfo_rooty() + 60
+        self.geometry(f"{width}x320+{max(x, 0)}+{max(y, 0)}")
+
+        self.query = tk.StringVar()
+        self.entry = tk.Entry(self, textvariable=self.query, bg='#2a475e', fg='#ffffff',
+                              insertbackground='#ffffff', relief=tk.FLAT, font=('Arial', 12))
+        self.entry.pack(fill=tk.X, padx=2, pady=2)
+        self.listbox = tk.Listbox(self, bg='#2a475e', fg='#ffffff', relief=tk.FLAT,
+                                  selectbackground='#3d6a8a', font=('Arial', 10), activestyle='none')
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=2, pady=(0, 2))
+
+        self.query.trace_add('write', lambda *args: self.refresh())
+        self.entry.bind('<Down>', lambda e: self.move(1))
+        self.entry.bind('<Up>', lambda e: self.move(-1))
+        self.entry.bind('<Return>', lambda e: self.pick())
+        self.listbox.bind('<Double-Button-1>', lambda e: self.pick())
+        self.bind('<Escape>', lambda e: self.destroy())
+
+        self.refresh()
+        self.entry.focus_set()
+
+    def refresh(self):
+        self.matches = self.find(self.query.get())
+        self.listbox.delete(0, tk.END)
+        if self.matches:
+            self.listbox.insert(tk.END, *[note.title for note in self.matches])
+            self.listbox.selection_set(0)
+
+    def move(self, step):
+        if not self.matches:
+            return 'break'
+        selection = self.listbox.curselection()
+        index = max(0, min(len(self.matches) - 1, (selection[0] if selection else -1) + step))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return 'break'
+
+    def pick(self):
+        selection = self.listbox.curselection()
+        if selection:
+            note = self.matches[selection[0]]
+            self.destroy()
+            self.on_pick(note)
@@ -0,0 +1,184 @@
+import queue
+import tkinter as tk
+from core.spelling import SpellWorker
+
+SPELL_TAG = 'misspelled'
+VIEW_MARGIN = 20
+POLL_MS = 15
+
+
+def widget_column(column, images, after):
+    # Column in the widget of text column `column` on a line with images
+    # at widget columns `images`; get() leaves images out. `after` says
+    # whether an image right at the column comes before it.
+    for image in images:
+        if image < column or after and image == column:
+            column += 1
+    return column
+
+
+class SpellChecker:
+    # Underlines misspelled words, but only on the lines in (or near) the
+    # viewport: each time the view changes or the text is edited, the
+    # lines there whose text differs from when they were last checked go
+    # to a background SpellWorker, and its answers are painted as they
+    # come back. Typing costs one get() of the visible lines; lines
+    # nobody looks at are never checked. Code blocks are left alone.
+    # Without a Speller it does nothing.
+    def __init__(self, editor, speller=None):
+        self.editor = editor
+        self.text = editor.text_editor
+        self.call = editor.tracker.call
+        self.speller = speller
+        self.worker = None
+        self.checked = {}
+        self.sent = {}
+        self.view_job = None
+        self.poll_job = None
+
+        try:
+            self.text.tag_configure(SPELL_TAG, underline=True, underlinefg='#e06c75')
+        except tk.TclError:
+            # underlinefg needs Tk 8.6.11.
+            self.text.tag_configure(SPELL_TAG, underline=True)
+        if speller is not None:
+            editor.tracker.add_listener(self.on_change)
+
+    def reset(self):
+        self.checked = {}
+        self.sent = {}
+
+    def on_change(self, kind, start, end, text):
+        # Only the edited line needs checking again; the lines after a
+        # change that adds or removes lines keep their text (and their
+        # underlines, which move with it) under new numbers.
+        if kind == 'tag':
+            return
+        if kind == 'reset':
+            self.reset()
+        else:
+            line = start[0]
+            self.checked.pop(line, None)
+            self.sent = {}
+            if kind == 'insert':
+                self.shift(line, text.count('\n'))
+            elif end[0] > line:
+                self.shift(line, line - end[0])
+        self.schedule_view()
+
+    def shift(self, line, delta):
+        if delta:
+            self.checked = {n + delta if n > line else n: text for n, text in self.checked.items()
+                            if not line < n <= line - delta}
+
+    def on_scroll(self):
+        if self.speller is not None:
+            self.schedule_view()
+
+    def schedule_view(self):
+        if self.view_job is None:
+            self.view_job = self.text.after_idle(self.paint_view)
+
+    def paint_view(self):
+        # Lines the highlighter has not placed in or out of a code block
+        # yet are looked at again shortly.
+        self.view_job = None
+        if self.editor.loading:
+            return
+        first = max(int(self.call('index', '@0,0').split('.')[0]) - VIEW_MARGIN, 1)
+        last = int(self.call('index', f'@0,{self.text.winfo_height()}').split('.')[0]) + VIEW_MARGIN
+        checked = {}
+        waiting = False
+        for line, text in enumerate(self.call('get', f"{first}.0", f"{last}.end").split('\n'), first):
+            if self.checked.get(line) == text:
+                checked[line] = text
+                continue
+            in_code = self.editor.highlighter.in_code(line)
+            if in_code is None:
+                waiting = True
+            elif in_code or not text.strip():
+                if text:
+                    self.call('tag', 'remove', SPELL_TAG, f"{line}.0", f"{line}.end")
+                checked[line] = text
+            elif self.sent.get(line) != text:
+                self.submit(line, text)
+        self.checked = checked
+        if waiting:
+            self.view_job = self.text.after(POLL_MS, self.paint_view)
+
+    def submit(self, line, text):
+        if self.worker is None:
+            self.worker = SpellWorker(self.speller)
+        self.worker.submit(line, text)
+        self.sent[line] = text
+        if self.poll_job is None:
+            self.poll_job = self.text.after(POLL_MS, self.poll)
+
+    def poll(self):
+        # An answer for text the line no longer has is dropped; the line
+        # was sent again when it changed.
+        self.poll_job = None
+        while True:
+            try:
+                line, text, spans = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.sent.get(line) != text:
+                continue
+            del self.sent[line]
+            self.paint_line(line, spans)
+            self.checked[line] = text
+        if self.sent:
+            self.poll_job = self.text.after(POLL_MS, self.poll)
+
+    def paint_line(self, line, spans):
+        # Painting is not an edit, so it goes straight to the widget.
+        self.call('tag', 'remove', SPELL_TAG, f"{line}.0", f"{line}.end")
+        if not spans:
+            return
+        images = []
+        if self.editor.images.count:
+            images = [int(index.split('.')[1])
+                      for _, _, index in self.text.dump(f"{line}.0", f"{line}.end", image=True)]
+        indices = []
+        for start, end in spans:
+            indices.append(f"{line}.{widget_column(start, images, True)}")
+            indices.append(f"{line}.{widget_column(end, images, False)}")
+        self.call('tag', 'add', SPELL_TAG, *indices)
+
+    def on_menu(self, event):
+        # Suggestions are only worked out for the word clicked on.
+        index = self.text.index(f"@{event.x},{event.y}")
+        if self.speller is None or SPELL_TAG not in self.text.tag_names(index):
+            return None
+        start, end = self.text.tag_prevrange(SPELL_TAG, f"{index}+1c")
+        word = self.text.get(start, end)
+        menu = tk.Menu(self.text, tearoff=0)
+        suggestions = self.speller.suggest(word)
+        for suggestion in suggestions:
+            menu.add_command(label=suggestion,
+                             command=lambda suggestion=suggestion: self.replace(start, end, word, suggestion))
+        if not suggestions:
+            menu.add_command(label="No suggestions", state='disabled')
+        menu.add_separator()
+        menu.add_command(label="Add to Dictionary", command=lambda: self.accept(word, True))
+        menu.add_command(label="Ignore", command=lambda: self.accept(word, False))
+        menu.tk_popup(event.x_root, event.y_root)
+        return 'break'
+
+    def replace(self, start, end, word, suggestion):
+        if self.editor.loading or self.editor.find.busy or self.text.get(start, end) != word:
+            return
+        with self.editor.undo_group():
+            self.text.delete(start, end)
+            self.text.insert(start, suggestion)
+
+    def accept(self, word, remember):
+        # Lines off screen are checked again when they come into view.
+        self.speller.add(word, remember)
+        self.reset()
+        self.schedule_view()
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.stop()
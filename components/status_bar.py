@@ -0,0 +1,105 @@
+import tkinter as tk
+from core.doc_stats import DocStats
+
+FRAME_MS = 16
+
+class StatusBar(tk.Frame):
+    # Counts and cursor position for the editor. The counts follow the
+    # edits the change tracker reports, re-reading only the lines each one
+    # touched, and the label is redrawn at most once per frame however
+    # many edits and cursor moves arrive in between.
+    def __init__(self, parent, text_widget, tracker):
+        super().__init__(parent, bg='#2a475e')
+        self.text = text_widget
+        self.stats = DocStats()
+        self.job = None
+        self.counting = True
+        self.version = 0
+        self.middle = None
+
+        self.position = tk.Label(self, bg='#2a475e', fg='#c7d5e0', font=('Arial', 9))
+        self.position.pack(side=tk.LEFT, padx=6)
+        self.warning = tk.Label(self, bg='#2a475e', fg='#e06c75', font=('Arial', 9))
+        self.warning.pack(side=tk.LEFT, padx=6)
+        self.counts = tk.Label(self, bg='#2a475e', fg='#c7d5e0', font=('Arial', 9))
+        self.counts.pack(side=tk.RIGHT, padx=6)
+
+        tracker.add_listener(self.on_change)
+        for sequence in ('<KeyRelease>', '<ButtonRelease-1>', '<<Selection>>'):
+            self.text.bind(sequence, lambda e: self.schedule(), add='+')
+
+    def on_change(self, kind, start, end, text):
+        # Inserts arrive after the fact, deletes before, as for the
+        # highlighter.
+        if kind == 'reset':
+            self.stats.reset(self.text.get("1.0", "end-1c"))
+            self.counting = True
+        elif kind == 'insert':
+            added = text.count('\n')
+            self.stats.splice(start[0] - 1, 1, self.text.get(
+                f"{start[0]}.0", f"{start[0] + added}.end").split('\n'))
+        elif kind == 'delete':
+            head = self.text.get(f"{start[0]}.0", "%d.%d" % start)
+            tail = self.text.get("%d.%d" % end, f"{end[0]}.end")
+            self.stats.splice(start[0] - 1, end[0] - start[0] + 1, [head + tail])
+        else:
+            return
+        self.version += 1
+        self.schedule()
+
+    def warn(self, text):
+        # A standing problem, such as saves failing; "" clears it.
+        if self.warning.cget('text') != text:
+            self.warning.configure(text=text)
+
+    def loading(self):
+        # The editor is streaming a note in; counts follow once it is done.
+        self.counting = False
+        self.schedule()
+
+    def schedule(self):
+        if self.job is None:
+            self.job = self.after(FRAME_MS, self.refresh)
+
+    def refresh(self):
+        self.job = None
+        line, column = self.text.index(tk.INSERT).split('.')
+        self.position.configure(text=f"Ln {line}, Col {int(column) + 1}")
+        if not self.counting:
+            self.counts.configure(text="")
+            return
+        words, chars, lines = self.stats.totals()
+        summary = f"{words:,} words   {chars:,} chars   {lines:,} lines"
+        selection = self.text.tag_ranges(tk.SEL)
+        if selection:
+            selected_words, selected_chars = self.selected(str(selection[0]), str(selection[-1]))
+            summary = f"{selected_words:,} words, {selected_chars:,} chars selected   " + summary
+        self.counts.configure(text=summary)
+
+    def selected(self, first, last):
+        # Whole lines inside the selection come from the cached counts;
+        # only the partial first and last lines are read.
+        first_line, last_line = int(first.split('.')[0]), int(last.split('.')[0])
+        if first_line == last_line:
+            text = self.text.get(first, last)
+            return len(text.split()), len(text)
+        head = self.text.get(first, f"{first_line}.end")
+        tail = self.text.get(f"{last_line}.0", last)
+        words, chars = self.whole_lines(first_line, last_line - 1)
+        return (words + len(head.split()) + len(tail.split()),
+                chars + len(head) + len(tail) + last_line - first_line)
+
+    def whole_lines(self, first, last):
+        # While the text is unchanged, the previous sums are adjusted by the
+        # lines the selection gained or lost, so extending a selection
+        # across a large note does not re-add every line.
+        if self.middle and self.middle[0] == self.version:
+            _, low, high, words, chars = self.middle
+            for a, b, sign in ((first, low, 1), (low, first, -1), (high, last, 1), (last, high, -1)):
+                part_words, part_chars = self.stats.between(a, b)
+                words += sign * part_words
+                chars += sign * part_chars
+        else:
+            words, chars = self.stats.between(first, last)
+        self.middle = (self.version, first, last, words, chars)
+        return words, chars
@@ -0,0 +1,67 @@
+import tkinter as tk
+from datetime import datetime
+
+PREVIEW_CHARS = 200 * 1024
+
+class VersionsView(tk.Toplevel):
+    # Lists the saved versions of one note, newest first. Picking one
+    # rebuilds it from the history for a read-only preview; Restore hands
+    # its text to `on_restore`.
+    def __init__(self, parent, title, versions, load_version, on_restore):
+        super().__init__(parent, bg='#1b2838')
+        self.title(f"Versions - {title}")
+        self.geometry("760x480")
+        self.transient(parent)
+        self.versions = list(reversed(versions))
+        self.load_version = load_version
+        self.on_restore = on_restore
+        self.content = None
+
+        side = tk.Frame(self, bg='#1b2838')
+        side.pack(side=tk.LEFT, fill=tk.Y, padx=2, pady=2)
+        tk.Label(side, text=f"{len(self.versions)} versions", bg='#1b2838', fg='#8f98a0',
+                 font=('Arial', 10)).pack(fill=tk.X)
+
+        self.listbox = tk.Listbox(side, bg='#2a475e', fg='#ffffff', relief=tk.FLAT, width=30,
+                                  selectbackground='#3d6a8a', font=('Consolas', 10), activestyle='none')
+        scrollbar = tk.Scrollbar(side, orient=tk.VERTICAL, command=self.listbox.yview)
+        self.listbox.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.Y)
+        self.listbox.insert(tk.END, *[
+            f"#{rev:<6} {datetime.fromtimestamp(when):%Y-%m-%d %H:%M:%S} {length:>7}"
+            for rev, when, length in self.versions])
+        self.listbox.bind('<<ListboxSelect>>', self.on_select)
+
+        right = tk.Frame(self, bg='#1b2838')
+        right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=2, pady=2)
+        self.restore_btn = tk.Button(right, text="Restore", command=self.restore, state='disabled',
+                                     bg='#2a475e', fg='#ffffff', relief=tk.FLAT)
+        self.restore_btn.pack(side=tk.BOTTOM, anchor=tk.E, pady=(2, 0))
+        self.preview = tk.Text(right, wrap=tk.WORD, bg='#171d25', fg='#c7d5e0', relief=tk.FLAT,
+                               font=('Consolas', 11), state='disabled')
+        self.preview.pack(fill=tk.BOTH, expand=True)
+
+        # Modal, so the open note cannot change under a pending restore.
+        self.wait_visibility()
+        self.grab_set()
+
+    def on_select(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        rev = self.versions[selection[0]][0]
+        self.content = self.load_version(rev)
+        text = self.content or ""
+        if len(text) > PREVIEW_CHARS:
+            text = text[:PREVIEW_CHARS] + f"\n\n... {len(self.content) - PREVIEW_CHARS} more characters"
+        self.preview.configure(state='normal')
+        self.preview.delete("1.0", tk.END)
+        self.preview.insert("1.0", text)
+        self.preview.configure(state='disabled')
+        self.restore_btn.configure(state='normal' if self.content is not None else 'disabled')
+
+    def restore(self):
+        if self.content is not None:
+            self.on_restore(self.content)
+            self.destroy()
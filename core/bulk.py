@@ -0,0 +1,279 @@
+import json
+import os
+import re
+import time
+from core.markdown import parse_markdown, render_markdown
+from core.notebook import derive_title, first_line, first_line_tags
+from core.search import SearchIndex, build_shard
+from models.note import parse_time
+from models.spans import encode_spans, decode_spans
+from storage.journal import SNAPSHOT, JournalStore, decode_record, encode_record, put_record
+
+# Bulk import, export and stats over a store, without any window. Import
+# parses files in a process pool, each worker turning a file into its
+# finished journal line, so the parent only appends lines in batches. The
+# search index is then rebuilt in the same pool, one shard of notes per
+# task, and the parent merges the encoded shards.
+SUFFIXES = ('.md', '.markdown', '.txt')
+BATCH = 1000
+CHUNK = 64
+SHARD = 2000
+SMALL_IMPORT = 1000
+UNCHANGED = 'unchanged'
+EDITED = 'edited'
+UNSAFE_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+# Kept in the export folder: note id -> file name, so exporting again
+# overwrites each note's own file instead of adding "Title (2).md".
+EXPORT_MANIFEST = '.better-notepad-export.json'
+
+
+def find_files(directory, suffixes=SUFFIXES):
+    paths = []
+    for folder, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths += [os.path.join(folder, name) for name in sorted(files) if name.lower().endswith(suffixes)]
+    return paths
+
+
+def file_note_id(path):
+    # Derived from the path, so importing the same folder again updates
+    # those notes instead of adding copies.
+    import uuid
+    return uuid.uuid5(uuid.NAMESPACE_URL, 'file://' + os.path.abspath(path)).hex
+
+
+def parse_file(task):
+    # Runs in a worker. `stored` is the meta of the note an earlier import
+    # made from this file, if the store has it: a file no newer than that
+    # note is UNCHANGED, or the note was EDITED in the app since, and is
+    # left alone either way. Otherwise the note keeps its creation time,
+    # tags and notebook, and its rev goes up by one.
+    path, stored = task
+    try:
+        modified = os.path.getmtime(path)
+        if stored is not None and parse_time(stored[2]) >= modified:
+            return UNCHANGED if parse_time(stored[2]) == modified else EDITED
+        with open(path, 'r', encoding='utf-8', errors='replace', newline=None) as f:
+            text = f.read()
+    except OSError:
+        return None
+    content, runs = parse_markdown(text)
+    line = first_line(content)
+    note = {
+        'id': file_note_id(path),
+        'title': derive_title(line),
+        'content': content,
+        'spans': encode_spans(runs),
+        'title_tags': first_line_tags(runs, len(line)),
+        'last_modified': modified,
+        'created': modified,
+        'rev': 1,
+    }
+    if stored is not None:
+        note.update(created=stored[4], rev=stored[3] + 1, labels=list(stored[5]), notebook=stored[6])
+    record = put_record(note)
+    encoded = encode_record(record)
+    del note['content'], note['spans']
+    return record, encoded
+
+
+def index_shard(task):
+    # Runs in a worker: reads a range of stored notes straight from the
+    # files and indexes them.
+    store_path, items = task
+    paths = JournalStore(store_path).paths
+    files = {}
+    docs = []
+    try:
+        for doc_number, note_id, segment, offset, length in items:
+            if segment not in files:
+                files[segment] = open(paths[segment], 'rb')
+            f = files[segment]
+            f.seek(offset)
+            record = decode_record(f.read(length))
+            docs.append((doc_number, note_id, record['note']['content'] if record else ""))
+    finally:
+        for f in files.values():
+            f.close()
+    return build_shard(docs)
+
+
+def build_search_index(store, store_path, pool):
+    items = [(i, note_id) + entry for i, (note_id, entry) in enumerate(store.entries.items())]
+    tasks = [(store_path, items[i:i + SHARD]) for i in range(0, len(items), SHARD)]
+    index = SearchIndex()
+    index.merge([item[1] for item in items], pool.imap(index_shard, tasks))
+    return index
+
+
+def import_dir(directory, store_path, search_path, processes=None):
+    from multiprocessing import Pool
+    began = time.perf_counter()
+    paths = find_files(directory)
+    store = JournalStore(store_path)
+    store.open()
+    # Compacting once at the end instead of whenever the log fills up keeps
+    # a large import linear in the size of the corpus.
+    threshold, store.compact_threshold = store.compact_threshold, float('inf')
+    # A small import into a current search index is indexed in place; a
+    # large one rebuilds the index in the pool.
+    index = SearchIndex()
+    incremental = (search_path and len(paths) <= SMALL_IMPORT and
+                   index.load(search_path) == store.stamp())
+
+    written = []
+    skipped = held = unchanged = edited = 0
+    records, lines = [], []
+
+    def flush():
+        nonlocal held
+        done = store.append(records, lines)
+        written.extend(record['id'] for record in done)
+        held += len(records) - len(done)
+        records.clear()
+        lines.clear()
+
+    with Pool(processes) as pool:
+        tasks = [(path, store.meta.get(file_note_id(path))) for path in paths]
+        for result in pool.imap(parse_file, tasks, CHUNK):
+            if result is None:
+                skipped += 1
+                continue
+            if result == UNCHANGED:
+                unchanged += 1
+                continue
+            if result == EDITED:
+                edited += 1
+                continue
+            records.append(result[0])
+            lines.append(result[1])
+            if len(records) == BATCH:
+                flush()
+        if records:
+            flush()
+
+        if store.log_size > threshold:
+            store.compact()
+        if search_path:
+            if incremental:
+                for note_id in written:
+                    index.add(note_id, store.read(note_id)['content'])
+            else:
+                index = build_search_index(store, store_path, pool)
+            index.save(search_path, store.stamp())
+    store.close()
+    return {'files': len(paths), 'imported': len(written), 'skipped': skipped, 'held': held,
+            'unchanged': unchanged, 'edited': edited, 'seconds': time.perf_counter() - began}
+
+
+def export_file_name(title, taken, previous=None):
+    # `previous` is the note's file from the last export, kept while it
+    # still goes with the title.
+    name = UNSAFE_RE.sub('_', title).strip(' .')[:100] or 'Untitled'
+    if previous is not None and re.fullmatch(re.escape(name) + r'( \(\d+\))?\.md', previous, re.IGNORECASE):
+        return previous
+    candidate, number = name, 1
+    while candidate.lower() in taken:
+        number += 1
+        candidate = '%s (%d)' % (name, number)
+    taken.add(candidate.lower())
+    return candidate + '.md'
+
+
+def stored_notes(store):
+    # Yields one note dict at a time in list order, so memory use follows
+    # the largest note rather than the corpus.
+    for _, line in store.live_lines():
+        record = decode_record(line)
+        if record is not None:
+            yield record['note']
+
+
+def read_export_manifest(directory):
+    try:
+        with open(os.path.join(directory, EXPORT_MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict):
+        return {}
+    # Only plain .md names in the folder itself, as they get overwritten.
+    return {note_id: name for note_id, name in manifest.items()
+            if isinstance(name, str) and name.endswith('.md') and os.path.basename(name) == name}
+
+
+def write_export_manifest(directory, manifest):
+    path = os.path.join(directory, EXPORT_MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def export_dir(directory, store_path):
+    # A note exported here before goes back to the same file, or to a new
+    # one if its title changed, the old file then being removed. Files of
+    # notes deleted since are left alone.
+    began = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    previous = read_export_manifest(directory)
+    taken = {name[:-3].lower() for name in os.listdir(directory) if name.endswith('.md')}
+    taken.update(name[:-3].lower() for name in previous.values())
+    manifest = {}
+    store = JournalStore(store_path)
+    store.open()
+    exported = 0
+    # Held throughout so no other instance compacts the files mid-read.
+    with store.file_lock:
+        for note in stored_notes(store):
+            old_name = previous.get(note['id'])
+            name = manifest[note['id']] = export_file_name(note.get('title') or '', taken, old_name)
+            if old_name is not None and old_name != name:
+                taken.discard(old_name[:-3].lower())
+                try:
+                    os.remove(os.path.join(directory, old_name))
+                except OSError:
+                    pass
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(render_markdown(note.get('content', ''), decode_spans(note.get('spans', ''))))
+            if note.get('last_modified') is not None:
+                modified = parse_time(note['last_modified'])
+                os.utime(path, (modified, modified))
+            exported += 1
+    store.close()
+    write_export_manifest(directory, manifest)
+    return {'exported': exported, 'seconds': time.perf_counter() - began}
+
+
+def stats(store_path):
+    store = JournalStore(store_path)
+    notes = store.open()
+    result = {
+        'notes': len(notes),
+        'snapshot_bytes': os.path.getsize(store.paths[SNAPSHOT]) if os.path.exists(store.paths[SNAPSHOT]) else 0,
+        'log_bytes': store.log_size,
+        'chars': 0,
+        'words': 0,
+        'lines': 0,
+        'formatted_notes': 0,
+        'largest_chars': 0,
+        'largest_title': None,
+    }
+    times = [parse_time(note['last_modified']) for note in notes if note.get('last_modified') is not None]
+    if times:
+        result['oldest'] = time.strftime('%Y-%m-%d %H:%M', time.localtime(min(times)))
+        result['newest'] = time.strftime('%Y-%m-%d %H:%M', time.localtime(max(times)))
+    with store.file_lock:
+        for note in stored_notes(store):
+            content = note.get('content', '')
+            result['chars'] += len(content)
+            result['words'] += len(content.split())
+            result['lines'] += content.count('\n') + 1 if content else 0
+            if note.get('spans'):
+                result['formatted_notes'] += 1
+            if len(content) > result['largest_chars']:
+                result['largest_chars'] = len(content)
+                result['largest_title'] = note.get('title')
+    store.close()
+    return result
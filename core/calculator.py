@@ -0,0 +1,414 @@
+import ast
+import heapq
+import math
+import operator
+import re
+from collections import OrderedDict
+
+NAME_RE = re.compile(r'[A-Za-z_]\w*$')
+LINE_REF_RE = re.compile(r'L(\d+)$')
+RANGE_RE = re.compile(r'\bL(\d+)\s*:\s*L(\d+)\b')
+ABOVE = 'above'
+MAX_EXPONENT = 1000
+# Integers past this many bits (about 3000 digits) go on as floats, which
+# overflow instead of growing without bound.
+MAX_INT_BITS = 10000
+CACHE_SIZE = 2048
+
+def safe_mul(left, right):
+    if isinstance(left, int) and isinstance(right, int) and left.bit_length() + right.bit_length() > MAX_INT_BITS:
+        return float(left) * float(right)
+    return left * right
+
+
+BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+UNARY = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CalcError(Exception):
+    pass
+
+
+def flatten(args):
+    values = []
+    for arg in args:
+        if isinstance(arg, list):
+            values.extend(arg)
+        else:
+            values.append(arg)
+    return values
+
+
+def average(*args):
+    values = flatten(args)
+    if not values:
+        raise CalcError("avg of nothing")
+    return sum(values) / len(values)
+
+
+def safe_pow(base, exponent):
+    # A negative base to a fractional power has no real value; like
+    # sqrt(-1), it is an error rather than a complex number.
+    if abs(exponent) > MAX_EXPONENT:
+        raise CalcError("exponent too large")
+    if isinstance(base, int) and isinstance(exponent, int) and base.bit_length() * exponent > MAX_INT_BITS:
+        return float(base) ** exponent
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise CalcError("complex result")
+    return result
+
+
+FUNCTIONS = {
+    'sum': lambda *args: sum(flatten(args)),
+    'avg': average,
+    'min': lambda *args: min(flatten(args)),
+    'max': lambda *args: max(flatten(args)),
+    'abs': abs,
+    'round': round,
+    'sqrt': math.sqrt,
+}
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e16:
+            return str(int(value))
+        return '%.10g' % value
+    return str(value)
+
+
+def is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_line(text):
+    # "rent = 1200" defines a variable, "rent * 12 =" asks for a result and
+    # "total = rent * 12 = 14400" does both. Everything after the last "="
+    # of a result line is the previous answer and is ignored.
+    if '=' not in text or '==' in text:
+        return None
+    parts = text.split('=')
+    head = parts[0].strip()
+    if NAME_RE.match(head) and not LINE_REF_RE.match(head) and len(parts) in (2, 3):
+        name, expression, shows_result = head, parts[1].strip(), len(parts) == 3
+    elif len(parts) == 2:
+        name, expression, shows_result = None, head, True
+    else:
+        return None
+    if not expression:
+        return None
+    return name, expression, shows_result
+
+
+def compile_node(node, deps):
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda env: value
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY:
+        op, left, right = BINARY[type(node.op)], compile_node(node.left, deps), compile_node(node.right, deps)
+        return lambda env: op(left(env), right(env))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        left, right = compile_node(node.left, deps), compile_node(node.right, deps)
+        return lambda env: safe_pow(left(env), right(env))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY:
+        op, operand = UNARY[type(node.op)], compile_node(node.operand, deps)
+        return lambda env: op(operand(env))
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name == ABOVE:
+            deps.add(ABOVE)
+            return lambda env: env.above()
+        match = LINE_REF_RE.match(name)
+        if match:
+            line = int(match.group(1))
+            deps.add(('line', line))
+            return lambda env: env.line(line)
+        deps.add(name)
+        return lambda env: env.variable(name)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id == '_lines' and len(node.args) == 2:
+            first, last = node.args[0].value, node.args[1].value
+            first, last = min(first, last), max(first, last)
+            deps.add(('range', first, last))
+            return lambda env: env.lines(first, last)
+        function = FUNCTIONS.get(node.func.id)
+        if function is not None:
+            args = [compile_node(arg, deps) for arg in node.args]
+            return lambda env: function(*[arg(env) for arg in args])
+    raise CalcError("unsupported expression")
+
+
+def compile_expression(expression):
+    # Returns (evaluate, deps). `evaluate(env)` runs the expression against
+    # a worksheet environment; `deps` lists the variables and line
+    # references it reads. Nothing is ever passed to eval().
+    source = RANGE_RE.sub(lambda m: '_lines(%s, %s)' % (m.group(1), m.group(2)), expression)
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError:
+        raise CalcError("syntax error")
+    deps = set()
+    return compile_node(tree.body, deps), frozenset(deps)
+
+
+class Entry:
+    __slots__ = ('name', 'expression', 'shows_result', 'evaluate', 'deps')
+
+    def __init__(self, name, expression, shows_result, evaluate, deps):
+        self.name = name
+        self.expression = expression
+        self.shows_result = shows_result
+        self.evaluate = evaluate
+        self.deps = deps
+
+
+class Worksheet:
+    # Calculation lines of one note, keyed by line number. Each line is
+    # compiled once per distinct expression (shared LRU cache) and records
+    # what it read while being evaluated, so a change to one line only
+    # re-evaluates the lines that depend on it. Line numbers are absolute,
+    # as in L3, so inserting or removing lines re-evaluates every
+    # calculation line; that is still only the calculation lines.
+    cache = OrderedDict()
+
+    def __init__(self):
+        self.entries = {}
+        self.values = {}
+        self.definitions = {}
+        self.dependents = {}
+        self.ranges = set()
+        self.used = {}
+        self.pending = set()
+        self.before = {}
+        self.stale = False
+
+    def load(self, text):
+        self.entries = {}
+        self.add_lines(text, 1)
+
+    def add_lines(self, text, number):
+        # Reads the calculation lines of `text`, whose first line is line
+        # `number`, so a note can be fed in as it streams into the editor.
+        # Jumps from one "=" to the next instead of splitting the text, so
+        # loading a long note with a few calculations stays cheap.
+        counted = 0
+        pos = text.find('=')
+        while pos != -1:
+            start = text.rfind('\n', 0, pos) + 1
+            end = text.find('\n', pos)
+            if end == -1:
+                end = len(text)
+            number += text.count('\n', counted, start)
+            counted = start
+            self.set_line(number, text[start:end])
+            pos = text.find('=', end)
+        self.invalidate()
+
+    def invalidate(self):
+        self.stale = True
+
+    @classmethod
+    def compile(cls, expression):
+        compiled = cls.cache.get(expression)
+        if compiled is None:
+            try:
+                compiled = compile_expression(expression)
+            except (CalcError, ValueError, RecursionError):
+                compiled = (None, frozenset())
+            cls.cache[expression] = compiled
+            if len(cls.cache) > CACHE_SIZE:
+                cls.cache.popitem(last=False)
+        else:
+            cls.cache.move_to_end(expression)
+        return compiled
+
+    def set_line(self, number, text):
+        parsed = parse_line(text)
+        old = self.entries.get(number)
+        if parsed is None:
+            if old is None:
+                return
+            del self.entries[number]
+        else:
+            name, expression, shows_result = parsed
+            if old and (old.name, old.expression) == (name, expression):
+                old.shows_result = shows_result
+                return
+            evaluate, deps = self.compile(expression)
+            self.entries[number] = Entry(name, expression, shows_result, evaluate, deps)
+        if (old.name if old else None) != (parsed[0] if parsed else None):
+            self.invalidate()
+        self.pending.add(number)
+
+    def insert_lines(self, after, count):
+        self.shift(lambda n: n + count if n > after else n)
+
+    def remove_lines(self, first, count):
+        # Lines first .. first+count-1 disappear.
+        for number in range(first, first + count):
+            self.entries.pop(number, None)
+        self.shift(lambda n: n - count if n >= first + count else n)
+
+    def shift(self, move):
+        self.entries = {move(n): e for n, e in self.entries.items()}
+        self.values = {move(n): v for n, v in self.values.items() if n in self.entries or move(n) in self.entries}
+        self.invalidate()
+
+    def recalc(self):
+        # Returns {line: value} for every line whose value changed; their
+        # values before are left in `before`.
+        if self.stale:
+            self.stale = False
+            self.definitions = {e.name: n for n, e in sorted(self.entries.items()) if e.name}
+            self.dependents = {}
+            self.ranges = set()
+            self.used = {}
+            old_values, self.values = self.values, {}
+            self.pending = set(self.entries)
+        else:
+            old_values = dict((n, self.values.get(n)) for n in self.pending)
+
+        # Lines are evaluated in order; a line evaluated early, as another
+        # one's input, is skipped when its turn comes.
+        changed = {}
+        self.before = {}
+        self.visiting = set()
+        queue = list(self.pending)
+        heapq.heapify(queue)
+        while queue:
+            number = heapq.heappop(queue)
+            if number not in self.pending:
+                continue
+            before = old_values.get(number, self.values.get(number))
+            value = self.evaluate(number)
+            if value != before:
+                changed[number] = value
+                self.before.setdefault(number, before)
+                for key in self.keys_of(number):
+                    for dependent in self.dependents.get(key, ()):
+                        if dependent != number and dependent in self.entries and dependent not in self.pending:
+                            old_values.setdefault(dependent, self.values.get(dependent))
+                            self.values.pop(dependent, None)
+                            self.pending.add(dependent)
+                            heapq.heappush(queue, dependent)
+        return changed
+
+    def keys_of(self, number):
+        # A range is a single dependency however many lines it spans.
+        keys = [('line', number)]
+        entry = self.entries.get(number)
+        if entry and entry.name and self.definitions.get(entry.name) == number:
+            keys.append(entry.name)
+        keys.extend(key for key in self.ranges if key[1] <= number <= key[2])
+        return keys
+
+    def evaluate(self, number):
+        self.pending.discard(number)
+        entry = self.entries.get(number)
+        if entry is None:
+            self.values.pop(number, None)
+            return None
+        if number in self.visiting:
+            raise CalcError("circular reference")
+
+        for key in self.used.pop(number, ()):
+            self.dependents.get(key, set()).discard(number)
+        env = Environment(self, number)
+        self.visiting.add(number)
+        try:
+            value = entry.evaluate(env) if entry.evaluate else None
+            if isinstance(value, list):
+                value = None
+        except (CalcError, ArithmeticError, ValueError, TypeError, OverflowError):
+            value = None
+        finally:
+            self.visiting.discard(number)
+        for key in env.used:
+            self.dependents.setdefault(key, set()).add(number)
+            if isinstance(key, tuple) and key[0] == 'range':
+                self.ranges.add(key)
+        self.used[number] = env.used
+        self.values[number] = value
+        return value
+
+    def value_of(self, number):
+        if number in self.pending:
+            return self.evaluate(number)
+        return self.values.get(number)
+
+    def evaluate_text(self, expression):
+        # One-off evaluation, e.g. of a selection, against current values.
+        evaluate, _ = self.compile(expression)
+        if evaluate is None:
+            raise CalcError("unsupported expression")
+        return evaluate(Environment(self, None))
+
+
+class Environment:
+    def __init__(self, worksheet, number):
+        self.worksheet = worksheet
+        self.number = number
+        self.used = set()
+
+    def resolve(self, number):
+        value = self.worksheet.value_of(number)
+        if value is None:
+            raise CalcError("no value on line %d" % number)
+        return value
+
+    def variable(self, name):
+        self.used.add(name)
+        number = self.worksheet.definitions.get(name)
+        if number is None or number == self.number:
+            raise CalcError("unknown name %s" % name)
+        return self.resolve(number)
+
+    def line(self, number):
+        self.used.add(('line', number))
+        if number == self.number:
+            raise CalcError("line refers to itself")
+        return self.resolve(number)
+
+    def lines(self, first, last):
+        # Every line in the range must hold a value, so a range longer than
+        # the calculation lines in it fails without walking it.
+        self.used.add(('range', first, last))
+        if first <= (self.number or 0) <= last:
+            raise CalcError("range includes its own line")
+        numbers = sorted(n for n in self.worksheet.entries if first <= n <= last)
+        if len(numbers) != last - first + 1:
+            raise CalcError("no value in part of L%d:L%d" % (first, last))
+        return [self.resolve(number) for number in numbers]
+
+    def above(self):
+        # The run of calculation lines directly above this one.
+        values = []
+        number = (self.number or 1) - 1
+        while number > 0:
+            # The line that ends the run is a dependency too: if it turns
+            # into a calculation line, the run gets longer.
+            self.used.add(('line', number))
+            if number not in self.worksheet.entries:
+                break
+            value = self.worksheet.value_of(number)
+            if value is None:
+                break
+            values.append(value)
+            number -= 1
+        values.reverse()
+        return values
@@ -0,0 +1,46 @@
+from array import array
+
+
+def line_counts(lines):
+    return array('I', [len(line.split()) for line in lines]), array('I', map(len, lines))
+
+
+class DocStats:
+    # Word and character counts of a text, kept per line so an edit only
+    # recounts the lines it touched; the totals are adjusted by the
+    # difference. Words never span a line break, so the per-line counts
+    # add up exactly. Characters include the line breaks.
+    def __init__(self):
+        self.words = array('I', [0])
+        self.chars = array('I', [0])
+        self.total_words = 0
+        self.total_chars = 0
+
+    def reset(self, text):
+        self.words, self.chars = line_counts(text.split('\n'))
+        self.total_words = sum(self.words)
+        self.total_chars = sum(self.chars)
+
+    def splice(self, start, remove, new_lines):
+        # Replaces lines start .. start + remove - 1 (0-based) with
+        # `new_lines`.
+        words, chars = line_counts(new_lines)
+        end = start + remove
+        self.total_words += sum(words) - sum(self.words[start:end])
+        self.total_chars += sum(chars) - sum(self.chars[start:end])
+        self.words[start:end] = words
+        self.chars[start:end] = chars
+
+    @property
+    def lines(self):
+        return len(self.words)
+
+    def totals(self):
+        return self.total_words, self.total_chars + self.lines - 1, self.lines
+
+    def between(self, first, last):
+        # Words and characters of whole lines first .. last - 1, without
+        # their line breaks.
+        if last <= first:
+            return 0, 0
+        return sum(self.words[first:last]), sum(self.chars[first:last])
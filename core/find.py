@@ -0,0 +1,146 @@
+import queue
+import re
+import threading
+from array import array
+
+OVERLAP = 64 * 1024
+MAX_MATCHES = 1000000
+
+
+def compile_query(query, regex=False, case=False):
+    # Raises re.error for a bad regular expression.
+    return re.compile(query if regex else re.escape(query), 0 if case else re.IGNORECASE)
+
+
+def expander(replacement, regex):
+    # Regular expressions may refer to groups (\1, \g<name>); a literal
+    # replacement is used as typed.
+    if regex:
+        return lambda match: match.expand(replacement)
+    return lambda match: replacement
+
+
+class FindScan:
+    # Searches text that arrives in chunks, as (line, column) positions
+    # with 1-based lines like Tk indices. A chunk is searched up to
+    # OVERLAP characters short of its end, unless it is the last one, so
+    # a match running into the next chunk is found whole once that chunk
+    # is in. Each call to pattern.search() covers one chunk, which bounds
+    # how long the worker holds the GIL at a time.
+    #
+    # Given `replace`, a function from a match to its replacement, the scan
+    # instead yields hunks: the matches of one line merged into a single
+    # (start, end, new text) edit, so replace-all makes one edit per line.
+    def __init__(self, pattern, replace=None):
+        self.pattern = pattern
+        self.replace = replace
+        self.buffer = ""
+        self.line = 1
+        self.line_start = 0
+        self.scanned = 0
+        self.found = 0
+        self.capped = False
+
+    def position(self, offset):
+        # Offsets only move forward, so line counting is incremental.
+        newlines = self.buffer.count('\n', self.scanned, offset)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.buffer.rfind('\n', self.scanned, offset) + 1
+        self.scanned = offset
+        return self.line, offset - self.line_start
+
+    def feed(self, text, final):
+        # Returns the matches as a flat array of start line, start column,
+        # end line, end column, plus the hunk texts when replacing.
+        buffer = self.buffer = self.buffer + text
+        limit = len(buffer) if final else len(buffer) - OVERLAP
+        positions = array('I')
+        texts = []
+        hunk = None
+        pos = 0
+        while pos < limit and not self.capped:
+            match = self.pattern.search(buffer, pos)
+            if match is None or match.start() >= limit:
+                break
+            start, end = match.span()
+            if start == end:
+                # Empty matches cannot be shown or replaced usefully.
+                pos = end + 1
+                continue
+            pos = end
+            if self.replace is None:
+                positions.extend(self.position(start) + self.position(end))
+            elif hunk and '\n' not in buffer[hunk[1]:end]:
+                hunk[1] = end
+                hunk[2].append(buffer[hunk[3]:start])
+                hunk[2].append(self.replace(match))
+                hunk[3] = end
+            else:
+                if hunk:
+                    self.close_hunk(hunk, positions, texts)
+                hunk = [start, end, [self.replace(match)], end]
+            self.found += 1
+            self.capped = self.found >= MAX_MATCHES
+        if hunk:
+            self.close_hunk(hunk, positions, texts)
+
+        # Keep the unsearched tail; line counting continues from it.
+        cut = min(max(pos, limit), len(buffer))
+        self.position(cut)
+        self.buffer = buffer[cut:]
+        self.scanned -= cut
+        self.line_start -= cut
+        return positions, texts
+
+    def close_hunk(self, hunk, positions, texts):
+        start, end, parts, _ = hunk
+        positions.extend(self.position(start) + self.position(end))
+        texts.append(''.join(parts))
+
+
+class FindWorker:
+    # Runs FindScans on a background thread. The UI thread starts a scan
+    # with a generation number and feeds it chunks of the buffer; results
+    # come back as (generation, positions, texts, done, capped). Starting a
+    # new generation abandons the old one, and chunks of older generations
+    # are skipped unread.
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.thread = threading.Thread(target=self.run, name="find", daemon=True)
+        self.thread.start()
+
+    def start(self, generation, pattern, replace=None):
+        self.generation = generation
+        self.requests.put((generation, 'start', (pattern, replace)))
+
+    def feed(self, generation, text, final):
+        self.requests.put((generation, 'feed', (text, final)))
+
+    def cancel(self, generation):
+        self.generation = generation
+
+    def run(self):
+        scan = None
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            generation, op, args = request
+            if generation != self.generation:
+                continue
+            if op == 'start':
+                scan = FindScan(*args)
+                continue
+            if scan.capped:
+                continue
+            text, final = args
+            positions, texts = scan.feed(text, final)
+            done = final or scan.capped
+            if positions or done:
+                self.results.put((generation, positions, texts, done, scan.capped))
+
+    def stop(self):
+        self.requests.put(None)
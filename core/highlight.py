@@ -0,0 +1,223 @@
+import queue
+import re
+import threading
+
+# Token kinds double as Tk tag names in the editor.
+KEYWORD = 'hl_keyword'
+STRING = 'hl_string'
+COMMENT = 'hl_comment'
+NUMBER = 'hl_number'
+NAME = 'hl_name'
+TOKEN_KINDS = [KEYWORD, STRING, COMMENT, NUMBER, NAME]
+
+FENCE_RE = re.compile(r'\s*```\s*([\w+-]*)')
+NUMBER_RE = r'\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)\b'
+
+
+def words(text):
+    return r'\b(?:%s)\b' % '|'.join(text.split())
+
+
+class RegexLexer:
+    # `rules` are tried as one alternation; each group is a token kind.
+    # `multiline` maps an opening token to (state, closing pattern) for
+    # constructs that can run over the end of a line, such as Python's
+    # triple-quoted strings or SQL block comments.
+    # Patterns are compiled on first use, on the worker thread, to keep
+    # them off the startup path.
+    def __init__(self, rules, multiline=None, flags=0):
+        self.rules = rules
+        self.flags = flags
+        self.kinds = [kind for kind, _ in rules]
+        self.multiline = multiline or {}
+        self.pattern = None
+        self.closers = None
+
+    def compile(self):
+        self.closers = {state: (kind, re.compile(closer)) for state, kind, closer in self.multiline.values()}
+        self.pattern = re.compile('|'.join('(%s)' % rule for _, rule in self.rules), self.flags)
+
+    def lex(self, text, state):
+        if self.pattern is None:
+            self.compile()
+        tokens = []
+        pos = 0
+        if state is not None:
+            kind, closer = self.closers[state]
+            match = closer.search(text)
+            if not match:
+                return [(kind, 0, len(text))], state
+            tokens.append((kind, 0, match.end()))
+            pos = match.end()
+        while True:
+            match = self.pattern.search(text, pos)
+            if not match:
+                return tokens, None
+            kind = self.kinds[match.lastindex - 1]
+            opener = self.multiline.get(match.group())
+            if opener:
+                state, kind, closer = opener
+                end = self.closers[state][1].search(text, match.end())
+                if not end:
+                    tokens.append((kind, match.start(), len(text)))
+                    return tokens, state
+                tokens.append((kind, match.start(), end.end()))
+                pos = end.end()
+                continue
+            tokens.append((kind, match.start(), match.end()))
+            pos = match.end() if match.end() > pos else pos + 1
+
+
+PYTHON = RegexLexer([
+    (STRING, r"'''|\"\"\""),
+    (COMMENT, r'#.*'),
+    (STRING, r"[rbfuRBFU]{0,2}'(?:\\.|[^'\\])*'|[rbfuRBFU]{0,2}\"(?:\\.|[^\"\\])*\""),
+    (KEYWORD, words('False None True and as assert async await break class continue def del elif else '
+                    'except finally for from global if import in is lambda nonlocal not or pass raise '
+                    'return try while with yield match case')),
+    (NAME, words('print len range str int float list dict set tuple open self super isinstance '
+                 'enumerate zip map filter sorted min max sum abs any all') + r'|@\w+'),
+    (NUMBER, NUMBER_RE),
+], multiline={"'''": ("'''", STRING, r"'''"), '"""': ('"""', STRING, r'"""')})
+
+JSON = RegexLexer([
+    (NAME, r'"(?:\\.|[^"\\])*"(?=\s*:)'),
+    (STRING, r'"(?:\\.|[^"\\])*"'),
+    (KEYWORD, words('true false null')),
+    (NUMBER, r'-?' + NUMBER_RE),
+])
+
+SHELL = RegexLexer([
+    (COMMENT, r'(?<![\w$])#.*'),
+    (STRING, r"'[^']*'|\"(?:\\.|[^\"\\])*\""),
+    (NAME, r'\$\{[^}]*\}|\$\w+|\$[@#?$!*0-9]'),
+    (KEYWORD, words('if then else elif fi for while until do done case esac in function select '
+                    'return exit export local readonly source echo cd')),
+    (NUMBER, NUMBER_RE),
+])
+
+SQL = RegexLexer([
+    (COMMENT, r'/\*'),
+    (COMMENT, r'--.*'),
+    (STRING, r"'(?:''|[^'])*'"),
+    (NAME, r'"[^"]*"|`[^`]*`'),
+    (KEYWORD, words('select from where and or not insert into values update set delete create table '
+                    'drop alter index view join left right inner outer full on as group by order '
+                    'having limit offset distinct union all null is in like between case when then '
+                    'else end primary key foreign references default exists count sum avg min max asc desc')),
+    (NUMBER, NUMBER_RE),
+], multiline={'/*': ('/*', COMMENT, r'\*/')}, flags=re.IGNORECASE)
+
+LEXERS = {
+    'python': PYTHON, 'py': PYTHON,
+    'json': JSON,
+    'sh': SHELL, 'bash': SHELL, 'shell': SHELL, 'zsh': SHELL, 'console': SHELL,
+    'sql': SQL,
+}
+
+
+def lex_line(text, state):
+    # `state` is the lexer state at the start of the line: None outside a
+    # fenced block, otherwise (language, inner state). Returns
+    # (in_code, tokens, state at the start of the next line).
+    fence = FENCE_RE.match(text)
+    if fence:
+        if state is None:
+            return True, [], (fence.group(1).lower(), None)
+        if not text.strip('` \t'):
+            return True, [], None
+    if state is None:
+        return False, [], None
+    language, inner = state
+    lexer = LEXERS.get(language)
+    if lexer is None:
+        return True, [], state
+    tokens, inner = lexer.lex(text, inner)
+    return True, tokens, (language, inner)
+
+
+class HighlightModel:
+    # Line-by-line lexer state for one buffer. `states[i]` is the state at
+    # the start of line i. After an edit, lines are re-lexed from the first
+    # edited line until the edited range is covered and a line ends in the
+    # same state as before; everything after that is still valid.
+    def __init__(self):
+        self.lines = []
+        self.states = [None]
+        self.dirty = None
+
+    def reset(self, lines):
+        self.lines = list(lines)
+        self.states = [None] * (len(self.lines) + 1)
+        self.states[1:] = [object()] * len(self.lines)
+        self.dirty = (0, len(self.lines))
+
+    def splice(self, start, remove, new_lines):
+        self.lines[start:start + remove] = new_lines
+        # Unknown states never compare equal, so re-lexing cannot stop
+        # early inside the new lines.
+        self.states[start + 1:start + 1 + remove] = [object() for _ in new_lines]
+        end = start + len(new_lines)
+        if self.dirty is None:
+            self.dirty = (start, end)
+        else:
+            first, last = self.dirty
+            if last > start + remove:
+                last += len(new_lines) - remove
+            elif last > start:
+                last = end
+            self.dirty = (min(first, start), max(last, end))
+
+    def relex(self):
+        # Returns (first line, [(in_code, tokens), ...]) for the lines whose
+        # tokens may have changed.
+        if self.dirty is None:
+            return 0, []
+        first, last = self.dirty
+        self.dirty = None
+        results = []
+        line = first
+        state = self.states[first]
+        while line < len(self.lines):
+            in_code, tokens, state = lex_line(self.lines[line], state)
+            results.append((in_code, tokens))
+            line += 1
+            if line >= last and self.states[line] == state:
+                break
+            self.states[line] = state
+        return first, results
+
+
+class HighlightWorker:
+    # Owns a HighlightModel on a background thread. Edits are queued in
+    # order with a version number; results come back tagged with the
+    # version of the last edit they include.
+    def __init__(self):
+        self.model = HighlightModel()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="highlighter", daemon=True)
+        self.thread.start()
+
+    def submit(self, version, op, *args):
+        self.requests.put((version, op, args))
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            version = None
+            for request in batch:
+                if request is None:
+                    return
+                version, op, args = request
+                getattr(self.model, op)(*args)
+            first, lines = self.model.relex()
+            self.results.put((version, first, lines))
+
+    def stop(self):
+        self.requests.put(None)
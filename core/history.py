@@ -0,0 +1,150 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+GROUP_PAUSE = 1.0
+CHUNK = 64
+
+
+def common_prefix(a, b, limit):
+    # Galloping search with slice compares, so long equal stretches are
+    # skipped at C speed and only O(log n) compares are made.
+    i, step, growing = 0, CHUNK, True
+    while step:
+        if i + step <= limit and a[i:i + step] == b[i:i + step]:
+            i += step
+            if growing:
+                step *= 2
+        else:
+            growing = False
+            step //= 2
+    return i
+
+
+def common_suffix(a, b, limit):
+    la, lb = len(a), len(b)
+    i, step, growing = 0, CHUNK, True
+    while step:
+        if i + step <= limit and a[la - i - step:la - i] == b[lb - i - step:lb - i]:
+            i += step
+            if growing:
+                step *= 2
+        else:
+            growing = False
+            step //= 2
+    return i
+
+
+def diff(old, new):
+    # One (at, cut, text) edit turning `old` into `new`: replace `cut`
+    # characters at `at` with `text`.
+    limit = min(len(old), len(new))
+    start = common_prefix(old, new, limit)
+    tail = common_suffix(old, new, limit - start)
+    return start, len(old) - start - tail, new[start:len(new) - tail]
+
+
+def patch(text, at, cut, insert):
+    return text[:at] + insert + text[at + cut:]
+
+
+def step_size(step):
+    return sum(len(op[2]) for op in step)
+
+
+class UndoStack:
+    # The edits of one note as (kind, start, text, runs) ops, where `kind`
+    # is 'insert' or 'delete', `start` a (line, col) tuple and `runs` the
+    # formatting a deletion took with it, as offsets into `text`. Ops are
+    # grouped into steps: edits of the same kind less than GROUP_PAUSE
+    # apart form one step, and everything inside group() forms one.
+    def __init__(self):
+        self.done = []
+        self.undone = []
+        self.size = 0
+        self.last_kind = None
+        self.last_time = 0.0
+        self.holding = 0
+        self.split = True
+
+    def record(self, kind, start, text, runs=None):
+        now = time.monotonic()
+        if (not self.done or self.split or not self.holding and
+                (kind != self.last_kind or now - self.last_time > GROUP_PAUSE)):
+            self.done.append([])
+            self.split = False
+        self.done[-1].append((kind, start, text, runs))
+        self.size += len(text)
+        self.last_kind, self.last_time = kind, now
+        if self.undone:
+            self.size -= sum(step_size(step) for step in self.undone)
+            self.undone = []
+
+    @contextmanager
+    def group(self):
+        self.split = True
+        self.holding += 1
+        try:
+            yield
+        finally:
+            self.holding -= 1
+            self.split = True
+
+    def undo(self):
+        if not self.done:
+            return None
+        step = self.done.pop()
+        self.undone.append(step)
+        self.split = True
+        return step
+
+    def redo(self):
+        if not self.undone:
+            return None
+        step = self.undone.pop()
+        self.done.append(step)
+        self.split = True
+        return step
+
+    def trim(self, limit):
+        # Forgets the oldest steps until at most `limit` characters remain.
+        dropped = 0
+        while self.size > limit and dropped < len(self.done):
+            self.size -= step_size(self.done[dropped])
+            dropped += 1
+        del self.done[:dropped]
+        if self.size > limit:
+            self.clear()
+
+    def clear(self):
+        self.done = []
+        self.undone = []
+        self.size = 0
+        self.split = True
+
+
+class UndoStacks:
+    # One UndoStack per note, kept across note switches. The text they hold
+    # together is capped at `max_chars`; the least recently opened notes
+    # lose their oldest steps first.
+    def __init__(self, max_chars=8 * 1024 * 1024):
+        self.max_chars = max_chars
+        self.stacks = OrderedDict()
+
+    def get(self, note_id):
+        stack = self.stacks.pop(note_id, None) or UndoStack()
+        self.stacks[note_id] = stack
+        self.enforce()
+        return stack
+
+    def discard(self, note_id):
+        self.stacks.pop(note_id, None)
+
+    def enforce(self):
+        total = sum(stack.size for stack in self.stacks.values())
+        for stack in list(self.stacks.values()):
+            if total <= self.max_chars:
+                break
+            before = stack.size
+            stack.trim(max(0, before - (total - self.max_chars)))
+            total -= before - stack.size
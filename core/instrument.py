@@ -0,0 +1,173 @@
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+BUCKETS_PER_OCTAVE = 4
+MAX_EVENTS = 200000
+STACK_DEPTH = 12
+
+
+class Histogram:
+    # Log-scale buckets over microseconds, four per doubling, so a
+    # percentile is exact to within ~19% at any scale.
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = int(math.log2(max(seconds * 1e6, 1.0)) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class Recorder:
+    # Collects timings from instrumented handlers, samples from the saver
+    # and stalls from the watchdog. Events are kept in Chrome trace format
+    # (chrome://tracing, Perfetto) and written by dump().
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.stalls = deque(maxlen=50)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.threads = {}
+
+    def record(self, name, began, duration):
+        tid = threading.get_ident()
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration)
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+            self.events.append({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                                'ts': (began - self.origin) * 1e6, 'dur': duration * 1e6})
+
+    def sample(self, name, duration):
+        # A duration measured elsewhere that ends now.
+        self.record(name, time.perf_counter() - duration, duration)
+
+    def stall(self, began, duration, stack, tid):
+        with self.lock:
+            self.stalls.append({'duration': duration, 'stack': stack})
+            self.events.append({'name': 'stall', 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                                'ts': (began - self.origin) * 1e6, 'dur': duration * 1e6,
+                                'args': {'stack': ''.join(stack)}})
+
+    def wrap(self, func, name):
+        record = self.record
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, began, time.perf_counter() - began)
+        return timed
+
+    def instrument(self, cls, names):
+        # Patches the class, not instances, so callbacks bound while the
+        # widgets are built already go through the timer. Uninstrumented
+        # runs never see a wrapper.
+        for name in names:
+            setattr(cls, name, self.wrap(getattr(cls, name), '%s.%s' % (cls.__name__, name)))
+
+    def summaries(self):
+        with self.lock:
+            return {name: h.summary() for name, h in self.histograms.items()}, list(self.stalls)
+
+    def dump(self, path=None):
+        path = path or self.trace_path
+        if not path:
+            return
+        with self.lock:
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                       'args': {'name': name}} for tid, name in self.threads.items()]
+            events.extend(self.events)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp_path, path)
+
+
+class StallWatchdog:
+    # The Tk loop bumps a heartbeat every `interval` seconds. A thread
+    # watches it; once a beat is `threshold` late the main thread is stuck
+    # in one callback, and its stack is captured while it is still there.
+    # The stall is recorded when the loop comes back.
+    def __init__(self, root, recorder, interval=0.05, threshold=0.25):
+        self.root = root
+        self.recorder = recorder
+        self.interval = interval
+        self.threshold = threshold
+        self.main_tid = threading.get_ident()
+        self.lock = threading.Lock()
+        self.last_beat = time.perf_counter()
+        self.stack = None
+        self.stopped = threading.Event()
+        self.root.after(int(self.interval * 1000), self.beat)
+        self.thread = threading.Thread(target=self.watch, name="stall-watchdog", daemon=True)
+        self.thread.start()
+
+    def beat(self):
+        now = time.perf_counter()
+        with self.lock:
+            late = now - self.last_beat
+            stack, self.stack = self.stack, None
+            began, self.last_beat = self.last_beat, now
+        self.recorder.record('loop.lag', began, max(0.0, late - self.interval))
+        if stack is not None:
+            self.recorder.stall(began, late, stack, self.main_tid)
+        if not self.stopped.is_set():
+            self.root.after(int(self.interval * 1000), self.beat)
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                beat_at = self.last_beat
+                if time.perf_counter() - beat_at <= self.threshold or self.stack is not None:
+                    continue
+            frame = sys._current_frames().get(self.main_tid)
+            # A stack that ends in mainloop means Tk itself (layout, redraw)
+            # is busy rather than a Python handler.
+            stack = traceback.format_stack(frame)[-STACK_DEPTH:] if frame else []
+            with self.lock:
+                if self.last_beat == beat_at:
+                    self.stack = stack
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,98 @@
+import re
+
+# Markdown in and out of the tag model: **bold** / __bold__, *italic* /
+# _italic_ and ``` fences, which keep their fence lines in the text and are
+# tagged 'code' the way Editor.insert_code_block tags them. Underline has
+# no markdown syntax and is written as <u>...</u>.
+FENCE_RE = re.compile(r'^```.*$', re.M)
+EMPHASIS_RE = re.compile(
+    r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1'
+    r'|\*(?=[^\s*])(.+?)(?<=[^\s*])\*'
+    r'|(?<!\w)_(?=[^\s_])(.+?)(?<=[^\s_])_(?!\w)'
+    r'|<u>(.+?)</u>')
+MARKERS = [('bold', '**', '**'), ('italic', '*', '*'), ('underline', '<u>', '</u>')]
+
+
+def parse_markdown(text):
+    # Returns (content, runs) with runs as {tag: [(start, end)]}.
+    runs = {}
+    out = []
+    length = 0
+    position = 0
+    while position < len(text):
+        fence = FENCE_RE.search(text, position)
+        prose = text[position:fence.start() if fence else len(text)]
+        length = parse_inline(prose, length, out, runs)
+        if not fence:
+            break
+        close = FENCE_RE.search(text, fence.end() + 1)
+        end = close.end() + 1 if close else len(text)
+        block = text[fence.start():end]
+        out.append(block)
+        runs.setdefault('code', []).append((length, length + len(block)))
+        length += len(block)
+        position = end
+    for tag_runs in runs.values():
+        tag_runs.sort()
+    return ''.join(out), runs
+
+
+def parse_inline(text, length, out, runs):
+    position = 0
+    for match in EMPHASIS_RE.finditer(text):
+        out.append(text[position:match.start()])
+        length += match.start() - position
+        if match.group(2) is not None:
+            tag, inner = 'bold', match.group(2)
+        elif match.group(5) is not None:
+            tag, inner = 'underline', match.group(5)
+        else:
+            tag, inner = 'italic', match.group(3) or match.group(4)
+        start = length
+        length = parse_inline(inner, length, out, runs)
+        runs.setdefault(tag, []).append((start, length))
+        position = match.end()
+    out.append(text[position:])
+    return length + len(text) - position
+
+
+def render_markdown(content, runs):
+    # The reverse of parse_markdown. A run is marked per line with its
+    # surrounding whitespace left outside the markers, since markdown does
+    # not allow either inside; runs within code blocks are dropped.
+    code = runs.get('code', [])
+    events = []
+    for order, (tag, opening, closing) in enumerate(MARKERS):
+        for start, end in runs.get(tag, ()):
+            for piece_start, piece_end in split_lines(content, start, end):
+                if not inside(code, piece_start):
+                    events.append((piece_start, 1, order, opening))
+                    events.append((piece_end, 0, -order, closing))
+    if not events:
+        return content
+    events.sort()
+    out = []
+    position = 0
+    for offset, _, _, marker in events:
+        out.append(content[position:offset])
+        out.append(marker)
+        position = offset
+    out.append(content[position:])
+    return ''.join(out)
+
+
+def split_lines(content, start, end):
+    while start < end:
+        line_end = content.find('\n', start, end)
+        if line_end == -1:
+            line_end = end
+        piece = content[start:line_end]
+        stripped = piece.strip()
+        if stripped:
+            left = start + len(piece) - len(piece.lstrip())
+            yield left, left + len(stripped)
+        start = line_end + 1
+
+
+def inside(runs, offset):
+    return any(start <= offset < end for start, end in runs)
@@ -0,0 +1,82 @@
+from bisect import bisect_left, bisect_right
+
+SORT_MODES = ('recent', 'title', 'created')
+DEFAULT_SORT = 'recent'
+SORT_LABELS = {'recent': "Recent", 'title': "Title", 'created': "Created"}
+
+
+def sort_key(mode, note):
+    # Most recently modified first; titles A to Z; oldest first by
+    # creation, which is the order notes were added in.
+    if mode == 'recent':
+        return -note.last_modified
+    if mode == 'title':
+        return note.title.casefold()
+    return note.created
+
+
+class NoteOrder:
+    # `notes` kept sorted for one of SORT_MODES, with the sort keys in a
+    # parallel list so a note's row is found by bisect. A note whose key
+    # changes is moved from its old row to its new one rather than the list
+    # being sorted again; when it still sorts between its neighbours, as
+    # the note being typed into at the top of "recent" does, nothing moves.
+    # Notes with equal keys (an import can stamp thousands with one time)
+    # are ordered by id, and searched by id within the run. The list object
+    # is never replaced, so views holding it stay current.
+    def __init__(self, notes, mode=DEFAULT_SORT):
+        self.notes = notes
+        self.keys = []
+        self.mode = mode
+        self.sort(mode)
+
+    def sort(self, mode):
+        self.mode = mode
+        self.notes.sort(key=lambda note: (sort_key(mode, note), note.id))
+        self.keys = [sort_key(mode, note) for note in self.notes]
+
+    def find(self, key, note_id):
+        # Row of (key, note_id), or where it would go.
+        low = bisect_left(self.keys, key)
+        high = bisect_right(self.keys, key, low)
+        while low < high:
+            middle = (low + high) // 2
+            if self.notes[middle].id < note_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def index(self, note):
+        # Only valid while the note's key is the one it was placed with.
+        return self.find(sort_key(self.mode, note), note.id)
+
+    def insert(self, note):
+        key = sort_key(self.mode, note)
+        i = self.find(key, note.id)
+        self.keys.insert(i, key)
+        self.notes.insert(i, note)
+        return i
+
+    def remove(self, note):
+        i = self.index(note)
+        del self.keys[i]
+        del self.notes[i]
+        return i
+
+    def moved(self, note, old):
+        # `note` was at row `old` before its key changed; returns its new
+        # row.
+        key = sort_key(self.mode, note)
+        keys, notes = self.keys, self.notes
+        placed = (key, note.id)
+        if ((old == 0 or (keys[old - 1], notes[old - 1].id) < placed) and
+                (old + 1 == len(keys) or placed < (keys[old + 1], notes[old + 1].id))):
+            keys[old] = key
+            return old
+        del keys[old]
+        del notes[old]
+        new = self.find(key, note.id)
+        keys.insert(new, key)
+        notes.insert(new, note)
+        return new
@@ -0,0 +1,430 @@
+import json
+import logging
+import os
+import time
+from models.note import Note, parse_time, intern_name
+from storage.body_cache import BodyCache
+from storage.journal import put_record, delete_record
+from core.search import SearchIndex, IndexUpdater
+from core.switcher import TitleIndex
+from core.note_order import NoteOrder, DEFAULT_SORT, sort_key
+from core.tag_index import TagIndex, parse_filter
+from core.history import UndoStacks
+
+TITLE_TAGS = ['bold', 'italic', 'underline']
+UNTITLED = "Untitled Note"
+STARTUP_VERSION = 1
+STARTUP_PAGE = 60
+STARTUP_BODY_LIMIT = 256 * 1024
+
+log = logging.getLogger(__name__)
+
+
+def derive_title(first_line):
+    return first_line.strip() or UNTITLED
+
+
+def first_line(content):
+    end = content.find('\n')
+    return content if end == -1 else content[:end]
+
+
+def first_line_tags(runs, line_end):
+    # A tag styles the title when one of its runs touches line 1, newline
+    # included; runs are sorted, so the first one decides.
+    return [tag for tag in TITLE_TAGS if runs.get(tag) and runs[tag][0][0] <= line_end]
+
+
+class Notebook:
+    # The collection of notes without any widgets: list order, the open
+    # note, titles, the body cache, the search and title indexes, the
+    # records that go to the store, plus per-note undo stacks and, given a
+    # HistoryStore, a version for every save. `saver` is an
+    # AutosaveScheduler in the app and a ManualSaver when driven headless.
+    # `source` is whatever owns the text of the open note (the Editor); it
+    # needs `unsynced`, get_content() and get_spans(content). Notes other
+    # instances save to the same store are merged in by poll_external().
+    # `notes` is kept in the order of `sort_mode` as notes are edited,
+    # added and removed; see NoteOrder. Tags and notebooks are indexed in
+    # `tags` for filtering; see TagIndex.
+    def __init__(self, store, search_path=None, startup_path=None, history=None):
+        self.store = store
+        self.history = history
+        self.undo = UndoStacks()
+        self.search_path = search_path
+        self.startup_path = startup_path
+        self.order = NoteOrder([])
+        self.notes = self.order.notes
+        self.sort_mode = DEFAULT_SORT
+        self.by_id = {}
+        self.index = SearchIndex()
+        self.updater = IndexUpdater(self.index, store.read)
+        self.title_index = TitleIndex()
+        self.tags = TagIndex()
+        self.bodies = BodyCache(store, pinned=self.has_unsaved_body)
+        self.deleted = set()
+        self.collecting = ()
+        self.open_note = None
+        self.source = None
+        self.saver = None
+        self.loaded = False
+        self.indexed = False
+        self.unindexed = {}
+
+    def load(self):
+        # An unreadable store opens empty and a malformed note is left out;
+        # both are logged. Notes stored without a last_modified get the
+        # snapshot's time and are saved once with it, so they stop counting
+        # as just edited on every start.
+        notes = []
+        backfill = []
+        stored_at = None
+        try:
+            stored = self.store.open()
+        except (OSError, ValueError) as e:
+            log.error("could not open the notes: %s", e)
+            stored = []
+        for note_data in stored:
+            last_modified = note_data.get('last_modified')
+            if last_modified is None:
+                if stored_at is None:
+                    stamp = self.store.snapshot_stamp()
+                    stored_at = stamp[1] / 1e9 if stamp else time.time()
+                last_modified = stored_at
+            try:
+                notes.append(Note(
+                    note_data['title'],
+                    None,
+                    note_data.get('title_tags', []),
+                    note_data['id'],
+                    last_modified,
+                    self.bodies.load,
+                    rev=note_data.get('rev', 0),
+                    created=note_data.get('created'),
+                    labels=note_data.get('labels'),
+                    notebook=note_data.get('notebook')
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                log.error("skipped note %s: %r", note_data.get('id'), e)
+                continue
+            if note_data.get('last_modified') is None:
+                backfill.append(notes[-1])
+        self.order = NoteOrder(notes, self.sort_mode)
+        self.notes = self.order.notes
+        self.by_id = {note.id: note for note in self.notes}
+        self.tags.build(self.notes)
+        self.loaded = True
+        for note in backfill:
+            self.saver.mark_dirty(note)
+        return self.notes
+
+    def read_startup(self):
+        # The startup file holds the first page of titles and the note that
+        # was open at exit, so the window can show them before the store is
+        # opened. It is only used if the store has not changed since.
+        if not self.startup_path:
+            return None
+        try:
+            with open(self.startup_path, 'r') as f:
+                startup = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The sort mode is a preference, kept even when the rest is stale.
+        self.sort_mode = startup.get('sort', self.sort_mode)
+        if startup.get('version') != STARTUP_VERSION or startup.get('stamp') != self.store.disk_stamp():
+            return None
+        startup['page'] = [Note(title, None, title_tags, note_id, last_modified)
+                           for note_id, title, title_tags, last_modified in startup['page']]
+        return startup
+
+    def write_startup(self):
+        note = self.open_note
+        content = spans = None
+        if note and len(note.content) <= STARTUP_BODY_LIMIT:
+            content, spans = note.content, note.spans
+        startup = {
+            'version': STARTUP_VERSION,
+            'stamp': self.store.stamp(),
+            'page': [[n.id, n.title, list(n.title_tags), n.last_modified] for n in self.notes[:STARTUP_PAGE]],
+            'selected': note.id if note else None,
+            'sort': self.sort_mode,
+            'content': content,
+            'spans': spans,
+        }
+        tmp_path = self.startup_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(startup, f, separators=(',', ':'))
+        os.replace(tmp_path, self.startup_path)
+
+    def load_search_index(self):
+        # Normally only the notes written after the index was last saved
+        # are re-tokenized; without a usable index everything is.
+        index = SearchIndex()
+        stamp = index.load(self.search_path) if self.search_path else None
+        if stamp and stamp[0] == self.store.snapshot_stamp() and stamp[1] <= self.store.log_size:
+            for note_id, note_data in self.store.changes_since(stamp[1]).items():
+                if note_data is None:
+                    index.remove(note_id)
+                else:
+                    index.add(note_id, note_data['content'])
+        else:
+            index = SearchIndex()
+            for note in self.notes:
+                note_data = self.store.read(note.id)
+                index.add(note.id, note_data['content'] if note_data else "")
+        with self.updater.lock:
+            self.index = self.updater.index = index
+        self.indexed = True
+        for note_id, content in self.unindexed.items():
+            self.reindex(note_id, content)
+        self.unindexed = {}
+
+    def reindex(self, note_id, content):
+        # Tokenizing is left to the IndexUpdater's thread. Changes made
+        # before the index is loaded wait in `unindexed`; None stands for a
+        # deleted note, IndexUpdater.STORED for a body to read from the store.
+        if not self.indexed:
+            self.unindexed[note_id] = content
+        else:
+            self.updater.submit(note_id, content)
+
+    def search(self, query, notebook=None):
+        # Full-text search, narrowed by any `#tag`/`@notebook` filter in the
+        # query and to `notebook` if given. A filter alone lists its notes in
+        # the current sort order.
+        node, text = parse_filter(query)
+        if node is None and notebook is None:
+            return [self.by_id[note_id] for note_id in self.text_search(query) if note_id in self.by_id]
+        bitmap = self.tags.select(node, notebook)
+        if text.strip():
+            return [self.by_id[note_id] for note_id in self.text_search(text)
+                    if note_id in self.by_id and self.tags.contains(bitmap, self.by_id[note_id])]
+        notes = self.tags.notes_in(bitmap)
+        notes.sort(key=lambda note: (sort_key(self.sort_mode, note), note.id))
+        return notes
+
+    def text_search(self, query):
+        with self.updater.lock:
+            return self.index.search(query)
+
+    def label(self, note, labels=None, notebook=None):
+        # Sets the note's tags and/or notebook; neither counts as an edit
+        # of the note, so it keeps its place in "recent".
+        if labels is not None:
+            note.labels = labels
+        if notebook is not None:
+            note.notebook = intern_name(notebook)
+        self.tags.update(note)
+        self.saver.mark_dirty(note)
+
+    def rename_notebook(self, old, new):
+        for note in self.tags.notes_in(self.tags.select(None, old)):
+            self.label(note, notebook=new)
+
+    def load_title_index(self):
+        self.title_index.build(self.notes)
+
+    def switch(self, query):
+        # Quick switcher matches; the most recently used notes when the
+        # query is empty.
+        return self.title_index.search(query) if query.strip() else self.title_index.recent()
+
+    def sort(self, mode):
+        self.sort_mode = mode
+        self.order.sort(mode)
+
+    def position(self, note):
+        return self.order.index(note)
+
+    def create(self):
+        # Given the loader so its body can be read back once evicted.
+        note = Note(loader=self.bodies.load)
+        self.order.insert(note)
+        self.by_id[note.id] = note
+        self.tags.update(note)
+        self.title_index.touch(note)
+        return note
+
+    def delete(self, note):
+        self.forget(note)
+        self.deleted.add(note)
+        self.saver.mark_dirty(note)
+
+    def forget(self, note):
+        if note is self.open_note:
+            self.open_note = None
+        self.order.remove(note)
+        del self.by_id[note.id]
+        self.bodies.discard(note)
+        self.undo.discard(note.id)
+        self.title_index.remove(note)
+        self.tags.remove(note)
+        self.reindex(note.id, None)
+
+    def select(self, note):
+        self.sync_open_note()
+        self.open_note = note
+        self.title_index.touch(note)
+        return note.content, note.spans
+
+    def undo_stack(self, note):
+        return self.undo.get(note.id)
+
+    def sync_open_note(self):
+        # The source owns the text of the open note; it is copied back only
+        # when it is about to be saved or replaced.
+        if self.open_note and self.source and self.source.unsynced:
+            content = self.source.get_content()
+            self.store_body(self.open_note, content, self.source.get_spans(content))
+
+    def store_body(self, note, content, spans):
+        note.content = content
+        note.spans = spans
+        self.bodies.touch(note)
+        self.reindex(note.id, content)
+
+    def edit(self, note, content, runs=None, spans=""):
+        # Headless counterpart of typing into the editor: replaces the body
+        # and re-derives the title from it. Returns the new title and tags.
+        self.store_body(note, content, spans)
+        line = first_line(content)
+        self.retitle(note, derive_title(line), first_line_tags(runs or {}, len(line)))
+        return note.title, note.title_tags
+
+    def retitle(self, note, title, tags):
+        old = self.order.index(note)
+        note.title = title
+        note.title_tags = tags
+        note.last_modified = time.time()
+        self.order.moved(note, old)
+        self.title_index.touch(note)
+        self.saver.mark_dirty(note)
+
+    def touch(self, note):
+        # The body changed; the title did not.
+        old = self.order.index(note)
+        note.last_modified = time.time()
+        self.order.moved(note, old)
+        self.saver.mark_dirty(note)
+
+    def has_unsaved_body(self, note):
+        return note is self.open_note or note in self.saver.dirty or note in self.collecting
+
+    def collect(self, dirty):
+        # The saver has already cleared `dirty`; until the records are
+        # staged, those bodies exist nowhere but in memory.
+        self.collecting = dirty
+        try:
+            if self.open_note in dirty:
+                self.sync_open_note()
+            records = []
+            for note in dirty:
+                if note in self.deleted:
+                    records.append(delete_record(note.id))
+                else:
+                    note.rev += 1
+                    records.append(put_record(note.to_dict()))
+        finally:
+            self.collecting = ()
+        self.deleted.difference_update(dirty)
+        self.store.stage(records)
+        self.undo.enforce()
+        return records
+
+    def write(self, payloads):
+        # Several saves may have queued up behind a slow write; only the
+        # newest record per note needs to reach the log.
+        latest = {}
+        for records in payloads:
+            for record in records:
+                latest[record['id']] = record
+        written = self.store.append(list(latest.values()))
+        if self.history:
+            for record in written:
+                if record['op'] == 'put':
+                    self.history.record(record['id'], record['note']['content'])
+                else:
+                    self.history.forget(record['id'])
+
+    def poll_external(self):
+        # Notes another instance saved, merged in by id. Returns the added,
+        # removed and changed notes, plus (note, meta) conflicts for notes
+        # edited here as well; those wait for resolve(). None if nothing
+        # changed.
+        changes = self.store.refresh()
+        if not changes:
+            return None
+        added, removed, changed, conflicts = [], [], [], []
+        deleted = {note.id for note in self.deleted}
+        for note_id, meta in changes.items():
+            note = self.by_id.get(note_id)
+            if note is None:
+                # A note deleted here stays deleted.
+                if meta is not None and note_id not in deleted:
+                    note = Note(meta[0], None, meta[1], note_id, meta[2], self.bodies.load, rev=meta[3],
+                                created=meta[4], labels=meta[5], notebook=meta[6])
+                    self.order.insert(note)
+                    self.tags.update(note)
+                    self.by_id[note_id] = note
+                    self.title_index.touch(note)
+                    # The body is read on the index thread, not here.
+                    self.reindex(note_id, IndexUpdater.STORED)
+                    added.append(note)
+                self.store.settle(note_id)
+            elif self.has_local_edits(note):
+                conflicts.append((note, meta))
+            else:
+                self.take_external(note, meta)
+                (changed if meta is not None else removed).append(note)
+                self.store.settle(note_id)
+        return added, removed, changed, conflicts
+
+    def has_local_edits(self, note):
+        return (note in self.saver.dirty or note.id in self.store.rejected or
+                note is self.open_note and self.source is not None and self.source.unsynced)
+
+    def take_external(self, note, meta):
+        self.saver.dirty.discard(note)
+        self.store.unstage(note.id)
+        if note is self.open_note and self.source is not None:
+            self.source.unsynced = False
+        if meta is None:
+            self.forget(note)
+            return
+        old = self.order.index(note)
+        note.title, note.title_tags, _, note.rev, _, note.labels, note.notebook = meta
+        note.last_modified, note.created = parse_time(meta[2]), parse_time(meta[4])
+        self.order.moved(note, old)
+        self.tags.update(note)
+        self.title_index.touch(note)
+        self.bodies.invalidate(note)
+        self.undo.discard(note.id)
+        self.reindex(note.id, IndexUpdater.STORED)
+
+    def resolve(self, note, meta, keep_local):
+        # Keeping the local version saves it over the other one, with a rev
+        # past theirs.
+        if keep_local:
+            if meta is not None:
+                note.rev = max(note.rev, meta[3])
+            self.store.settle(note.id)
+            self.saver.mark_dirty(note)
+        else:
+            self.take_external(note, meta)
+            self.store.settle(note.id)
+
+    def close(self):
+        # A window closed before loading finished has nothing worth keeping
+        # beyond what is already on disk. A SaveError from the saver is
+        # raised once everything else is closed.
+        try:
+            self.saver.close()
+        finally:
+            self.updater.stop()
+            if self.search_path and self.indexed:
+                self.index.save(self.search_path, self.store.stamp())
+            self.store.close()
+            if self.history:
+                self.history.close()
+            if self.startup_path and self.loaded:
+                self.write_startup()
@@ -0,0 +1,481 @@
+import heapq
+import math
+from array import array
+import marshal
+import os
+import queue
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import islice
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+INDEX_VERSION = 1
+MAX_EXPANSION = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Clauses matching no more notes than this are scored note by note.
+DIRECT_LIMIT = 2000
+# Notes looked at per query when walking impact lists. Past it the best
+# found so far win; only queries whose scores are nearly flat (phrases of
+# common words, several words in almost every note) get that far.
+MAX_CANDIDATES = 1000
+IMPACT_CACHE = 256
+# Notes re-indexed since an impact list was sorted before it is sorted again.
+IMPACT_CHANGES = 256
+# How far the average note length may move before the cached impact lists,
+# which were sorted with the old one, are thrown away.
+AVERAGE_DRIFT = 0.05
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def token_positions(text):
+    tokens = tokenize(text)
+    positions = {}
+    for position, token in enumerate(tokens):
+        positions.setdefault(token, []).append(position)
+    return positions, len(tokens)
+
+
+def build_shard(docs):
+    # Indexes [(doc number, note id, text)] on its own, so bulk import can
+    # index in worker processes. Postings come back encoded; term numbers
+    # are local to the shard until SearchIndex.merge maps them.
+    vocabulary, numbers, postings = [], {}, []
+    note_terms, lengths = {}, {}
+    for doc_number, note_id, text in docs:
+        positions, length = token_positions(text)
+        terms = array('I')
+        for token, where in positions.items():
+            number = numbers.get(token)
+            if number is None:
+                number = numbers[token] = len(vocabulary)
+                vocabulary.append(token)
+                postings.append(array('I'))
+            posting = postings[number]
+            posting.append(doc_number)
+            posting.append(len(where))
+            posting.extend(where)
+            terms.append(number)
+        note_terms[note_id] = terms.tobytes()
+        lengths[note_id] = length
+    return vocabulary, [posting.tobytes() for posting in postings], note_terms, lengths
+
+
+def encode_posting(posting, doc_numbers):
+    values = array('I')
+    for note_id, positions in posting.items():
+        values.append(doc_numbers[note_id])
+        values.append(len(positions))
+        values.extend(positions)
+    return values.tobytes()
+
+
+def decode_posting(data, doc_ids):
+    values = array('I')
+    values.frombytes(data)
+    posting = {}
+    i = 0
+    while i < len(values):
+        count = values[i + 1]
+        posting[doc_ids[values[i]]] = values[i + 2:i + 2 + count].tolist()
+        i += 2 + count
+    return posting
+
+
+def impact_stream(ranked, changed, idf):
+    # (score, note id) best first from an impact list, without the notes
+    # changed since it was sorted.
+    for weight, note_id in ranked:
+        if note_id not in changed:
+            yield idf * weight, note_id
+
+
+class SearchIndex:
+    # Inverted index: token -> {note id: [positions]}. Positions are token
+    # numbers within the note and back phrase queries. `terms` is the sorted
+    # vocabulary used for prefix queries; it is kept sorted as tokens come
+    # and go instead of being rebuilt. `note_terms` remembers which tokens
+    # each note contributed so re-indexing one note touches only those.
+    #
+    # On disk, postings and note_terms are packed arrays of stable doc and
+    # term numbers. They are loaded as bytes and decoded the first time a
+    # query or an update touches them, so loading costs one object per term
+    # and per note rather than one per posting.
+    #
+    # Common terms also get an impact list, their notes sorted by what the
+    # term adds to their score, so a query can stop once no note further
+    # down could make the top results. Notes re-indexed since a list was
+    # sorted are kept beside it (`impacts[token][1]`) and scored apart.
+    def __init__(self):
+        self.postings = {}
+        self.terms = []
+        self.note_terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.doc_ids = []
+        self.doc_numbers = {}
+        self.term_ids = []
+        self.term_numbers = {}
+        self.impacts = OrderedDict()
+        self.average = 0.0
+
+    def __contains__(self, note_id):
+        return note_id in self.lengths
+
+    def posting(self, token):
+        posting = self.postings.get(token)
+        if posting.__class__ is bytes:
+            posting = self.postings[token] = decode_posting(posting, self.doc_ids)
+        return posting
+
+    def tokens_of(self, note_id):
+        terms = self.note_terms[note_id]
+        if terms.__class__ is bytes:
+            numbers = array('I')
+            numbers.frombytes(terms)
+            terms = self.note_terms[note_id] = [self.term_ids[n] for n in numbers]
+        return terms
+
+    def add(self, note_id, text):
+        self.add_tokens(note_id, *token_positions(text))
+
+    def add_tokens(self, note_id, positions, length):
+        # add() with the text already run through token_positions().
+        self.remove(note_id)
+        if note_id not in self.doc_numbers:
+            self.doc_numbers[note_id] = len(self.doc_ids)
+            self.doc_ids.append(note_id)
+        for token, where in positions.items():
+            posting = self.posting(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                insort(self.terms, token)
+                if token not in self.term_numbers:
+                    self.term_numbers[token] = len(self.term_ids)
+                    self.term_ids.append(token)
+            posting[note_id] = where
+            if token in self.impacts:
+                self.touch(token, note_id)
+        self.note_terms[note_id] = list(positions)
+        self.lengths[note_id] = length
+        self.total_length += length
+
+    def remove(self, note_id):
+        if note_id not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(note_id)
+        for token in self.tokens_of(note_id):
+            posting = self.posting(token)
+            del posting[note_id]
+            if token in self.impacts:
+                self.touch(token, note_id)
+            if not posting:
+                del self.postings[token]
+                del self.terms[bisect_left(self.terms, token)]
+                self.impacts.pop(token, None)
+        del self.note_terms[note_id]
+
+    def expand(self, prefix):
+        # A one or two letter prefix can match a large part of the
+        # vocabulary, so only the first MAX_EXPANSION completions are used.
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + '\U0010ffff', start, min(start + MAX_EXPANSION, len(self.terms)))
+        return self.terms[start:end]
+
+    def parse(self, query):
+        clauses = []
+        for phrase, word in QUERY_RE.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if len(tokens) > 1:
+                    clauses.append(('phrase', tokens))
+                elif tokens:
+                    clauses.append(('term', tokens))
+            elif word.endswith('*'):
+                tokens = tokenize(word[:-1])
+                clauses += [('term', [t]) for t in tokens[:-1]]
+                if tokens:
+                    clauses.append(('prefix', self.expand(tokens[-1])))
+            else:
+                clauses += [('term', [t]) for t in tokenize(word)]
+        return clauses
+
+    def search(self, query, limit=200):
+        # Space separated terms are ANDed. `term*` matches any token with
+        # that prefix and "quoted words" must appear next to each other.
+        # Results are note ids, best BM25 score first; a `term*` clause
+        # counts the best of the words it matched. If the rarest clause
+        # matches few notes, those are the candidates. Otherwise the impact
+        # lists of the terms are walked side by side, best first, until no
+        # note not yet seen could beat the last of the top `limit` (Fagin's
+        # threshold algorithm), or MAX_CANDIDATES notes have been seen.
+        clauses = []
+        for kind, terms in self.parse(query):
+            postings = [self.posting(term) for term in terms]
+            if not postings or not all(postings):
+                return []
+            size = sum(map(len, postings)) if kind == 'prefix' else min(map(len, postings))
+            clauses.append((size, kind, terms, postings))
+        if not clauses:
+            return []
+        self.check_average()
+        count = len(self.lengths)
+        clauses.sort(key=lambda clause: clause[0])
+        idfs = [[math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5)) for posting in postings]
+                for _, _, _, postings in clauses]
+
+        def contains(note_id):
+            for _, kind, _, postings in clauses:
+                if kind == 'prefix':
+                    if not any(note_id in posting for posting in postings):
+                        return False
+                elif not all(note_id in posting for posting in postings):
+                    return False
+            return True
+
+        # Phrases are checked last, and only for notes good enough to make
+        # the results, as that is where the time goes.
+        phrases = [terms for _, kind, terms, _ in clauses if kind == 'phrase']
+
+        def fits(note_id):
+            return all(self.has_phrase(note_id, terms) for terms in phrases)
+
+        def score(note_id):
+            total = 0.0
+            for (_, kind, _, postings), clause_idfs in zip(clauses, idfs):
+                parts = [idf * self.weight(posting, note_id)
+                         for idf, posting in zip(clause_idfs, postings) if note_id in posting]
+                total += max(parts) if kind == 'prefix' else sum(parts)
+            return total
+
+        size, kind, _, postings = clauses[0]
+        if size <= DIRECT_LIMIT:
+            candidates = set().union(*postings) if kind == 'prefix' else min(postings, key=len)
+            ranked = sorted(((score(note_id), note_id) for note_id in candidates if contains(note_id)), reverse=True)
+            if phrases:
+                ranked = islice((entry for entry in ranked if fits(entry[1])), limit)
+            return [note_id for _, note_id in ranked][:limit]
+
+        top = []
+        seen = set()
+
+        def consider(note_id):
+            if note_id in seen:
+                return
+            seen.add(note_id)
+            if not contains(note_id):
+                return
+            entry = (score(note_id), note_id)
+            if len(top) < limit:
+                if fits(note_id):
+                    heapq.heappush(top, entry)
+            elif entry > top[0] and fits(note_id):
+                heapq.heapreplace(top, entry)
+
+        # The words of a `term*` clause are merged into one stream, whose
+        # next score is the most any note not read yet can get from it.
+        streams = []
+        for (_, kind, terms, postings), clause_idfs in zip(clauses, idfs):
+            merged = []
+            for term, posting, idf in zip(terms, postings, clause_idfs):
+                ranked, changed = self.impact(term)
+                for note_id in changed:
+                    if note_id in posting:
+                        consider(note_id)
+                merged.append(impact_stream(ranked, changed, idf))
+            streams += [heapq.merge(*merged, reverse=True)] if kind == 'prefix' else merged
+        bounds = [0.0] * len(streams)
+        budget = len(seen) + MAX_CANDIDATES
+        while len(seen) < budget:
+            moved = False
+            for i, stream in enumerate(streams):
+                entry = next(stream, None)
+                if entry is None:
+                    bounds[i] = 0.0
+                else:
+                    bounds[i], note_id = entry
+                    consider(note_id)
+                    moved = True
+            if not moved or len(top) == limit and top[0][0] > sum(bounds):
+                break
+        return [note_id for _, note_id in sorted(top, reverse=True)]
+
+    def check_average(self):
+        count = len(self.lengths)
+        average = self.total_length / count if count else 1
+        if abs(average - self.average) > AVERAGE_DRIFT * self.average:
+            self.average = average or 1
+            self.impacts.clear()
+
+    def weight(self, posting, note_id):
+        # The BM25 term frequency part of the score, without the idf.
+        tf = len(posting[note_id])
+        norm = 1 - BM25_B + BM25_B * self.lengths[note_id] / self.average
+        return tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+    def impact(self, token):
+        # ([(weight, note id)] best first, ids of notes changed since).
+        cached = self.impacts.get(token)
+        if cached is None:
+            posting = self.posting(token)
+            cached = self.impacts[token] = (
+                sorted(((self.weight(posting, note_id), note_id) for note_id in posting), reverse=True), set())
+            if len(self.impacts) > IMPACT_CACHE:
+                self.impacts.popitem(last=False)
+        else:
+            self.impacts.move_to_end(token)
+        return cached
+
+    def touch(self, token, note_id):
+        ranked, changed = self.impacts[token]
+        changed.add(note_id)
+        if len(changed) > IMPACT_CHANGES:
+            del self.impacts[token]
+
+    def has_phrase(self, note_id, tokens):
+        # Walks the positions of the rarest word and looks the others up by
+        # binary search, stopping at the first place the phrase fits.
+        lists = [self.posting(token)[note_id] for token in tokens]
+        pivot = min(range(len(lists)), key=lambda i: len(lists[i]))
+        others = [(offset - pivot, positions) for offset, positions in enumerate(lists) if offset != pivot]
+        for position in lists[pivot]:
+            for offset, positions in others:
+                i = bisect_left(positions, position + offset)
+                if i == len(positions) or positions[i] != position + offset:
+                    break
+            else:
+                return True
+        return False
+
+    def merge(self, doc_ids, shards):
+        # Builds the index from build_shard() results whose doc numbers
+        # index `doc_ids`. Everything stays encoded, as after load(), so the
+        # work is per term and per note rather than per posting.
+        self.__init__()
+        self.doc_ids = doc_ids
+        self.doc_numbers = {note_id: i for i, note_id in enumerate(doc_ids)}
+        parts = {}
+        for vocabulary, postings, note_terms, lengths in shards:
+            mapping = array('I')
+            for token in vocabulary:
+                number = self.term_numbers.get(token)
+                if number is None:
+                    number = self.term_numbers[token] = len(self.term_ids)
+                    self.term_ids.append(token)
+                mapping.append(number)
+            for number, data in zip(mapping, postings):
+                parts.setdefault(number, []).append(data)
+            for note_id, data in note_terms.items():
+                local = array('I')
+                local.frombytes(data)
+                self.note_terms[note_id] = array('I', map(mapping.__getitem__, local)).tobytes()
+            self.lengths.update(lengths)
+        self.postings = {self.term_ids[number]: b''.join(data) for number, data in parts.items()}
+        self.total_length = sum(self.lengths.values())
+        self.terms = sorted(self.postings)
+
+    def save(self, path, stamp):
+        # Postings and notes that were never decoded are written back as
+        # they were read; numbering is stable, so their bytes stay valid.
+        postings = {token: posting if posting.__class__ is bytes else encode_posting(posting, self.doc_numbers)
+                    for token, posting in self.postings.items()}
+        note_terms = {note_id: terms if terms.__class__ is bytes
+                      else array('I', [self.term_numbers[t] for t in terms]).tobytes()
+                      for note_id, terms in self.note_terms.items()}
+        data = (INDEX_VERSION, stamp, self.doc_ids, self.term_ids, postings, note_terms, self.lengths)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(marshal.dumps(data))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        # Returns the stamp the index was saved with, or None if there is no
+        # usable index on disk.
+        try:
+            with open(path, 'rb') as f:
+                data = marshal.loads(f.read())
+            version, stamp, doc_ids, term_ids, postings, note_terms, lengths = data
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != INDEX_VERSION:
+            return None
+        self.doc_ids = doc_ids
+        self.doc_numbers = {note_id: i for i, note_id in enumerate(doc_ids)}
+        self.term_ids = term_ids
+        self.term_numbers = {token: i for i, token in enumerate(term_ids)}
+        self.postings = postings
+        self.note_terms = note_terms
+        self.lengths = lengths
+        self.total_length = sum(lengths.values())
+        self.terms = sorted(postings)
+        return stamp
+
+
+class IndexUpdater:
+    # Applies note changes to a SearchIndex on a background thread, so
+    # saving a large note does not tokenize it on the Tk thread. Only the
+    # merge into the index happens under `lock`, which searches hold too;
+    # tokenizing happens outside it. A change is (note id, text), with
+    # None for a deleted note and STORED for a body to read back with
+    # `read(note id)`. Changes to one note queued before the thread got to
+    # them are applied once, the newest.
+    STORED = object()
+
+    def __init__(self, index, read=None):
+        self.index = index
+        self.read = read
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="search-index", daemon=True)
+        self.thread.start()
+
+    def submit(self, note_id, content):
+        self.requests.put((note_id, content))
+
+    def run(self):
+        while True:
+            batch = {}
+            requests = [self.requests.get()]
+            while True:
+                try:
+                    requests.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            for request in requests:
+                if request is not None:
+                    batch[request[0]] = request[1]
+            for note_id, content in batch.items():
+                self.apply(note_id, content)
+            for _ in requests:
+                self.requests.task_done()
+            if None in requests:
+                return
+
+    def apply(self, note_id, content):
+        if content is self.STORED:
+            try:
+                note_data = self.read(note_id)
+            except OSError:
+                # Left as it was; the note's next change puts it right.
+                return
+            content = note_data['content'] if note_data else None
+        tokens = token_positions(content) if content is not None else None
+        with self.lock:
+            if tokens is None:
+                self.index.remove(note_id)
+            else:
+                self.index.add_tokens(note_id, *tokens)
+
+    def join(self):
+        # Waits until every change submitted so far is in the index.
+        self.requests.join()
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
@@ -0,0 +1,179 @@
+import os
+import queue
+import re
+import threading
+from storage.word_list import WordList, normalize
+
+WORD = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+# Inline code, links and addresses are not prose.
+SKIP = re.compile(r"`[^`\n]*`|\S+://\S*|www\.\S+|\S+@\S+\.\S+")
+CACHE_SIZE = 50000
+SUGGESTIONS = 6
+NEAR_SCAN = 4000
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def edit_distance(a, b):
+    # Damerau-Levenshtein (optimal string alignment).
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def edits(word):
+    # Every string one deletion, transposition, replacement or insertion
+    # away from `word`.
+    letters = set(LETTERS + word) - {"'"}
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    found = set()
+    for head, tail in splits:
+        if tail:
+            found.add(head + tail[1:])
+            for letter in letters:
+                found.add(head + letter + tail[1:])
+        if len(tail) > 1:
+            found.add(head + tail[1] + tail[0] + tail[2:])
+        for letter in letters:
+            found.add(head + letter + tail)
+    found.discard(word)
+    return found
+
+
+def match_case(word, like):
+    if like.isupper():
+        return word.upper()
+    if like[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+class Speller:
+    # Checks words against a compiled WordList plus the user's own words.
+    # Words of one letter, all capitals (acronyms) or with capitals inside
+    # (identifiers) are taken as they are. Answers are cached, since prose
+    # repeats the same words; the worker thread and the UI share the cache
+    # and the personal words, and only ever add to them.
+    def __init__(self, source, path, personal_path=None):
+        self.source = source
+        self.path = path
+        self.personal_path = personal_path
+        self.words = None
+        self.extra = set()
+        self.cache = {}
+
+    def load(self):
+        # Compiles the list on first use or after it changed; slow then, so
+        # it is called from the worker thread. False if there is no list.
+        try:
+            self.words = WordList.open(self.source, self.path)
+        except (OSError, ValueError):
+            return False
+        if self.personal_path and os.path.exists(self.personal_path):
+            with open(self.personal_path, encoding='utf-8') as f:
+                self.extra.update(normalize(line.strip()) for line in f if line.strip())
+        self.cache = {}
+        return True
+
+    def known(self, word):
+        if len(word) < 2 or not word[1:].islower():
+            return True
+        key = normalize(word)
+        found = self.cache.get(key)
+        if found is None:
+            found = self.lookup(key)
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache = {}
+            self.cache[key] = found
+        return found
+
+    def lookup(self, key):
+        if key in self.extra or key.encode('utf-8') in self.words:
+            return True
+        # Lists often leave out possessives.
+        return key.endswith("'s") and self.lookup(key[:-2])
+
+    def misspelled(self, text):
+        # [(start, end)] columns of the words in `text` not in the list.
+        if self.words is None:
+            return []
+        skipped = [found.span() for found in SKIP.finditer(text)]
+        spans = []
+        for found in WORD.finditer(text):
+            start, end = found.span()
+            if skipped and any(low <= start < high for low, high in skipped):
+                continue
+            if not self.known(found.group()):
+                spans.append((start, end))
+        return spans
+
+    def suggest(self, word, limit=SUGGESTIONS):
+        # Known words one edit away, those of the same length first, then,
+        # if that is not enough, the closest of the listed words sharing
+        # the first two letters; cased like `word`.
+        if self.words is None:
+            return []
+        key = normalize(word)
+        found = sorted((candidate for candidate in edits(key) if self.lookup(candidate)),
+                       key=lambda candidate: (abs(len(candidate) - len(key)), candidate))
+        if len(found) < limit and len(key) > 2:
+            near = []
+            for candidate in self.words.prefixed(key[:2].encode('utf-8'), NEAR_SCAN):
+                candidate = candidate.decode('utf-8')
+                if abs(len(candidate) - len(key)) <= 2 and candidate not in found:
+                    distance = edit_distance(key, candidate)
+                    if distance <= 2:
+                        near.append((distance, candidate))
+            found += [candidate for _, candidate in sorted(near)]
+        return [match_case(candidate, word) for candidate in found[:limit]]
+
+    def add(self, word, remember=True):
+        # Accepts `word` from now on; remembered ones go in the personal
+        # list too.
+        key = normalize(word)
+        self.extra.add(key)
+        self.cache[key] = True
+        if remember and self.personal_path:
+            with open(self.personal_path, 'a', encoding='utf-8') as f:
+                f.write(key + '\n')
+
+
+class SpellWorker:
+    # Checks lines on a background thread, loading the Speller first. A
+    # request is (line number, text); each result is (line number, text,
+    # misspelled spans), so the caller can tell whether the line has
+    # changed since. A line asked for again before it was reached is only
+    # checked once.
+    def __init__(self, speller):
+        self.speller = speller
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="spelling", daemon=True)
+        self.thread.start()
+
+    def submit(self, line, text):
+        self.requests.put((line, text))
+
+    def run(self):
+        self.speller.load()
+        while True:
+            batch = {}
+            request = self.requests.get()
+            while True:
+                if request is None:
+                    return
+                batch[request[0]] = request[1]
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+            for line, text in batch.items():
+                self.results.put((line, text, self.speller.misspelled(text)))
+
+    def stop(self):
+        self.requests.put(None)
@@ -0,0 +1,157 @@
+import re
+
+LIMIT = 50
+FUZZY_POOL = 4 * LIMIT
+SCAN_BUDGET = 2500
+# Bit lists for every byte value, highest bit first.
+BYTE_BITS = [[bit for bit in range(7, -1, -1) if byte >> bit & 1] for byte in range(256)]
+
+
+def bits_descending(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for i in range(len(data) - 1, -1, -1):
+        byte = data[i]
+        if byte:
+            base = i * 8
+            for bit in BYTE_BITS[byte]:
+                yield base + bit
+
+
+def fuzzy_pattern(chars):
+    return re.compile('.*?'.join(re.escape(c) for c in chars), re.S)
+
+
+class TitleIndex:
+    # Fuzzy title lookup for the quick switcher. Every title gets a slot,
+    # and every character a bitmap (a Python int) of the slots whose title
+    # contains it, plus one of the slots whose title starts with it. ANDing
+    # the bitmaps of the query's characters leaves only titles that can
+    # match, in a handful of big-int operations.
+    #
+    # Slots are handed out in recency order: touching a note moves it to a
+    # new, higher slot, so walking candidates from the highest bit down
+    # visits the most recently used notes first and the walk can stop as
+    # soon as enough matches are found. Matches rank by kind (title prefix,
+    # word prefix, substring, then scattered characters), by recency within
+    # a kind, and scattered ones by how tightly the characters cluster.
+    def __init__(self):
+        self.ready = False
+        self.notes = []
+        self.titles = []
+        self.slots = {}
+        self.chars = {}
+        self.starts = {}
+
+    def build(self, notes):
+        # Oldest first, so the most recently modified notes get the highest
+        # slots.
+        self.fill(sorted(notes, key=lambda note: note.last_modified))
+
+    def fill(self, notes):
+        # A bitmap is built from a string of '0'/'1' per slot, highest slot
+        # first, which int() converts in linear time.
+        self.notes = notes
+        self.titles = [note.title.lower() for note in self.notes]
+        self.slots = {note.id: slot for slot, note in enumerate(self.notes)}
+        newest_first = self.titles[::-1]
+        self.chars = {char: int(''.join(['1' if char in title else '0' for title in newest_first]), 2)
+                      for char in set().union(*newest_first)}
+        # One character per slot, so each bitmap is a single translate().
+        heads = ''.join(title[:1] or '\0' for title in newest_first)
+        zeros = dict.fromkeys(map(ord, set(heads)), '0')
+        self.starts = {char: int(heads.translate({**zeros, ord(char): '1'}), 2) for char in set(heads) - {'\0'}}
+        self.ready = True
+
+    def touch(self, note):
+        # Gives the note the newest slot, with its current title.
+        if not self.ready:
+            return
+        self.remove(note)
+        if len(self.notes) > 2 * len(self.slots) + 1024:
+            # Renumber once the vacated slots outnumber the live ones.
+            self.fill([n for n in self.notes if n is not None])
+        slot = len(self.notes)
+        title = note.title.lower()
+        self.notes.append(note)
+        self.titles.append(title)
+        self.slots[note.id] = slot
+        bit = 1 << slot
+        for char in set(title):
+            self.chars[char] = self.chars.get(char, 0) | bit
+        if title:
+            self.starts[title[0]] = self.starts.get(title[0], 0) | bit
+
+    def remove(self, note):
+        slot = self.slots.pop(note.id, None) if self.ready else None
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        title = self.titles[slot]
+        for char in set(title):
+            self.chars[char] &= mask
+        if title:
+            self.starts[title[0]] &= mask
+        self.notes[slot] = None
+        self.titles[slot] = None
+
+    def recent(self, limit=LIMIT):
+        found = []
+        for note in reversed(self.notes):
+            if len(found) == limit:
+                break
+            if note is not None:
+                found.append(note)
+        return found
+
+    def search(self, query, limit=LIMIT):
+        query = query.lower().strip()
+        chars = query.replace(' ', '')
+        if not chars or not self.ready:
+            return []
+        candidates = -1
+        for char in set(chars):
+            candidates &= self.chars.get(char, 0)
+            if not candidates:
+                return []
+
+        # Title prefixes come from a narrower bitmap, so they get their own
+        # walk; one more walk sorts everything else by kind.
+        prefixed = []
+        for slot in self.walk(candidates & self.starts.get(query[0], 0)):
+            if self.titles[slot].startswith(query):
+                prefixed.append(slot)
+                if len(prefixed) >= limit:
+                    return [self.notes[slot] for slot in prefixed]
+
+        taken = set(prefixed)
+        word = re.compile(r'(?<!\w)' + re.escape(query))
+        pattern = fuzzy_pattern(chars)
+        words, inner, scattered = [], [], []
+        room = limit - len(prefixed)
+        for slot in self.walk(candidates):
+            if slot in taken:
+                continue
+            title = self.titles[slot]
+            if word.search(title):
+                words.append(slot)
+                if len(words) >= room:
+                    break
+            elif query in title:
+                inner.append(slot)
+            elif len(scattered) < FUZZY_POOL:
+                # Ranked by how close together the characters fall.
+                match = pattern.search(title)
+                if match:
+                    scattered.append((len(chars) / (match.end() - match.start()), slot))
+        scattered.sort(key=lambda item: -item[0])
+        ranked = prefixed + words + inner + [slot for _, slot in scattered]
+        return [self.notes[slot] for slot in ranked[:limit]]
+
+    def walk(self, bitmap):
+        # Candidate slots, newest first. Gives up after SCAN_BUDGET so a
+        # query whose characters are common but rarely together cannot
+        # stall a keystroke; older matches then wait for a longer query.
+        for checked, slot in enumerate(bits_descending(bitmap)):
+            if checked == SCAN_BUDGET:
+                return
+            yield slot
@@ -0,0 +1,237 @@
+import re
+
+TOKEN = re.compile(r'[()]|[^\s()]+')
+OPERATORS = ('AND', 'OR', 'NOT', '(', ')')
+UNLABELLED = ((), "")
+
+
+def split_labels(text):
+    # "work, to read,urgent" -> ('work', 'to read', 'urgent'), first
+    # spelling of each tag kept.
+    seen = {}
+    for label in text.split(','):
+        label = ' '.join(label.split())
+        if label:
+            seen.setdefault(label.casefold(), label)
+    return tuple(seen.values())
+
+
+def is_atom(token):
+    return token.lstrip('-')[:1] in ('#', '@') and len(token.lstrip('-')) > 1
+
+
+def parse_filter(query):
+    # Splits a search query into a filter over tags and notebooks and the
+    # text left for full-text search. `#tag` and `@notebook` combine with
+    # AND (or just a space), OR, NOT (or a leading '-') and parentheses;
+    # the operators only count as such in a query that has a `#` or `@`.
+    # Returns (node, text); node is None without a filter. A malformed
+    # filter is read as far as it makes sense rather than rejected.
+    tokens = TOKEN.findall(query)
+    if not any(is_atom(token) for token in tokens):
+        return None, query
+    filtered = [token for token in tokens if is_atom(token) or token in OPERATORS]
+    text = ' '.join(token for token in tokens if not (is_atom(token) or token in OPERATORS))
+    parser = FilterParser(filtered)
+    return parser.parse(), text
+
+
+def both(kind, left, right):
+    if left is None or right is None:
+        return left if right is None else right
+    return (kind, left, right)
+
+
+class FilterParser:
+    # Recursive descent over: either := both (OR both)*;
+    # both := single (AND? single)*; single := NOT single | ( either ) | atom.
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        node = None
+        while self.peek() is not None:
+            if self.peek() == ')':
+                self.pos += 1
+                continue
+            node = both('and', node, self.either())
+        return node
+
+    def either(self):
+        node = self.both()
+        while self.peek() == 'OR':
+            self.pos += 1
+            node = both('or', node, self.both())
+        return node
+
+    def both(self):
+        node = self.single()
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.pos += 1
+                continue
+            node = both('and', node, self.single())
+        return node
+
+    def single(self):
+        token = self.peek()
+        if token is None or token in ('OR', ')'):
+            return None
+        self.pos += 1
+        if token == 'NOT':
+            node = self.single()
+            return None if node is None else ('not', node)
+        if token == '(':
+            node = self.either()
+            if self.peek() == ')':
+                self.pos += 1
+            return node
+        if token == 'AND':
+            return self.single()
+        negated = token.startswith('-')
+        token = token.lstrip('-')
+        node = ('tag' if token[0] == '#' else 'book', token[1:].casefold())
+        return ('not', node) if negated else node
+
+
+class TagIndex:
+    # Tag and notebook membership as one bitmap (a Python int) per tag and
+    # per notebook, over slots handed out to notes; a filter is a few
+    # integer ANDs, ORs and NOTs however many notes there are. A note's
+    # tags are remembered per slot, so when they change only the bitmaps
+    # of the tags it gained or lost are touched. Slots of removed notes are
+    # reused. Names are matched case-insensitively; the first spelling
+    # seen is the one shown.
+    def __init__(self):
+        self.slots = {}
+        self.notes = []
+        self.held = []
+        self.free = []
+        self.live = 0
+        self.tags = {}
+        self.books = {}
+        self.names = {}
+
+    def build(self, notes):
+        # Bitmaps are assembled as bytes, then converted once each.
+        self.__init__()
+        tag_bits, book_bits = {}, {}
+        size = len(notes) // 8 + 1
+        self.slots = {note.id: slot for slot, note in enumerate(notes)}
+        self.notes = list(notes)
+        self.held = [UNLABELLED] * len(notes)
+        for slot, note in enumerate(notes):
+            if not (note.labels or note.notebook):
+                continue
+            held = self.held[slot] = self.keys(note)
+            byte, bit = slot >> 3, 1 << (slot & 7)
+            for key in held[0]:
+                tag_bits.setdefault(key, bytearray(size))[byte] |= bit
+            if held[1]:
+                book_bits.setdefault(held[1], bytearray(size))[byte] |= bit
+        self.live = (1 << len(notes)) - 1
+        self.tags = {key: int.from_bytes(bits, 'little') for key, bits in tag_bits.items()}
+        self.books = {key: int.from_bytes(bits, 'little') for key, bits in book_bits.items()}
+
+    def keys(self, note):
+        tags = {}
+        for label in note.labels:
+            key = label.casefold()
+            self.names.setdefault(('tag', key), label)
+            tags[key] = None
+        book = note.notebook.casefold()
+        if book:
+            self.names.setdefault(('book', book), note.notebook)
+        return tuple(tags), book
+
+    def update(self, note):
+        # Adds the note, or applies the change in its tags and notebook.
+        slot = self.slots.get(note.id)
+        if slot is None:
+            slot = self.free.pop() if self.free else len(self.notes)
+            if slot == len(self.notes):
+                self.notes.append(None)
+                self.held.append(UNLABELLED)
+            self.slots[note.id] = slot
+            self.notes[slot] = note
+            self.live |= 1 << slot
+        old_tags, old_book = self.held[slot]
+        new_tags, new_book = self.held[slot] = self.keys(note)
+        for key in set(old_tags) - set(new_tags):
+            self.clear(self.tags, 'tag', key, slot)
+        for key in set(new_tags) - set(old_tags):
+            self.tags[key] = self.tags.get(key, 0) | 1 << slot
+        if old_book != new_book:
+            if old_book:
+                self.clear(self.books, 'book', old_book, slot)
+            if new_book:
+                self.books[new_book] = self.books.get(new_book, 0) | 1 << slot
+
+    def clear(self, bitmaps, kind, key, slot):
+        bitmap = bitmaps[key] & ~(1 << slot)
+        if bitmap:
+            bitmaps[key] = bitmap
+        else:
+            del bitmaps[key]
+            self.names.pop((kind, key), None)
+
+    def remove(self, note):
+        slot = self.slots.pop(note.id, None)
+        if slot is None:
+            return
+        tags, book = self.held[slot]
+        for key in tags:
+            self.clear(self.tags, 'tag', key, slot)
+        if book:
+            self.clear(self.books, 'book', book, slot)
+        self.held[slot] = UNLABELLED
+        self.notes[slot] = None
+        self.live &= ~(1 << slot)
+        self.free.append(slot)
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind == 'tag':
+            return self.tags.get(node[1], 0)
+        if kind == 'book':
+            return self.books.get(node[1], 0)
+        if kind == 'not':
+            return self.live & ~self.evaluate(node[1])
+        if kind == 'and':
+            return self.evaluate(node[1]) & self.evaluate(node[2])
+        return self.evaluate(node[1]) | self.evaluate(node[2])
+
+    def select(self, node, book=None):
+        # Bitmap of the notes matching `node` (all notes if None), limited
+        # to notebook `book` if given.
+        bitmap = self.live if node is None else self.evaluate(node)
+        if book is not None:
+            bitmap &= self.books.get(book.casefold(), 0)
+        return bitmap
+
+    def notes_in(self, bitmap):
+        # Walks the set bits a byte at a time, skipping empty ones.
+        notes = self.notes
+        found = []
+        for byte, value in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')):
+            while value:
+                low = value & -value
+                found.append(notes[(byte << 3) + low.bit_length() - 1])
+                value ^= low
+        return found
+
+    def contains(self, bitmap, note):
+        slot = self.slots.get(note.id)
+        return slot is not None and bitmap >> slot & 1 == 1
+
+    def notebooks(self):
+        # [(name, note count)] by name.
+        return sorted(((self.names[('book', key)], bin(bitmap).count('1'))
+                       for key, bitmap in self.books.items()), key=lambda item: item[0].casefold())
+
+    def tag_names(self):
+        return sorted((self.names[('tag', key)] for key in self.tags), key=str.casefold)
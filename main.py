@@ -1,69 +1,317 @@
+import time
+STARTED = time.perf_counter()
+
+import json
+import os
+import sys
 import tkinter as tk
 from components.note_list import NoteList
 from components.editor import Editor
-from models.note import Note
-import json
-import os
+from components.code_highlighter import CodeHighlighter
+from components.find_panel import FindPanel
+from components.inline_images import InlineImages
+from core.notebook import Notebook
+from storage.autosave import AutosaveScheduler, SaveError
+from storage.journal import JournalStore
+from storage.history import HistoryStore
+from storage.blobs import BlobStore
+from core.spelling import Speller
+from components.spell_checker import SpellChecker
+
+IMPORTED = time.perf_counter()
+STORE_PATH = 'notes'
+SEARCH_INDEX_PATH = 'notes.search'
+STARTUP_PATH = 'notes.startup'
+HISTORY_PATH = 'notes.history'
+BLOBS_PATH = 'notes.blobs'
+DICTIONARY_PATH = 'notes.dictionary'
+PERSONAL_WORDS_PATH = 'notes.words'
+WORDS_ENV = 'NOTEPAD_WORDS'
+WORD_LISTS = (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.txt'), '/usr/share/dict/words')
+TRACE_PATH = 'notes.trace.json'
+PROFILE_ENV = 'NOTEPAD_PROFILE'
+EXTERNAL_POLL_MS = 1000
 
 class BetterNotepad:
-    def __init__(self, root):
+    def __init__(self, root, recorder=None, startup_report=None, quit_after_startup=False, word_list=None):
         self.root = root
+        self.recorder = recorder
+        self.startup_report = startup_report
+        self.quit_after_startup = quit_after_startup
+        self.timings = {'imports': IMPORTED - STARTED}
         self.root.title("Better Notepad")
         self.root.configure(bg='#1b2838')
         
+        self.notebook = Notebook(JournalStore(STORE_PATH), SEARCH_INDEX_PATH, STARTUP_PATH,
+                                 HistoryStore(HISTORY_PATH))
+        self.notebook.saver = AutosaveScheduler(self.root, self.notebook.collect, self.notebook.write)
+        
         main_container = tk.Frame(root, bg='#1b2838')
         main_container.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
         
-        self.note_list = NoteList(main_container, self.on_note_selected, self.on_note_deleted)
+        self.note_list = NoteList(main_container, self.notebook, self.on_note_selected)
         self.note_list.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 2))
         
-        self.editor = Editor(main_container, self.on_text_changed)
+        speller = Speller(word_list, DICTIONARY_PATH, PERSONAL_WORDS_PATH) if word_list else None
+        self.editor = Editor(main_container, self.on_text_changed, BlobStore(BLOBS_PATH), speller)
         self.editor.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        self.load_notes()
-        if not self.note_list.notes:
+        self.notebook.source = self.editor
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind_all('<Control-H>', self.show_versions)
+        # The text widget's own Ctrl+P moves the cursor up a line.
+        self.root.bind_all('<Control-p>', self.show_switcher)
+        self.editor.text_editor.bind('<Control-p>', self.show_switcher)
+
+        if recorder:
+            from core.instrument import StallWatchdog
+            from components.debug_overlay import DebugOverlay
+            self.notebook.saver.on_persisted = lambda lag: recorder.sample('keystroke_to_disk', lag)
+            self.watchdog = StallWatchdog(self.root, recorder)
+            self.overlay = DebugOverlay(self.root, recorder, self.notebook.saver, self.notebook.bodies)
+
+        # Only what the startup snapshot holds is shown before the first
+        # paint; the store, the full list and the search index follow.
+        self.startup = self.notebook.read_startup()
+        if self.startup:
+            self.note_list.show_page(self.startup['page'])
+            if self.startup['content'] is not None:
+                self.editor.set_content(self.startup['content'], self.startup['spans'])
+        if not self.startup or self.startup['content'] is None:
+            self.editor.text_editor.configure(state='disabled')
+        self.root.after_idle(self.finish_startup)
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.timings[name] = now - STARTED
+        if self.recorder:
+            self.recorder.record('startup.' + name, STARTED, now - STARTED)
+
+    def finish_startup(self):
+        self.root.update_idletasks()
+        self.mark('interactive')
+        self.notebook.load()
+        self.note_list.reload()
+        startup = self.startup or {}
+        shown = startup.get('content') is not None
+        note = self.notebook.by_id.get(startup.get('selected'))
+        if note and shown:
+            # The editor already holds this note; anything typed into it
+            # since is kept and saved.
+            self.notebook.open_note = note
+            self.editor.attach_undo(self.notebook.undo_stack(note))
+            self.note_list.select_note(note, notify=False)
+            if self.editor.unsynced:
+                self.on_text_changed(self.editor.get_title(), self.editor.get_first_line_tags())
+        elif note:
+            self.note_list.select_note(note)
+        elif self.notebook.notes:
+            self.note_list.select_note(self.notebook.notes[0])
+        else:
             self.note_list.add_note()
+        self.mark('loaded')
+        self.root.after(1, self.finish_deferred)
+
+    def finish_deferred(self):
+        self.note_list.build_deferred()
+        self.editor.build_deferred()
+        self.notebook.load_search_index()
+        if self.note_list.search_var.get().strip():
+            self.note_list.run_search()
+        self.mark('indexed')
+        self.root.after_idle(self.notebook.load_title_index)
+        self.root.after(EXTERNAL_POLL_MS, self.poll_external)
+        if self.startup_report:
+            self.write_startup_report()
+        if self.quit_after_startup:
+            self.on_close()
+
+    def write_startup_report(self):
+        report = {name: seconds * 1000 for name, seconds in self.timings.items()}
+        report['notes'] = len(self.notebook.notes)
+        report['snapshot'] = self.startup is not None
+        with open(self.startup_report, 'w') as f:
+            json.dump(report, f, indent=1)
 
-    def load_notes(self):
+    def on_close(self):
+        saver = self.notebook.saver
+        saver.flush()
+        if saver.error is not None:
+            from tkinter import messagebox
+            if not messagebox.askyesno(
+                    "Notes not saved",
+                    f"Your latest changes could not be saved:\n{saver.error}\n\n"
+                    "Quit anyway and lose them? No keeps the window open and keeps retrying."):
+                return
         try:
-            if os.path.exists('notes.json'):
-                with open('notes.json', 'r') as f:
-                    notes_data = json.load(f)
-                    for note_data in notes_data:
-                        note = Note(
-                            note_data['title'],
-                            note_data['content'],
-                            note_data.get('title_tags', [])
-                        )
-                        self.note_list.notes.append(note)
-                        self.note_list.create_note_button(note)
-        except:
-            pass
-
-    def save_notes(self):
-        notes_data = [{
-            'title': note.title,
-            'content': note.content,
-            'title_tags': note.title_tags
-        } for note in self.note_list.notes]
-        with open('notes.json', 'w') as f:
-            json.dump(notes_data, f)
+            self.notebook.close()
+        except SaveError as e:
+            print("notes could not be saved: %s" % e.args[0], file=sys.stderr)
+        if self.recorder:
+            self.watchdog.stop()
+            self.recorder.dump()
+        self.root.destroy()
+
+    def poll_external(self):
+        # Other windows and sync tools save to the same files; what they
+        # changed is merged into the list and, if open, the editor.
+        merged = self.notebook.poll_external()
+        if merged:
+            self.apply_external(*merged)
+        error = self.notebook.saver.error
+        self.editor.status.warn(f"Not saved, retrying: {error}" if error is not None else "")
+        self.root.after(EXTERNAL_POLL_MS, self.poll_external)
+
+    def apply_external(self, added, removed, changed, conflicts):
+        self.note_list.apply_external(added, removed, changed)
+        if self.notebook.open_note in changed:
+            self.reload_open_note()
+        for note, meta in conflicts:
+            from tkinter import messagebox
+            elsewhere = "deleted" if meta is None else "changed"
+            keep = messagebox.askyesno(
+                "Note changed elsewhere",
+                f'"{note.title}" was {elsewhere} in another window while you were editing it here.\n\n'
+                "Keep your version? No loads the other one.")
+            self.notebook.resolve(note, meta, keep)
+            if keep:
+                continue
+            if meta is None:
+                self.note_list.apply_external([], [note], [])
+            else:
+                self.note_list.apply_external([], [], [note])
+                if note is self.notebook.open_note:
+                    self.reload_open_note()
+
+    def reload_open_note(self):
+        note = self.notebook.open_note
+        self.editor.set_content(note.content, note.spans, self.notebook.undo_stack(note))
 
     def on_note_selected(self, note):
-        self.editor.set_content(note.content)
+        content, spans = self.notebook.select(note)
+        self.editor.set_content(content, spans, self.notebook.undo_stack(note))
 
-    def on_note_deleted(self):
-        self.save_notes()
+    def show_versions(self, event=None):
+        note = self.notebook.open_note
+        if not note:
+            return
+        from components.versions_view import VersionsView
+        self.notebook.saver.flush()
+        history = self.notebook.history
+        VersionsView(self.root, note.title, history.versions(note.id),
+                     lambda rev: history.version(note.id, rev), self.editor.replace_content)
 
-    def on_text_changed(self, content, title, tags):
-        if self.note_list.selected_note:
-            self.note_list.selected_note.content = content
-            self.note_list.selected_note.title = title
-            self.note_list.update_note_title(self.note_list.selected_note, title, tags)
-            self.save_notes()
+    def show_switcher(self, event=None):
+        if self.note_list.ready:
+            from components.quick_switcher import QuickSwitcher
+            QuickSwitcher(self.root, self.notebook.switch, self.switch_to)
+        return 'break'
 
-if __name__ == "__main__":
+    def switch_to(self, note):
+        # A note hidden by the list's search filter is shown by clearing it.
+        if note.id not in self.note_list.positions:
+            self.note_list.search_var.set("")
+        self.note_list.select_note(note)
+
+    def on_text_changed(self, title, tags):
+        note = self.notebook.open_note
+        if note:
+            if title is not None:
+                self.notebook.retitle(note, title, tags)
+            else:
+                self.notebook.touch(note)
+            # Editing bumps the note's modified time, which may move it.
+            if not self.note_list.reorder(note) and title is not None:
+                self.note_list.update_note_title(note)
+
+def enable_profiling(trace_path):
+    # Wraps the handlers before any widget exists, so every binding made
+    # while the window is built is timed.
+    from core.instrument import Recorder
+    recorder = Recorder(trace_path)
+    recorder.instrument(Editor, ['on_text_change', 'on_key_release', 'set_content', 'load_next_chunk',
+                                 'recalculate', 'toggle_tag', 'calculate_formula', 'get_content',
+                                 'get_spans'])
+    recorder.instrument(NoteList, ['select_note', 'run_search', 'redraw', 'update_note_title',
+                                   'on_click', 'delete_selected_note'])
+    recorder.instrument(CodeHighlighter, ['on_change', 'poll', 'paint_view'])
+    recorder.instrument(InlineImages, ['paint_view'])
+    recorder.instrument(SpellChecker, ['on_change', 'paint_view', 'poll', 'on_menu'])
+    recorder.instrument(FindPanel, ['feed', 'poll', 'paint_view', 'on_change', 'apply_batch'])
+    recorder.instrument(Notebook, ['select', 'sync_open_note', 'collect', 'write', 'search', 'switch'])
+    recorder.instrument(AutosaveScheduler, ['commit'])
+    recorder.instrument(BetterNotepad, ['on_note_selected', 'on_text_changed'])
+    return recorder
+
+def find_word_list(path=None):
+    # --words, then $NOTEPAD_WORDS, then a words.txt next to the program,
+    # then the system's list; None turns spell checking off.
+    for candidate in (path, os.environ.get(WORDS_ENV), *WORD_LISTS):
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Better Notepad")
+    parser.add_argument('--profile', action='store_true',
+                        help="time handlers and watch for stalls (F12 shows the overlay); "
+                             "also enabled by %s=1" % PROFILE_ENV)
+    parser.add_argument('--trace', default=TRACE_PATH, help="where --profile writes its trace")
+    parser.add_argument('--startup-report', metavar='PATH',
+                        help="write startup timings (ms since launch) to PATH as JSON")
+    parser.add_argument('--quit-after-startup', action='store_true',
+                        help="exit once startup has finished, for measurements")
+    parser.add_argument('--words', metavar='PATH',
+                        help="word list to spell check against, one word per line "
+                             "(default: $%s, words.txt next to main.py, or /usr/share/dict/words)" % WORDS_ENV)
+    store = argparse.ArgumentParser(add_help=False)
+    store.add_argument('--store', default=STORE_PATH,
+                       help="base path of the note files (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', title="commands (run without a window)")
+    importer = commands.add_parser('import', parents=[store],
+                                   help="add the .md/.markdown/.txt files under DIR as notes")
+    importer.add_argument('directory', metavar='DIR')
+    importer.add_argument('--processes', type=int, help="parser processes (default: one per CPU)")
+    exporter = commands.add_parser('export', parents=[store], help="write every note to DIR as markdown")
+    exporter.add_argument('directory', metavar='DIR')
+    commands.add_parser('stats', parents=[store], help="count notes, words and bytes")
+    return parser.parse_args(argv)
+
+def run_command(args):
+    from core import bulk
+    if args.command == 'import':
+        result = bulk.import_dir(args.directory, args.store, args.store + '.search', args.processes)
+        print("imported %(imported)d of %(files)d files in %(seconds).1f s" % result)
+        if result['skipped']:
+            print("%(skipped)d files could not be read" % result)
+        if result['held']:
+            print("%(held)d notes were being edited elsewhere and were left as they are" % result)
+        if result['edited']:
+            print("%(edited)d notes were edited here since their files were last imported "
+                  "and were left as they are" % result)
+        if result['unchanged']:
+            print("%(unchanged)d files had not changed since they were last imported" % result)
+    elif args.command == 'export':
+        result = bulk.export_dir(args.directory, args.store)
+        print("exported %(exported)d notes in %(seconds).1f s" % result)
+    else:
+        for name, value in bulk.stats(args.store).items():
+            print("%-16s %s" % (name, value))
+
+def main():
+    # argparse costs several ms to import; a plain launch skips it.
+    args = parse_args(sys.argv[1:]) if sys.argv[1:] else None
+    if args and args.command:
+        run_command(args)
+        return
+    profile = args and args.profile or os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+    recorder = enable_profiling(args.trace if args else TRACE_PATH) if profile else None
     root = tk.Tk()
     root.geometry("1000x600")
-    app = BetterNotepad(root)
-    root.mainloop()
\ No newline at end of file
+    BetterNotepad(root, recorder, args and args.startup_report, args and args.quit_after_startup,
+                  find_word_list(args and args.words))
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,111 @@
-from datetime import datetime
+import sys
+import time
+
+TAG_SETS = {}
+
+
+def intern_tags(tags):
+    # Title tags, and the labels on most notes, come in a handful of
+    # combinations; every note with the same ones shares one tuple.
+    tags = tuple(tags or ())
+    return TAG_SETS.setdefault(tags, tags)
+
+
+def intern_name(name):
+    # Notebook names are shared by many notes.
+    return sys.intern(name or "")
+
+
+def parse_time(value):
+    # Epoch seconds; notes saved by older versions carry ISO strings.
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        from datetime import datetime
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
 
 class Note:
-    def __init__(self, title="Untitled Note", content="", title_tags=None):
+    # Tens of thousands of these stay alive for the whole session, so they
+    # use slots. `_packed` holds the body compressed while it is cold; see
+    # BodyCache. `rev` counts the saves, across every instance sharing the
+    # store. Notes saved before `created` was kept count as created at
+    # their last change. `labels` are the user's tags on the note (not to
+    # be confused with `title_tags`, the title's formatting), and
+    # `notebook` the name of the notebook it is in, "" for none.
+    __slots__ = ('id', 'title', '_content', '_spans', '_packed', '_tags', 'loader', 'last_modified',
+                 'created', 'rev', '_labels', 'notebook')
+
+    def __init__(self, title="Untitled Note", content="", title_tags=None, note_id=None,
+                 last_modified=None, loader=None, spans="", rev=0, created=None, labels=None,
+                 notebook=""):
+        if note_id is None:
+            # uuid pulls in platform; only new notes need it.
+            import uuid
+            note_id = uuid.uuid4().hex
+        self.id = note_id
         self.title = title
-        self.content = content
-        self.title_tags = title_tags or []
-        self.last_modified = datetime.now().isoformat()
\ No newline at end of file
+        self._content = content
+        self._spans = spans
+        self._packed = None
+        self.loader = loader
+        self.title_tags = title_tags
+        self.last_modified = parse_time(last_modified)
+        self.created = self.last_modified if created is None else parse_time(created)
+        self.rev = rev
+        self.labels = labels
+        self.notebook = intern_name(notebook)
+
+    @property
+    def content(self):
+        # Bodies of notes read from the index are fetched on first access.
+        if self._content is None:
+            return self.loader(self) if self.loader else ""
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._packed = None
+
+    @property
+    def spans(self):
+        # The encoded formatting table travels with the body.
+        if self._content is None:
+            self.content
+        return self._spans
+
+    @spans.setter
+    def spans(self, value):
+        self._spans = value
+
+    @property
+    def title_tags(self):
+        return self._tags
+
+    @title_tags.setter
+    def title_tags(self, value):
+        self._tags = intern_tags(value)
+
+    @property
+    def labels(self):
+        return self._labels
+
+    @labels.setter
+    def labels(self, value):
+        self._labels = intern_tags(value)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'spans': self.spans,
+            'title_tags': list(self.title_tags),
+            'last_modified': self.last_modified,
+            'created': self.created,
+            'rev': self.rev,
+            'labels': list(self.labels),
+            'notebook': self.notebook
+        }
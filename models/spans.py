@@ -0,0 +1,110 @@
+import base64
+from bisect import bisect_right
+from itertools import accumulate
+
+# Formatting is stored per note as a run-length span table: for every tag,
+# the number of runs followed by (gap since the previous run's end, length)
+# pairs. The integers are LEB128 varints, base64 encoded so the table fits
+# in a JSON string next to the note body.
+#
+# An embedded image stands in the body as one IMAGE_CHAR. The table then
+# has a second part after a '|': the gaps between image offsets, encoded
+# the same way, then '|' again and the images' blob digests.
+SPAN_TAGS = ['bold', 'italic', 'underline', 'code']
+IMAGE_CHAR = '\ufffc'
+DIGEST_CHARS = 64
+
+
+def encode_varints(values):
+    out = bytearray()
+    for value in values:
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def encode_spans(runs, images=()):
+    # `runs` maps a tag name to a sorted list of non-overlapping
+    # (start, end) character offsets; `images` is a sorted list of
+    # (offset, digest).
+    values = []
+    for tag_id, tag in enumerate(SPAN_TAGS):
+        tag_runs = runs.get(tag)
+        if not tag_runs:
+            continue
+        values += [tag_id, len(tag_runs)]
+        previous = 0
+        for start, end in tag_runs:
+            values += [start - previous, end - start]
+            previous = end
+    encoded = base64.b64encode(encode_varints(values)).decode('ascii') if values else ""
+    if images:
+        gaps = []
+        previous = 0
+        for offset, _ in images:
+            gaps.append(offset - previous)
+            previous = offset
+        encoded += "|%s|%s" % (base64.b64encode(encode_varints(gaps)).decode('ascii'),
+                               ''.join(digest for _, digest in images))
+    return encoded
+
+
+def decode_spans(data):
+    runs = {}
+    data = data.split('|', 1)[0] if data else data
+    if not data:
+        return runs
+    values = decode_varints(base64.b64decode(data))
+    i = 0
+    while i < len(values):
+        tag, count = SPAN_TAGS[values[i]], values[i + 1]
+        i += 2
+        tag_runs = runs[tag] = []
+        previous = 0
+        for _ in range(count):
+            start = previous + values[i]
+            previous = start + values[i + 1]
+            tag_runs.append((start, previous))
+            i += 2
+    return runs
+
+
+def decode_images(data):
+    if not data or '|' not in data:
+        return []
+    _, gaps, digests = data.split('|')
+    images = []
+    offset = 0
+    for i, gap in enumerate(decode_varints(base64.b64decode(gaps))):
+        offset += gap
+        images.append((offset, digests[i * DIGEST_CHARS:(i + 1) * DIGEST_CHARS]))
+    return images
+
+
+def line_starts(content):
+    return [0] + list(accumulate(len(line) + 1 for line in content.split('\n')))[:-1]
+
+
+def index_to_offset(starts, index):
+    line, col = str(index).split('.')
+    return starts[int(line) - 1] + int(col)
+
+
+def offset_to_index(starts, offset):
+    line = bisect_right(starts, offset)
+    return '%d.%d' % (line, offset - starts[line - 1])
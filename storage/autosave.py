@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from collections import deque
+
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class SaveError(Exception):
+    # Raised by close() when the last save could not be written; wraps
+    # the write's own error.
+    pass
+
+
+class AutosaveScheduler:
+    # Coalesces bursts of edits into a single save. A save fires once the
+    # editor has been idle for `idle_delay` seconds, but never later than
+    # `max_latency` seconds after the first unsaved edit. `collect` runs on
+    # the Tk thread and must only snapshot cheap references; `write` gets the
+    # list of snapshots queued since the last write and runs on the writer
+    # thread. `error` holds the exception of the last write while saving is
+    # failing, and is None once a retry succeeds.
+    def __init__(self, root, collect, write, idle_delay=0.5, max_latency=3.0):
+        self.root = root
+        self.collect = collect
+        self.write = write
+        self.idle_delay = idle_delay
+        self.max_latency = max_latency
+
+        self.dirty = set()
+        self.first_dirty_at = None
+        self.timer = None
+
+        self.lock = threading.Lock()
+        self.in_flight = deque()
+        self.saves = 0
+        self.last_save_duration = 0.0
+        self.max_lag = 0.0
+        self.error = None
+        self.unwritten = []
+        self.on_persisted = None
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.run_writer, name="autosave-writer", daemon=True)
+        self.writer.start()
+
+    def mark_dirty(self, key):
+        now = time.monotonic()
+        self.dirty.add(key)
+        if self.first_dirty_at is None:
+            self.first_dirty_at = now
+
+        deadline = self.first_dirty_at + self.max_latency
+        delay = max(0.0, min(self.idle_delay, deadline - now))
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+        self.timer = self.root.after(int(delay * 1000), self.commit)
+
+    def commit(self):
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+        if not self.dirty:
+            return
+
+        dirty, self.dirty = self.dirty, set()
+        started, self.first_dirty_at = self.first_dirty_at, None
+        payload = self.collect(dirty)
+        with self.lock:
+            self.in_flight.append(started)
+        self.queue.put(payload)
+
+    def run_writer(self):
+        # A failed write keeps its payloads and is retried, with the delay
+        # doubling up to MAX_RETRY_DELAY, together with whatever is queued
+        # meanwhile; records are staged in the store until they are
+        # written, so nothing is lost while the disk is full or read-only.
+        delay = None
+        stop = False
+        while not stop:
+            try:
+                got = [self.queue.get(timeout=delay)]
+            except queue.Empty:
+                got = []
+            while True:
+                try:
+                    got.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in got
+            self.unwritten += [p for p in got if p is not None]
+            if self.unwritten:
+                payloads = self.unwritten
+                began = time.monotonic()
+                try:
+                    self.write(payloads)
+                except Exception as e:
+                    self.error = e
+                    delay = min(delay * 2, MAX_RETRY_DELAY) if delay else RETRY_DELAY
+                else:
+                    self.error = None
+                    self.unwritten = []
+                    delay = None
+                    self.persisted(payloads, began)
+
+            for _ in got:
+                self.queue.task_done()
+
+    def persisted(self, payloads, began):
+        finished = time.monotonic()
+        lags = []
+        with self.lock:
+            for _ in payloads:
+                started = self.in_flight.popleft()
+                lags.append(finished - started)
+                self.max_lag = max(self.max_lag, finished - started)
+            self.saves += 1
+            self.last_save_duration = finished - began
+        if self.on_persisted:
+            for lag in lags:
+                self.on_persisted(lag)
+
+    def lag(self):
+        # Seconds since the oldest edit that has not reached the disk yet.
+        with self.lock:
+            return self._lag()
+
+    def _lag(self):
+        oldest = self.in_flight[0] if self.in_flight else None
+        if self.first_dirty_at is not None:
+            oldest = self.first_dirty_at if oldest is None else min(oldest, self.first_dirty_at)
+        return 0.0 if oldest is None else time.monotonic() - oldest
+
+    def stats(self):
+        with self.lock:
+            return {
+                'lag': self._lag(),
+                'pending': len(self.dirty),
+                'in_flight': len(self.in_flight),
+                'saves': self.saves,
+                'last_save_duration': self.last_save_duration,
+                'max_lag': self.max_lag,
+                'error': repr(self.error) if self.error else None,
+                'unwritten': len(self.unwritten),
+            }
+
+    def flush(self):
+        self.commit()
+        self.queue.join()
+
+    def close(self):
+        # The writer makes one last attempt; if that fails too, the edits
+        # it still holds are lost, so the caller hears about it.
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        if self.unwritten:
+            raise SaveError(self.error)
+
+
+class ManualSaver:
+    # Same interface as AutosaveScheduler for code that runs without an
+    # event loop: nothing is written until flush() is called.
+    def __init__(self, collect, write):
+        self.collect = collect
+        self.write = write
+        self.dirty = set()
+        self.saves = 0
+
+    def mark_dirty(self, key):
+        self.dirty.add(key)
+
+    def flush(self):
+        if self.dirty:
+            dirty, self.dirty = self.dirty, set()
+            self.write([self.collect(dirty)])
+            self.saves += 1
+
+    def lag(self):
+        return 0.0
+
+    def close(self):
+        self.flush()
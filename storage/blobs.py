@@ -0,0 +1,50 @@
+import hashlib
+import os
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def image_size(head):
+    # (width, height) from the first 24 bytes of a PNG or GIF, or None for
+    # anything else.
+    if head[:8] == PNG_SIGNATURE and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    return None
+
+
+class BlobStore:
+    # Binary attachments (images) kept outside the notes file, one file per
+    # distinct content named by its SHA-256, so a picture pasted into many
+    # notes is stored once. Blobs are written to a temporary name and
+    # renamed into place, so a reader never sees half a file; since a name
+    # always means the same bytes, instances sharing the directory need no
+    # lock.
+    def __init__(self, path='notes.blobs'):
+        self.path = path
+
+    def blob_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return digest
+
+    def read(self, digest, size=-1):
+        # The whole blob, or its first `size` bytes; None if it is missing.
+        try:
+            with open(self.blob_path(digest), 'rb') as f:
+                return f.read(size)
+        except OSError:
+            return None
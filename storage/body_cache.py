@@ -0,0 +1,98 @@
+import zlib
+from collections import OrderedDict
+
+
+def pack_body(content, spans):
+    return zlib.compress(content.encode('utf-8'), 1), spans
+
+
+def unpack_body(packed):
+    return zlib.decompress(packed[0]).decode('utf-8'), packed[1]
+
+
+class BodyCache:
+    # Two-tier LRU over note bodies. Loading a body makes it resident on its
+    # Note as plain text. Past `max_chars` of text, the least recently used
+    # bodies are compressed in place into `note._packed`; past `max_packed`
+    # bytes of those, the coldest are dropped altogether and re-read from
+    # the store on next access. Notes for which `pinned(note)` is true hold
+    # unsaved edits and stay resident.
+    def __init__(self, store, max_chars=4 * 1024 * 1024, max_packed=12 * 1024 * 1024, pinned=None):
+        self.store = store
+        self.max_chars = max_chars
+        self.max_packed = max_packed
+        self.pinned = pinned or (lambda note: False)
+        self.resident = OrderedDict()
+        self.size = 0
+        self.packed = OrderedDict()
+        self.packed_size = 0
+
+    def load(self, note):
+        if note._packed is not None:
+            note._content, note._spans = unpack_body(note._packed)
+        else:
+            data = self.store.read(note.id)
+            note._content = data['content'] if data else ""
+            note._spans = data.get('spans', "") if data else ""
+        self.touch(note)
+        return note._content
+
+    def touch(self, note):
+        self.unpack(note)
+        entry = self.resident.pop(note.id, None)
+        if entry:
+            self.size -= entry[1]
+        size = len(note._content or "")
+        self.resident[note.id] = (note, size)
+        self.size += size
+        if self.size > self.max_chars:
+            self.evict()
+
+    def unpack(self, note):
+        note._packed = None
+        entry = self.packed.pop(note.id, None)
+        if entry:
+            self.packed_size -= entry[1]
+
+    def discard(self, note):
+        self.unpack(note)
+        entry = self.resident.pop(note.id, None)
+        if entry:
+            self.size -= entry[1]
+
+    def invalidate(self, note):
+        # The stored body changed under this note; it is read again on next
+        # access.
+        self.discard(note)
+        note._content = None
+        note._spans = None
+
+    def evict(self):
+        # The newest entry is the body just touched, which may not be marked
+        # dirty yet; it is never the one to go.
+        for note_id, (note, size) in list(self.resident.items())[:-1]:
+            if self.size <= self.max_chars:
+                break
+            if self.pinned(note):
+                continue
+            del self.resident[note_id]
+            self.size -= size
+            if note._content:
+                note._packed = pack_body(note._content, note._spans)
+                packed_size = len(note._packed[0]) + len(note._packed[1] or "")
+                self.packed[note_id] = (note, packed_size)
+                self.packed_size += packed_size
+            note._content = None
+            note._spans = None
+        while self.packed_size > self.max_packed:
+            note_id, (note, packed_size) = self.packed.popitem(last=False)
+            note._packed = None
+            self.packed_size -= packed_size
+
+    def stats(self):
+        return {
+            'resident': len(self.resident),
+            'resident_chars': self.size,
+            'packed': len(self.packed),
+            'packed_bytes': self.packed_size,
+        }
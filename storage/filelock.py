@@ -0,0 +1,71 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    # Advisory lock on a side file, shared by every instance that opens the
+    # same notes. Re-entrant within a process; threads of one process also
+    # exclude each other. acquire(block=False) returns False instead of
+    # waiting, for callers on the UI thread.
+    def __init__(self, path):
+        self.path = path
+        self.mutex = threading.RLock()
+        self.file = None
+        self.depth = 0
+
+    def acquire(self, block=True):
+        if not self.mutex.acquire(block):
+            return False
+        if self.depth == 0:
+            if self.file is None:
+                self.file = open(self.path, 'a+b')
+            if not self.lock_file(block):
+                self.mutex.release()
+                return False
+        self.depth += 1
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.mutex.release()
+
+    def lock_file(self, block):
+        if fcntl:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX if block else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        # msvcrt gives up after ten one-second retries; keep waiting.
+        self.file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK if block else msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not block:
+                    return False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        with self.mutex:
+            if self.file is not None and self.depth == 0:
+                self.file.close()
+                self.file = None
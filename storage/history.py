@@ -0,0 +1,215 @@
+import base64
+import json
+import os
+import time
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict
+from storage.filelock import FileLock
+from storage.journal import encode_record, read_records
+from core.history import diff, patch
+
+KEYFRAME_EVERY = 64
+
+
+def pack_text(text):
+    return base64.b64encode(zlib.compress(text.encode('utf-8'))).decode('ascii')
+
+
+def unpack_text(data):
+    return zlib.decompress(base64.b64decode(data)).decode('utf-8')
+
+
+class HistoryStore:
+    # Past versions of every note in one append-only file of journal
+    # records. A version is either a keyframe with the whole text,
+    # compressed, or a delta against the version before it. A keyframe is
+    # written every KEYFRAME_EVERY versions, or sooner once the deltas since
+    # the last one outgrow the note, so any version is rebuilt from one
+    # keyframe and fewer than KEYFRAME_EVERY deltas. Past `max_bytes` the
+    # oldest runs (a keyframe and its deltas) are dropped across all notes;
+    # a note's newest run is always kept. The last version of recently
+    # saved notes is kept in memory, up to `max_tip_chars`. The lock is a
+    # FileLock, so other instances sharing the file wait as well; when one
+    # of them has written to it, it is read again.
+    def __init__(self, path='notes.history', max_bytes=64 * 1024 * 1024, max_tip_chars=8 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_tip_chars = max_tip_chars
+        self.lock = FileLock(path + '.lock')
+        self.entries = None
+        self.tips = OrderedDict()
+        self.tip_chars = 0
+        self.file = None
+        self.size = 0
+        self.inode = None
+
+    def open(self):
+        # Read lazily, the first time a version is saved or asked for.
+        if self.entries is not None:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                st = None
+            if st and (st.st_ino, st.st_size) == (self.inode, self.size):
+                return
+            self.file.close()
+            self.tips.clear()
+            self.tip_chars = 0
+        self.entries = {}
+        end = 0
+        for offset, length, record in read_records(self.path):
+            if record.get('op') == 'drop':
+                self.entries.pop(record['id'], None)
+            else:
+                self.entries.setdefault(record['id'], []).append(
+                    (record['rev'], record['time'], record['len'], 'key' in record, offset, length))
+            end = offset + length
+        with open(self.path, 'ab') as f:
+            if f.tell() != end:
+                f.truncate(end)
+        self.file = open(self.path, 'ab')
+        self.size = end
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+    def append(self, record):
+        line = encode_record(record)
+        offset = self.size
+        self.file.write(line)
+        self.file.flush()
+        self.size += len(line)
+        return offset, len(line)
+
+    def record(self, note_id, content):
+        with self.lock:
+            self.open()
+            entries = self.entries.setdefault(note_id, [])
+            tip = self.pop_tip(note_id)
+            if tip is None and entries:
+                tip = (entries[-1][0], self.rebuild(entries, len(entries) - 1)) + self.since_key(entries)
+            if tip and tip[1] == content:
+                self.put_tip(note_id, tip)
+                return
+
+            record = {'id': note_id, 'rev': tip[0] + 1 if tip else 1, 'time': time.time(), 'len': len(content)}
+            key = tip is None or tip[2] + 1 >= KEYFRAME_EVERY
+            if not key:
+                at, cut, text = diff(tip[1], content)
+                key = tip[3] + len(text) > len(content)
+            if key:
+                record['key'] = pack_text(content)
+            else:
+                record.update(at=at, cut=cut, text=text)
+            offset, length = self.append(record)
+            entries.append((record['rev'], record['time'], len(content), key, offset, length))
+            if key:
+                self.put_tip(note_id, (record['rev'], content, 0, 0))
+            else:
+                self.put_tip(note_id, (record['rev'], content, tip[2] + 1, tip[3] + length))
+            if self.size > self.max_bytes:
+                self.compact()
+
+    def since_key(self, entries):
+        count = size = 0
+        for entry in reversed(entries):
+            if entry[3]:
+                break
+            count += 1
+            size += entry[5]
+        return count, size
+
+    def pop_tip(self, note_id):
+        tip = self.tips.pop(note_id, None)
+        if tip:
+            self.tip_chars -= len(tip[1])
+        return tip
+
+    def put_tip(self, note_id, tip):
+        self.tips[note_id] = tip
+        self.tip_chars += len(tip[1])
+        while self.tip_chars > self.max_tip_chars and len(self.tips) > 1:
+            self.pop_tip(next(iter(self.tips)))
+
+    def rebuild(self, entries, index):
+        first = index
+        while not entries[first][3]:
+            first -= 1
+        with open(self.path, 'rb') as f:
+            text = None
+            for entry in entries[first:index + 1]:
+                f.seek(entry[4])
+                record = json.loads(f.read(entry[5])[9:])
+                if text is None:
+                    text = unpack_text(record['key'])
+                else:
+                    text = patch(text, record['at'], record['cut'], record['text'])
+        return text
+
+    def versions(self, note_id):
+        # [(rev, time, length)] oldest first.
+        with self.lock:
+            self.open()
+            return [entry[:3] for entry in self.entries.get(note_id, ())]
+
+    def version(self, note_id, rev):
+        with self.lock:
+            self.open()
+            entries = self.entries.get(note_id, [])
+            index = bisect_left(entries, (rev,))
+            if index == len(entries) or entries[index][0] != rev:
+                return None
+            return self.rebuild(entries, index)
+
+    def forget(self, note_id):
+        with self.lock:
+            self.open()
+            if self.entries.pop(note_id, None) is not None:
+                self.append({'op': 'drop', 'id': note_id})
+            self.pop_tip(note_id)
+
+    def compact(self):
+        # Drops the oldest runs until the file is down to three quarters of
+        # its budget, then copies what is left into a fresh file.
+        runs = []
+        for note_id, entries in self.entries.items():
+            starts = [i for i, entry in enumerate(entries) if entry[3]]
+            for first, last in zip(starts, starts[1:]):
+                size = sum(entry[5] for entry in entries[first:last])
+                runs.append((entries[last - 1][1], note_id, last, size))
+        runs.sort()
+        target = self.max_bytes * 3 // 4
+        total = self.size
+        cut = {}
+        for _, note_id, last, size in runs:
+            if total <= target:
+                break
+            cut[note_id] = last
+            total -= size
+
+        tmp_path = self.path + '.tmp'
+        kept = {}
+        with open(self.path, 'rb') as old, open(tmp_path, 'wb') as new:
+            offset = 0
+            for note_id, entries in self.entries.items():
+                moved = []
+                for rev, when, length, key, at, size in entries[cut.get(note_id, 0):]:
+                    old.seek(at)
+                    new.write(old.read(size))
+                    moved.append((rev, when, length, key, offset, size))
+                    offset += size
+                kept[note_id] = moved
+            new.flush()
+            os.fsync(new.fileno())
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'ab')
+        self.entries = kept
+        self.size = offset
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        self.lock.close()
@@ -0,0 +1,388 @@
+import json
+import os
+import threading
+import zlib
+from models.note import intern_tags, intern_name
+from storage.filelock import FileLock
+
+SNAPSHOT = 'snapshot'
+LOG = 'log'
+META_FIELDS = ('title', 'title_tags', 'last_modified', 'rev', 'created', 'labels', 'notebook')
+INDEX_VERSION = 4
+
+
+def encode_record(record):
+    body = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(body), body)
+
+
+def decode_record(line):
+    # None for a torn or corrupt line.
+    if not line.endswith(b'\n'):
+        return None
+    checksum, _, body = line[:-1].partition(b' ')
+    try:
+        if int(checksum, 16) != zlib.crc32(body):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def make_meta(title, title_tags, last_modified, rev, created=None, labels=None, notebook=None):
+    # Kept for every note for the whole session, so a tuple in META_FIELDS
+    # order rather than a dict.
+    return (title, intern_tags(title_tags), last_modified, rev or 0,
+            last_modified if created is None else created, intern_tags(labels), intern_name(notebook))
+
+
+def read_records(path, start=0):
+    # Yields (offset, length, record) for every intact line. A line without
+    # its trailing newline or with a bad checksum is a torn write from a
+    # crash, so reading stops there.
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            record = decode_record(line)
+            if record is None:
+                return
+            yield offset, len(line), record
+            offset += len(line)
+
+
+class JournalStore:
+    # Notes live in a snapshot plus an append-only log of per-note records.
+    # Each record is one line: a crc32 of the JSON body followed by the body.
+    # Saving a note appends one record, so write volume follows the size of
+    # the edited note. Once the log passes `compact_threshold` bytes the live
+    # records are copied into a fresh snapshot, which is swapped in with an
+    # atomic rename before the log is truncated. Replaying a log on top of a
+    # snapshot that already contains it is harmless, so a crash between the
+    # two steps loses nothing.
+    #
+    # Several instances may share the files. Appends and compaction hold a
+    # lock file and first catch up on whatever the others wrote; those
+    # notes collect in `external` until the owner settles them. A save of
+    # a note in `external` is held back (staged, listed in `rejected`) so
+    # it cannot silently overwrite the other instance's version.
+    def __init__(self, base='notes', compact_threshold=8 * 1024 * 1024):
+        self.paths = {SNAPSHOT: base + '.snapshot', LOG: base + '.log'}
+        self.legacy_path = base + '.json'
+        self.index_path = base + '.index'
+        self.compact_threshold = compact_threshold
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(base + '.lock')
+        self.entries = {}
+        self.meta = {}
+        self.staged = {}
+        self.external = {}
+        self.rejected = set()
+        self.log = None
+        self.log_size = 0
+        self.snapshot_seen = None
+
+    def open(self):
+        # Returns the id and metadata of every note in list order. Bodies
+        # stay on disk until read() asks for them.
+        with self.file_lock:
+            if not any(os.path.exists(p) for p in self.paths.values()):
+                self.migrate_legacy()
+            with self.lock:
+                self.read_state()
+        return [dict(zip(META_FIELDS, self.meta[note_id]), id=note_id) for note_id in self.entries]
+
+    def read_state(self):
+        # Rebuilds entries and meta from the files. Called with both locks
+        # held.
+        self.entries = {}
+        self.meta = {}
+        log_start = self.load_index()
+        if log_start is None:
+            log_start = 0
+            for offset, length, record in read_records(self.paths[SNAPSHOT]):
+                self.apply(SNAPSHOT, offset, length, record)
+
+        end = log_start
+        for offset, length, record in read_records(self.paths[LOG], log_start):
+            self.apply(LOG, offset, length, record)
+            end = offset + length
+
+        # Drop a torn tail so new appends start on a clean line boundary.
+        # The log may have been replaced, so the handle is opened afresh.
+        if self.log:
+            self.log.close()
+        self.log = open(self.paths[LOG], 'ab')
+        if os.fstat(self.log.fileno()).st_size != end:
+            self.log.truncate(end)
+        self.log_size = end
+        self.snapshot_seen = self.snapshot_stamp()
+
+    def snapshot_stamp(self):
+        try:
+            st = os.stat(self.paths[SNAPSHOT])
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def load_index(self):
+        # The index is only trusted if it was written against the snapshot
+        # that is on disk now; the log written after it is replayed on top.
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            log_size = os.path.getsize(self.paths[LOG]) if os.path.exists(self.paths[LOG]) else 0
+            if (index['version'] != INDEX_VERSION or index['snapshot'] != self.snapshot_stamp()
+                    or index['log_size'] > log_size):
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+
+        for note_id, segment, offset, length, *meta in index['notes']:
+            self.entries[note_id] = (segment, offset, length)
+            self.meta[note_id] = make_meta(*meta)
+        return index['log_size']
+
+    def write_index(self):
+        with self.lock:
+            notes = [[note_id, segment, offset, length] + list(self.meta[note_id])
+                     for note_id, (segment, offset, length) in self.entries.items()]
+            index = {
+                'version': INDEX_VERSION,
+                'snapshot': self.snapshot_stamp(),
+                'log_size': self.log_size,
+                'notes': notes,
+            }
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def stamp(self):
+        # Identifies the state on disk; a derived index saved with this
+        # stamp can catch up by replaying changes_since(stamp[1]).
+        return [self.snapshot_stamp(), self.log_size]
+
+    def disk_stamp(self):
+        # The same stamp read off the files, for callers that have not
+        # opened the store yet.
+        try:
+            log_size = os.path.getsize(self.paths[LOG])
+        except OSError:
+            log_size = 0
+        return [self.snapshot_stamp(), log_size]
+
+    def changes_since(self, log_offset):
+        changes = {}
+        for _, _, record in read_records(self.paths[LOG], log_offset):
+            changes[record['id']] = record.get('note')
+        return changes
+
+    def catch_up(self):
+        # Folds in what other instances wrote since this one last looked.
+        # New log records are replayed; a new snapshot means someone
+        # compacted, so everything is re-read and compared by id and rev.
+        # Called with the file lock held.
+        with self.lock:
+            if self.snapshot_stamp() != self.snapshot_seen:
+                old = self.meta
+                self.read_state()
+                changes = {note_id: meta for note_id, meta in self.meta.items() if old.get(note_id) != meta}
+                changes.update((note_id, None) for note_id in old if note_id not in self.meta)
+            else:
+                changes = {}
+                end = self.log_size
+                for offset, length, record in read_records(self.paths[LOG], self.log_size):
+                    self.apply(LOG, offset, length, record)
+                    changes[record['id']] = self.meta.get(record['id'])
+                    end = offset + length
+                if os.fstat(self.log.fileno()).st_size != end:
+                    self.log.truncate(end)
+                self.log_size = end
+            self.external.update(changes)
+        return changes
+
+    def refresh(self):
+        # Polled from the UI thread: two stats when nothing changed, and it
+        # never waits for the lock. Returns the unsettled external changes
+        # as {note_id: meta, or None if deleted}.
+        try:
+            changed = (self.snapshot_stamp() != self.snapshot_seen or
+                       os.path.getsize(self.paths[LOG]) != self.log_size)
+        except OSError:
+            changed = True
+        if changed and self.file_lock.acquire(block=False):
+            try:
+                self.catch_up()
+            finally:
+                self.file_lock.release()
+        with self.lock:
+            return dict(self.external)
+
+    def settle(self, note_id):
+        with self.lock:
+            self.external.pop(note_id, None)
+            self.rejected.discard(note_id)
+
+    def unstage(self, note_id):
+        with self.lock:
+            self.staged.pop(note_id, None)
+
+    def migrate_legacy(self):
+        # Notes the old format saved without a time get the file's.
+        if not os.path.exists(self.legacy_path):
+            return
+        import uuid
+        with open(self.legacy_path, 'r') as f:
+            notes = json.load(f)
+        saved_at = os.path.getmtime(self.legacy_path)
+        for note in notes:
+            note.setdefault('id', uuid.uuid4().hex)
+            if note.get('last_modified') is None:
+                note['last_modified'] = saved_at
+        self.write_snapshot((note['id'], encode_record(put_record(note))) for note in notes)
+        os.replace(self.paths[SNAPSHOT] + '.tmp', self.paths[SNAPSHOT])
+
+    def apply(self, segment, offset, length, record):
+        note_id = record['id']
+        if record['op'] == 'put':
+            note = record['note']
+            self.entries[note_id] = (segment, offset, length)
+            self.meta[note_id] = make_meta(*[note.get(k) for k in META_FIELDS])
+        else:
+            self.entries.pop(note_id, None)
+            self.meta.pop(note_id, None)
+
+    def stage(self, records):
+        # Records handed to the writer thread but not yet appended. read()
+        # serves them so a body evicted from memory is never read back stale.
+        with self.lock:
+            for record in records:
+                self.staged[record['id']] = record
+
+    def append(self, records, lines=None):
+        # Returns the records actually written; held-back ones stay staged.
+        # Bulk import passes `lines` already encoded by its worker processes,
+        # and records that only carry the metadata.
+        with self.file_lock:
+            self.catch_up()
+            with self.lock:
+                held = {record['id'] for record in records
+                        if record['op'] == 'put' and record['id'] in self.external}
+                self.rejected.update(held)
+            if lines is None:
+                lines = [encode_record(record) for record in records if record['id'] not in held]
+            else:
+                lines = [line for record, line in zip(records, lines) if record['id'] not in held]
+            records = [record for record in records if record['id'] not in held]
+            if not records:
+                return records
+
+            try:
+                self.log.write(b''.join(lines))
+                self.log.flush()
+                os.fsync(self.log.fileno())
+            except OSError:
+                # A partly written batch would leave a torn line that hides
+                # every record appended after it; the caller retries.
+                self.drop_tail()
+                raise
+
+            with self.lock:
+                offset = self.log_size
+                for record, line in zip(records, lines):
+                    self.apply(LOG, offset, len(line), record)
+                    if self.staged.get(record['id']) is record:
+                        del self.staged[record['id']]
+                    offset += len(line)
+                self.log_size = offset
+
+            if self.log_size > self.compact_threshold:
+                self.compact()
+        return records
+
+    def drop_tail(self):
+        try:
+            self.log.truncate(self.log_size)
+        except OSError:
+            pass
+
+    def read(self, note_id):
+        # Another instance may have compacted since the offsets were taken;
+        # a line that does not check out means catching up and trying again.
+        for _ in range(2):
+            with self.lock:
+                staged = self.staged.get(note_id)
+                if staged is not None:
+                    return staged.get('note')
+                entry = self.entries.get(note_id)
+                if entry is None:
+                    return None
+                segment, offset, length = entry
+                with open(self.paths[segment], 'rb') as f:
+                    f.seek(offset)
+                    record = decode_record(f.read(length))
+            if record is not None and record['id'] == note_id:
+                return record['note']
+            with self.file_lock:
+                self.catch_up()
+        return None
+
+    def compact(self):
+        # Only the writer thread appends, and other instances wait on the
+        # file lock, so the entries cannot move while the live records are
+        # copied; readers only wait for the swap.
+        with self.file_lock:
+            entries = self.write_snapshot(self.live_lines())
+            with self.lock:
+                os.replace(self.paths[SNAPSHOT] + '.tmp', self.paths[SNAPSHOT])
+                self.log.close()
+                self.log = open(self.paths[LOG], 'wb')
+                self.log_size = 0
+                self.entries = entries
+                self.snapshot_seen = self.snapshot_stamp()
+            self.write_index()
+
+    def live_lines(self):
+        files = {}
+        try:
+            for note_id, (segment, offset, length) in list(self.entries.items()):
+                if segment not in files:
+                    files[segment] = open(self.paths[segment], 'rb')
+                f = files[segment]
+                f.seek(offset)
+                yield note_id, f.read(length)
+        finally:
+            for f in files.values():
+                f.close()
+
+    def write_snapshot(self, lines):
+        tmp_path = self.paths[SNAPSHOT] + '.tmp'
+        entries = {}
+        with open(tmp_path, 'wb') as f:
+            offset = 0
+            for note_id, line in lines:
+                f.write(line)
+                entries[note_id] = (SNAPSHOT, offset, len(line))
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return entries
+
+    def close(self):
+        with self.file_lock:
+            if self.log:
+                self.log.close()
+                self.log = None
+                self.write_index()
+        self.file_lock.close()
+
+
+def put_record(note):
+    return {'op': 'put', 'id': note['id'], 'note': note}
+
+
+def delete_record(note_id):
+    return {'op': 'del', 'id': note_id}
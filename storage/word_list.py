@@ -0,0 +1,126 @@
+import heapq
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b'NPWORDS1'
+HEADER = struct.Struct('<8sQQI4x')
+SORT_CHUNK = 20000
+
+
+def normalize(word):
+    return word.replace('’', "'").casefold()
+
+
+def read_words(path):
+    # One word per line. Hunspell .dic files work too: the count on the
+    # first line is skipped and /FLAGS are cut off.
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            word = line.split('/', 1)[0].strip()
+            if word and not word.isdigit() and not word.startswith('#'):
+                yield normalize(word).encode('utf-8')
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def compile_words(source, path):
+    # Writes the words of `source`, lower-cased, de-duplicated and sorted
+    # by their UTF-8 bytes, as: header, (count + 1) offsets, then the words
+    # back to back. The sort is done a chunk at a time and merged, so a
+    # background compile never holds the GIL for long.
+    size, mtime = source_stamp(source)
+    chunks = []
+    chunk = []
+    for word in read_words(source):
+        chunk.append(word)
+        if len(chunk) == SORT_CHUNK:
+            chunks.append(sorted(chunk))
+            chunk = []
+    chunks.append(sorted(chunk))
+    offsets = array('I', [0])
+    blob = bytearray()
+    previous = None
+    for word in heapq.merge(*chunks):
+        if word != previous:
+            blob += word
+            offsets.append(len(blob))
+            previous = word
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size, mtime, len(offsets) - 1))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class WordList:
+    # A compiled word list, memory-mapped rather than read: opening it
+    # costs the same for ten words or a million, and pages are only read
+    # in as lookups touch them. Lookups binary search the offsets array
+    # and compare bytes straight out of the map.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.mtime, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a compiled word list")
+        self.base = HEADER.size + (self.count + 1) * 4
+        self.offsets = memoryview(self.map)[HEADER.size:self.base].cast('I')
+
+    @classmethod
+    def open(cls, source, path):
+        # The compiled list for `source`, compiled again if the source
+        # changed since.
+        try:
+            words = cls(path)
+        except (OSError, ValueError):
+            words = None
+        if words is not None and (words.size, words.mtime) == source_stamp(source):
+            return words
+        if words is not None:
+            words.close()
+        compile_words(source, path)
+        return cls(path)
+
+    def __len__(self):
+        return self.count
+
+    def word(self, i):
+        return self.map[self.base + self.offsets[i]:self.base + self.offsets[i + 1]]
+
+    def find(self, key):
+        # First position whose word is not below `key` (UTF-8 bytes).
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.word(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, key):
+        i = self.find(key)
+        return i < self.count and self.word(i) == key
+
+    def prefixed(self, prefix, limit):
+        # Up to `limit` words starting with `prefix`, in order.
+        found = []
+        i = self.find(prefix)
+        while i < self.count and len(found) < limit:
+            word = self.word(i)
+            if not word.startswith(prefix):
+                break
+            found.append(word)
+            i += 1
+        return found
+
+    def close(self):
+        self.offsets.release()
+        self.map.close()
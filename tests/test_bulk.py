@@ -0,0 +1,50 @@
+import os
+from core.bulk import export_dir
+from storage.journal import JournalStore, put_record
+
+
+def note(note_id, title, content, rev=1):
+    return {'id': note_id, 'title': title, 'content': content, 'title_tags': [],
+            'last_modified': 1000.0 + rev, 'created': 1000.0, 'rev': rev, 'labels': [], 'notebook': ''}
+
+
+def save(tmp_path, *notes):
+    store = JournalStore(str(tmp_path / 'notes'))
+    store.open()
+    store.append([put_record(n) for n in notes])
+    store.close()
+    return str(tmp_path / 'notes')
+
+
+def exported(directory):
+    files = {}
+    for name in os.listdir(directory):
+        if name.endswith('.md'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                files[name] = f.read()
+    return files
+
+
+def test_export_twice_overwrites(tmp_path):
+    out = str(tmp_path / 'out')
+    store_path = save(tmp_path, note('a', 'Same', 'Same\nfirst'), note('b', 'Same', 'Same\nsecond'))
+    assert export_dir(out, store_path)['exported'] == 2
+    first = exported(out)
+    assert sorted(first) == ['Same (2).md', 'Same.md']
+    export_dir(out, store_path)
+    assert exported(out) == first
+    save(tmp_path, note('b', 'Same', 'Same\nsecond, edited', rev=2))
+    export_dir(out, store_path)
+    second = next(name for name, text in first.items() if text.endswith('second'))
+    assert exported(out) == dict(first, **{second: 'Same\nsecond, edited'})
+
+
+def test_export_after_rename(tmp_path):
+    out = str(tmp_path / 'out')
+    store_path = save(tmp_path, note('a', 'Old', 'Old'))
+    export_dir(out, store_path)
+    with open(os.path.join(out, 'Other.md'), 'w') as f:
+        f.write('not ours')
+    save(tmp_path, note('a', 'New', 'New', rev=2))
+    export_dir(out, store_path)
+    assert exported(out) == {'New.md': 'New', 'Other.md': 'not ours'}
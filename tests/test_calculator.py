@@ -0,0 +1,83 @@
+import time
+from core.calculator import Worksheet, MAX_EXPONENT, MAX_INT_BITS
+
+
+def calculate(text):
+    worksheet = Worksheet()
+    worksheet.load(text)
+    worksheet.recalc()
+    return worksheet
+
+
+def test_results():
+    worksheet = calculate("rent = 1200\nrent * 12 =\n1 =\n2 =\nsum(L3:L4) =\nL2 / 2 =")
+    assert worksheet.values == {1: 1200, 2: 14400, 3: 1, 4: 2, 5: 3, 6: 7200}
+
+
+def test_edit_updates_dependents_only():
+    worksheet = calculate("1 =\n2 =\nsum(L1:L2) =\n10 =")
+    worksheet.set_line(1, "5 =")
+    assert worksheet.recalc() == {1: 5, 3: 7}
+    worksheet.set_line(2, "no longer a calculation")
+    assert worksheet.recalc() == {2: None, 3: None}
+
+
+def test_huge_range_is_one_dependency():
+    started = time.perf_counter()
+    worksheet = calculate("1 =\nsum(L1:L30000000) =")
+    assert worksheet.values[2] is None
+    assert time.perf_counter() - started < 1
+    assert sum(len(keys) for keys in worksheet.used.values()) <= 2
+
+
+def test_range_may_not_include_its_own_line():
+    assert calculate("1 =\nsum(L1:L2) =").values[2] is None
+
+
+def test_circular_reference():
+    worksheet = calculate("a = b + 1\nb = a + 1\na * 1 =")
+    assert worksheet.values[3] is None
+
+
+def test_exponent_limit():
+    assert calculate("2 ** %d =" % (MAX_EXPONENT + 1)).values[1] is None
+    assert calculate("2 ** %d =" % MAX_EXPONENT).values[1] == 2 ** MAX_EXPONENT
+
+
+def test_complex_results_fail():
+    worksheet = calculate("(-8) ** 0.5 =\nsqrt(-1) =\n(-8) ** 2 =")
+    assert worksheet.values == {1: None, 2: None, 3: 64}
+
+
+def test_integer_growth_is_bounded():
+    started = time.perf_counter()
+    worksheet = calculate("(9 ** 999) ** 999 =\n9 ** 999 * 9 ** 999 * 9 ** 999 * 9 ** 999 =\n"
+                          "x = 3 ** 600\nx * x * x * x * x * x * x * x =")
+    assert time.perf_counter() - started < 1
+    for value in worksheet.values.values():
+        assert not isinstance(value, int) or value.bit_length() <= MAX_INT_BITS
+
+
+def test_small_integers_stay_exact():
+    assert calculate("(2 ** 100) * (3 ** 50) =").values[1] == 2 ** 100 * 3 ** 50
+
+
+def test_unsupported_expressions():
+    worksheet = calculate("1 << 100000 =\n__import__('os') =\n'text' * 3 =")
+    assert worksheet.values == {1: None, 2: None, 3: None}
+
+
+def test_recalc_keeps_previous_values():
+    worksheet = calculate("a = 1\na * 3 =\n2 + 2 = 4 apples")
+    worksheet.set_line(1, "a = 2")
+    assert worksheet.recalc() == {1: 2, 2: 6}
+    assert worksheet.before == {1: 1, 2: 3}
+
+
+def test_long_sheet_recalculates_in_linear_time():
+    started = time.perf_counter()
+    worksheet = calculate("x = 1\n" + "x + 1 =\n" * 50000)
+    assert len(worksheet.values) == 50001
+    worksheet.set_line(1, "x = 2")
+    assert len(worksheet.recalc()) == 50001
+    assert time.perf_counter() - started < 5
@@ -0,0 +1,92 @@
+import os
+from storage.history import HistoryStore, KEYFRAME_EVERY
+from storage.journal import encode_record
+
+
+def open_history(tmp_path, **kwargs):
+    return HistoryStore(str(tmp_path / 'notes.history'), **kwargs)
+
+
+def test_round_trip(tmp_path):
+    history = open_history(tmp_path)
+    texts = ["first line", "first line\nsecond", "first\nsecond", ""]
+    for text in texts:
+        history.record('a', text)
+    history.record('b', "other")
+    history.close()
+
+    history = open_history(tmp_path)
+    assert [rev for rev, _, _ in history.versions('a')] == [1, 2, 3, 4]
+    assert [history.version('a', rev) for rev in range(1, 5)] == texts
+    assert history.version('b', 1) == "other"
+    assert history.version('a', 5) is None
+    history.close()
+
+
+def test_unchanged_text_is_not_a_version(tmp_path):
+    history = open_history(tmp_path)
+    history.record('a', "same")
+    history.record('a', "same")
+    assert len(history.versions('a')) == 1
+    history.close()
+
+
+def test_rebuild_across_keyframes(tmp_path):
+    history = open_history(tmp_path, max_tip_chars=0)
+    texts = ["line %d\n" % i * (i % 5 + 1) + "tail" for i in range(KEYFRAME_EVERY * 2 + 5)]
+    for text in texts:
+        history.record('a', text)
+    history.close()
+
+    history = open_history(tmp_path)
+    for rev in (1, KEYFRAME_EVERY, KEYFRAME_EVERY + 1, len(texts)):
+        assert history.version('a', rev) == texts[rev - 1]
+    history.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    history = open_history(tmp_path)
+    history.record('a', "one")
+    history.record('a', "one two")
+    history.close()
+    line = encode_record({'id': 'a', 'rev': 3, 'time': 0, 'len': 3, 'at': 0, 'cut': 0, 'text': "x"})
+    with open(history.path, 'ab') as f:
+        f.write(line[:-5])
+
+    history = open_history(tmp_path)
+    assert [rev for rev, _, _ in history.versions('a')] == [1, 2]
+    history.record('a', "one two three")
+    history.close()
+    history = open_history(tmp_path)
+    assert history.version('a', 3) == "one two three"
+    history.close()
+
+
+def test_forget_survives_reopen(tmp_path):
+    history = open_history(tmp_path)
+    history.record('a', "gone")
+    history.record('b', "kept")
+    history.forget('a')
+    history.close()
+
+    history = open_history(tmp_path)
+    assert history.versions('a') == []
+    assert history.version('b', 1) == "kept"
+    history.close()
+
+
+def test_compaction_keeps_newest_run(tmp_path):
+    history = open_history(tmp_path, max_bytes=16 * 1024)
+    texts = [os.urandom(300).hex() for _ in range(KEYFRAME_EVERY * 3)]
+    for text in texts:
+        history.record('a', text)
+    history.close()
+    assert os.path.getsize(history.path) <= 16 * 1024
+
+    history = open_history(tmp_path)
+    revs = [rev for rev, _, _ in history.versions('a')]
+    assert revs[-1] == len(texts)
+    assert revs[0] > 1
+    assert history.version('a', revs[-1]) == texts[-1]
+    assert history.version('a', revs[0]) == texts[revs[0] - 1]
+    history.close()
@@ -0,0 +1,117 @@
+import os
+from storage.journal import JournalStore, LOG, SNAPSHOT, put_record, delete_record, encode_record
+
+
+def note(note_id, content, rev=1):
+    return {'id': note_id, 'title': note_id, 'content': content, 'title_tags': [],
+            'last_modified': 1000.0 + rev, 'created': 1000.0, 'rev': rev, 'labels': [], 'notebook': ''}
+
+
+def open_store(tmp_path, **kwargs):
+    store = JournalStore(str(tmp_path / 'notes'), **kwargs)
+    store.open()
+    return store
+
+
+def ids(store):
+    return [meta['id'] for meta in store.open()]
+
+
+def test_round_trip(tmp_path):
+    store = open_store(tmp_path)
+    store.append([put_record(note('a', 'first')), put_record(note('b', 'second'))])
+    store.append([put_record(note('a', 'first, edited', rev=2)), delete_record('b')])
+    store.close()
+    store = open_store(tmp_path)
+    assert ids(store) == ['a']
+    assert store.read('a')['content'] == 'first, edited'
+    assert store.read('a')['rev'] == 2
+    assert store.read('b') is None
+    store.close()
+
+
+def test_round_trip_without_index(tmp_path):
+    store = open_store(tmp_path)
+    store.append([put_record(note('a', 'text'))])
+    store.close()
+    os.remove(store.index_path)
+    store = JournalStore(str(tmp_path / 'notes'))
+    assert [meta['title'] for meta in store.open()] == ['a']
+    assert store.read('a')['content'] == 'text'
+    store.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    store = open_store(tmp_path)
+    store.append([put_record(note('a', 'kept'))])
+    store.close()
+    line = encode_record(put_record(note('b', 'torn')))
+    with open(store.paths[LOG], 'ab') as f:
+        f.write(line[:len(line) // 2])
+    size = os.path.getsize(store.paths[LOG])
+
+    store = JournalStore(str(tmp_path / 'notes'))
+    assert ids(store) == ['a']
+    assert os.path.getsize(store.paths[LOG]) < size
+    # New records start on a clean line and survive the next open.
+    store.append([put_record(note('c', 'after'))])
+    store.close()
+    store = JournalStore(str(tmp_path / 'notes'))
+    assert ids(store) == ['a', 'c']
+    assert store.read('c')['content'] == 'after'
+    store.close()
+
+
+def test_corrupt_record_ends_replay(tmp_path):
+    store = open_store(tmp_path)
+    store.append([put_record(note('a', 'good'))])
+    store.close()
+    line = bytearray(encode_record(put_record(note('b', 'flipped'))))
+    line[-3] ^= 1
+    with open(store.paths[LOG], 'ab') as f:
+        f.write(bytes(line))
+
+    store = JournalStore(str(tmp_path / 'notes'))
+    assert ids(store) == ['a']
+    store.close()
+
+
+def test_compaction(tmp_path):
+    store = open_store(tmp_path, compact_threshold=4096)
+    for rev in range(1, 40):
+        store.append([put_record(note('a', 'x' * 200, rev)), put_record(note('b', str(rev), rev))])
+    assert os.path.getsize(store.paths[LOG]) <= 4096
+    assert os.path.getsize(store.paths[SNAPSHOT]) > 0
+    store.close()
+    store = open_store(tmp_path)
+    assert store.read('a')['rev'] == 39
+    assert store.read('b')['content'] == '39'
+    store.close()
+
+
+def test_crash_between_snapshot_and_log_truncation(tmp_path):
+    # The log replayed on top of a snapshot that already holds it.
+    store = open_store(tmp_path)
+    store.append([put_record(note('a', 'one')), put_record(note('b', 'two'))])
+    store.append([delete_record('b'), put_record(note('a', 'three', rev=2))])
+    with open(store.paths[LOG], 'rb') as f:
+        log = f.read()
+    store.compact()
+    store.close()
+    with open(store.paths[LOG], 'wb') as f:
+        f.write(log)
+    os.remove(store.index_path)
+
+    store = JournalStore(str(tmp_path / 'notes'))
+    assert ids(store) == ['a']
+    assert store.read('a')['content'] == 'three'
+    store.close()
+
+
+def test_write_volume_follows_note_size(tmp_path):
+    store = open_store(tmp_path)
+    store.append([put_record(note(str(i), 'y' * 1000)) for i in range(100)])
+    before = os.path.getsize(store.paths[LOG])
+    store.append([put_record(note('small', 'z'))])
+    assert os.path.getsize(store.paths[LOG]) - before < 500
+    store.close()
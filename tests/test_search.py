@@ -0,0 +1,64 @@
+import random
+import core.search
+from core.search import SearchIndex
+
+
+def corpus(count=3000, seed=7):
+    rng = random.Random(seed)
+    words = ['w%d' % i for i in range(300)]
+    weights = [1 / (rank + 1) for rank in range(300)]
+    index = SearchIndex()
+    for i in range(count):
+        index.add(str(i), ' '.join(rng.choices(words, weights, k=rng.randint(5, 300))))
+    return index, rng, words, weights
+
+
+def search(index, query, monkeypatch, direct):
+    monkeypatch.setattr(core.search, 'DIRECT_LIMIT', 10 ** 9 if direct else 50)
+    monkeypatch.setattr(core.search, 'MAX_CANDIDATES', 10 ** 9)
+    return index.search(query)
+
+
+QUERIES = ['w0', 'w1 w2', 'w5*', 'w1*', '"w0 w1"', 'w299', 'w0 w299', 'w2 w3 w4', 'w10 w1*', '"w3 w2" w0']
+
+
+def assert_same(index, monkeypatch):
+    for query in QUERIES:
+        assert search(index, query, monkeypatch, False) == search(index, query, monkeypatch, True), query
+
+
+def test_threshold_walk_matches_scoring_every_note(monkeypatch):
+    index, _, _, _ = corpus()
+    assert_same(index, monkeypatch)
+
+
+def test_walk_after_notes_change(monkeypatch):
+    index, rng, words, weights = corpus()
+    assert_same(index, monkeypatch)
+    for _ in range(100):
+        index.add(str(rng.randrange(3000)), ' '.join(rng.choices(words, weights, k=rng.randint(5, 300))))
+    for _ in range(20):
+        index.remove(str(rng.randrange(3000)))
+    assert_same(index, monkeypatch)
+
+
+def test_queries():
+    index = SearchIndex()
+    index.add('a', "the quick brown fox jumps over the lazy dog")
+    index.add('b', "a brown dog and a quick fox")
+    index.add('c', "foxes are quick")
+    assert sorted(index.search("quick fox")) == ['a', 'b']
+    assert index.search('"quick brown fox"') == ['a']
+    assert index.search('"brown dog"') == ['b']
+    assert index.search('"fox quick"') == []
+    assert sorted(index.search("fox*")) == ['a', 'b', 'c']
+    assert index.search("nothing") == []
+    index.remove('a')
+    assert index.search('"quick brown fox"') == []
+
+
+def test_limit_keeps_best():
+    index = SearchIndex()
+    for i in range(1, 50):
+        index.add(str(i), "word " * i + "filler " * 100)
+    assert index.search("word", limit=5) == ['49', '48', '47', '46', '45']